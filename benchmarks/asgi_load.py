@@ -0,0 +1,233 @@
+"""
+Load test: sync (WSGI) vs uvicorn (ASGI) gunicorn workers with slow clients.
+
+Starts gunicorn with gunicorn_config.py in each mode on a throwaway SQLite
+database, then runs two kinds of client against the memorial pages at once:
+
+  slow  mobile-like clients that trickle their request out over
+        --slow-seconds and read the response in small delayed chunks
+  fast  clients measured for throughput and latency
+
+A sync worker is pinned by each slow client for the whole exchange; an
+event-loop worker keeps serving the fast ones in between. Both modes get
+the same number of worker processes (--workers).
+
+Usage: python benchmarks/asgi_load.py [--mode sync --mode asgi] [--workers 3]
+           [--slow-clients 30] [--fast-clients 10] [--duration 10] [--json]
+The asgi mode needs uvicorn installed (pip install "uvicorn[standard]").
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = {
+    'sync': ('myMemory.wsgi:application', {}),
+    'asgi': ('myMemory.asgi:application', {'GUNICORN_WORKER_CLASS': 'uvicorn'}),
+}
+SLIDESHOWS = 10
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(env):
+    """Migrate and seed the throwaway database; returns the page paths."""
+    os.environ.update(env)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myMemory.settings')
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+
+    from accounts.models import User
+    from memories.models import MemorySlideShow, Slide
+
+    call_command('migrate', verbosity=0)
+    owner = User.objects.create_user('asgi-load')
+    paths = []
+    for i in range(SLIDESHOWS):
+        slideshow = MemorySlideShow.objects.create(owner=owner, title=f'Load Test {i}', title_fa=f'آزمون {i}')
+        Slide.objects.bulk_create([
+            Slide(slideshow=slideshow, order=order, caption=f'Slide {order}', caption_fa=f'اسلاید {order}')
+            for order in range(1, 31)
+        ])
+        for suffix in ('', 'show/'):
+            for lang in ('en', 'fa'):
+                paths.append(f'/slideshows/{slideshow.slug}/{suffix}?lang={lang}')
+    return paths
+
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def request_bytes(path):
+    return (
+        f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nUser-Agent: asgi-load\r\n'
+        'Accept: text/html\r\nConnection: close\r\n\r\n'
+    ).encode()
+
+
+async def fetch(port, path, slow_seconds=0.0, read_chunk=None, read_delay=0.0):
+    """One request; returns the status code (None on a connection error)."""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return None
+    try:
+        data = request_bytes(path)
+        if slow_seconds:
+            pieces = 10
+            size = max(1, len(data) // pieces)
+            for start in range(0, len(data), size):
+                writer.write(data[start:start + size])
+                await writer.drain()
+                await asyncio.sleep(slow_seconds / pieces)
+        else:
+            writer.write(data)
+            await writer.drain()
+        status_line = await reader.readline()
+        while True:
+            chunk = await reader.read(read_chunk or 65536)
+            if not chunk:
+                break
+            if read_delay:
+                await asyncio.sleep(read_delay)
+        parts = status_line.split()
+        return int(parts[1]) if len(parts) > 1 else None
+    except (OSError, asyncio.IncompleteReadError):
+        return None
+    finally:
+        writer.close()
+
+
+async def slow_client(port, paths, deadline, args, rng):
+    while time.monotonic() < deadline:
+        await fetch(port, rng.choice(paths), args.slow_seconds, read_chunk=1024, read_delay=0.05)
+
+
+async def fast_client(port, paths, deadline, rng, results):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        status = await fetch(port, rng.choice(paths))
+        elapsed = time.perf_counter() - started
+        if status == 200:
+            results['latencies'].append(elapsed)
+        else:
+            results['errors'] += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def drive(port, paths, args):
+    await wait_for_port(port)
+    # Warm the page cache so both modes measure the same hot path
+    for path in paths:
+        await fetch(port, path)
+    rng = random.Random(1)
+    results = {'latencies': [], 'errors': 0}
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(
+        *[slow_client(port, paths, deadline, args, random.Random(rng.random())) for _ in range(args.slow_clients)],
+        *[fast_client(port, paths, deadline, random.Random(rng.random()), results) for _ in range(args.fast_clients)],
+    )
+    latencies = results['latencies']
+    p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+    return {
+        'requests': len(latencies),
+        'per_second': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+        'p99_ms': round(p99 * 1000, 1) if p99 is not None else None,
+        'errors': results['errors'],
+    }
+
+
+def run_mode(mode, paths, env, args):
+    app, mode_env = MODES[mode]
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--bind', f'127.0.0.1:{port}', app],
+        cwd=ROOT, env={**os.environ, **env, **mode_env, 'GUNICORN_WORKERS': str(args.workers)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        return {'mode': mode, **asyncio.run(drive(port, paths, args))}
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', action='append', choices=sorted(MODES), help='Modes to compare (default: both).')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--slow-clients', type=int, default=30)
+    parser.add_argument('--fast-clients', type=int, default=10)
+    parser.add_argument('--slow-seconds', type=float, default=2.0, help='Time a slow client takes to send its request.')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+    args = parser.parse_args()
+
+    modes = args.mode or ['sync', 'asgi']
+    if 'asgi' in modes and importlib.util.find_spec('uvicorn') is None:
+        print('uvicorn is not installed; skipping the asgi mode.', file=sys.stderr)
+        modes = [mode for mode in modes if mode != 'asgi']
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            'DEBUG': 'False',
+            'SQLITE_PATH': os.path.join(directory, 'db.sqlite3'),
+            'CACHE_LOCATION': os.path.join(directory, 'cache'),
+            'VISIT_SPOOL_DIR': os.path.join(directory, 'visits'),
+        }
+        paths = prepare_database(env)
+        for mode in modes:
+            results.append(run_mode(mode, paths, env, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(
+        f'{args.workers} workers, {args.slow_clients} slow + {args.fast_clients} fast clients, '
+        f'{args.duration:g}s'
+    )
+    print('mode   requests/s   p50 ms   p99 ms   errors')
+    for result in results:
+        print(
+            f"{result['mode']:<6} {result['per_second']:>11} {result['p50_ms'] or '-':>8} "
+            f"{result['p99_ms'] or '-':>8} {result['errors']:>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Load test: concurrent read/write throughput of the database setup.
+
+Runs the same mix in every configuration: slide-page reads, visit-count
+flushes and session writes, from several processes at once, like gunicorn
+sync workers. The configurations are
+
+  rollback    SQLite with its defaults (rollback journal, no busy_timeout)
+  wal         SQLite with the SQLITE_PRAGMAS from settings (WAL etc.)
+  postgresql  the PostgreSQL database described by the DB_* variables
+
+The SQLite runs use a throwaway database file. The postgresql run migrates
+and writes to the configured database, so point DB_NAME at a scratch one.
+
+Usage: python benchmarks/db_load.py [--mode rollback --mode wal]
+           [--workers 9] [--duration 10] [--write-ratio 0.2] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myMemory.settings')
+
+MODES = ('rollback', 'wal', 'postgresql')
+SLIDESHOWS = 20
+SLIDES_PER_SLIDESHOW = 30
+
+
+def mode_environment(mode, directory):
+    env = dict(os.environ)
+    if mode == 'postgresql':
+        env['DB_ENGINE'] = 'postgresql'
+        return env
+    env['DB_ENGINE'] = 'sqlite'
+    env['SQLITE_PATH'] = os.path.join(directory, f'{mode}.sqlite3')
+    if mode == 'rollback':
+        env.update(SQLITE_JOURNAL_MODE='DELETE', SQLITE_SYNCHRONOUS='FULL', SQLITE_BUSY_TIMEOUT='0', SQLITE_MMAP_SIZE='0')
+    return env
+
+
+def seed():
+    from accounts.models import User
+    from memories.models import MemorySlideShow, Slide
+
+    owner, _ = User.objects.get_or_create(username='db-load')
+    slugs = []
+    for i in range(SLIDESHOWS):
+        slideshow, created = MemorySlideShow.objects.get_or_create(
+            title=f'Load Test {i}', owner=owner, defaults={'is_public': True},
+        )
+        if created:
+            Slide.objects.bulk_create([
+                Slide(slideshow=slideshow, order=order, caption=f'Slide {order}')
+                for order in range(1, SLIDES_PER_SLIDESHOW + 1)
+            ])
+        slugs.append(slideshow.slug)
+    return slugs
+
+
+def worker(slugs, duration, write_ratio, seed_value):
+    """Run the request mix until ``duration`` is up; return per-kind stats."""
+    import django
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import OperationalError, connection
+
+    django.setup()
+    from memories.models import MemorySlideShow
+    from memories.visits import write_visits
+
+    rng = random.Random(seed_value)
+    stats = {kind: {'ops': 0, 'errors': 0, 'latencies': []} for kind in ('read', 'write')}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        slug = rng.choice(slugs)
+        kind = 'write' if rng.random() < write_ratio else 'read'
+        started = time.perf_counter()
+        try:
+            if kind == 'read':
+                slideshow = MemorySlideShow.objects.for_slide_page().get(slug=slug)
+                len(slideshow.page_slides)
+            elif rng.random() < 0.5:
+                write_visits({slug: 1})
+            else:
+                session = SessionStore()
+                session['language'] = 'fa'
+                session.save()
+        except OperationalError:
+            stats[kind]['errors'] += 1
+            continue
+        stats[kind]['ops'] += 1
+        stats[kind]['latencies'].append(time.perf_counter() - started)
+    connection.close()
+    return stats
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_mode(args):
+    """Child process: migrate, seed and drive one configuration."""
+    import multiprocessing
+
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command('migrate', verbosity=0)
+    slugs = seed()
+    journal_mode = None
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+    connection.close()
+
+    context = multiprocessing.get_context('fork')
+    with context.Pool(args.workers) as pool:
+        results = pool.starmap(worker, [
+            (slugs, args.duration, args.write_ratio, index) for index in range(args.workers)
+        ])
+
+    summary = {'mode': args.run, 'vendor': connection.vendor, 'journal_mode': journal_mode, 'workers': args.workers}
+    for kind in ('read', 'write'):
+        latencies = [value for result in results for value in result[kind]['latencies']]
+        ops = sum(result[kind]['ops'] for result in results)
+        p95 = percentile(latencies, 0.95)
+        summary[kind] = {
+            'ops': ops,
+            'per_second': round(ops / args.duration, 1),
+            'errors': sum(result[kind]['errors'] for result in results),
+            'p95_ms': round(p95 * 1000, 2) if p95 is not None else None,
+        }
+    print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', action='append', choices=MODES, help='Configurations to compare (default: rollback, wal).')
+    parser.add_argument('--workers', type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+    parser.add_argument('--run', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(args)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.mode or ['rollback', 'wal']:
+            command = [
+                sys.executable, __file__, '--run', mode, '--workers', str(args.workers),
+                '--duration', str(args.duration), '--write-ratio', str(args.write_ratio),
+            ]
+            completed = subprocess.run(
+                command, env=mode_environment(mode, directory), capture_output=True, text=True, cwd=ROOT,
+            )
+            if completed.returncode != 0:
+                sys.stderr.write(completed.stderr)
+                sys.exit(f'{mode} run failed')
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.workers} workers, {args.duration:g}s, {args.write_ratio:.0%} writes')
+    print('mode        reads/s  read p95 ms  writes/s  write p95 ms  errors')
+    for result in results:
+        read, write = result['read'], result['write']
+        print(
+            f"{result['mode']:<10} {read['per_second']:>8} {read['p95_ms'] or '-':>12} "
+            f"{write['per_second']:>9} {write['p95_ms'] or '-':>13} {read['errors'] + write['errors']:>7}"
+        )
+
+
+if __name__ == '__main__':
+    main()
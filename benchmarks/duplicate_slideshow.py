@@ -0,0 +1,134 @@
+"""
+Benchmark: duplicating large slideshows (the admin "Duplicate" action).
+
+Seeds a throwaway SQLite database with --slideshows slideshows of --slides
+slides each (file names only, no media), then duplicates all of them with
+the old per-row copy (one create() per slide, N-query slug probing, no
+transaction) and with memories.duplication.duplicate_slideshows, reporting
+wall time and SQL queries for each.
+
+Usage: python benchmarks/duplicate_slideshow.py [--slideshows 10]
+           [--slides 300] [--repeat 3] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myMemory.settings')
+
+
+def seed(slideshows, slides):
+    from accounts.models import User
+    from memories.models import MemorySlideShow, Slide
+
+    owner = User.objects.create_user(username='duplicate-benchmark')
+    originals = []
+    for index in range(slideshows):
+        # Common names collide, which is what made slug probing slow
+        slideshow = MemorySlideShow.objects.create(owner=owner, title='Mohammad Ahmadi')
+        Slide.objects.bulk_create([
+            Slide(
+                slideshow=slideshow, order=order, caption=f'Slide {order}', media_type='image',
+                media_file=f'slideshows/{slideshow.slug}/{order}.jpg', media_size=1024,
+                renditions={'source': f'slideshows/{slideshow.slug}/{order}.jpg', 'images': {}},
+            )
+            for order in range(1, slides + 1)
+        ])
+        originals.append(slideshow.pk)
+    return originals
+
+
+def per_row_duplicate(slideshows):
+    """The duplicate_slideshow admin action before it used bulk_create."""
+    from memories.models import MemorySlideShow, Slide
+
+    for slideshow in slideshows:
+        new_slideshow = MemorySlideShow.objects.create(
+            owner=slideshow.owner,
+            title=f"{slideshow.title} (Copy)",
+            title_fa=slideshow.title_fa,
+            date_of_birth=slideshow.date_of_birth,
+            date_of_death=slideshow.date_of_death,
+            description=slideshow.description,
+            description_fa=slideshow.description_fa,
+            mainImage=slideshow.mainImage,
+            music=slideshow.music,
+            profile_theme=slideshow.profile_theme,
+            slide_theme=slideshow.slide_theme,
+            is_public=False,
+        )
+        for slide in slideshow.slides.all():
+            Slide.objects.create(
+                slideshow=new_slideshow,
+                media_type=slide.media_type,
+                media_file=slide.media_file,
+                caption=slide.caption,
+                caption_fa=slide.caption_fa,
+                order=slide.order,
+            )
+
+
+def measure(func, originals, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from memories.models import MemorySlideShow
+
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func(MemorySlideShow.objects.filter(pk__in=originals))
+            timings.append(time.perf_counter() - started)
+    return {'seconds': min(timings), 'queries': len(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--slideshows', type=int, default=10)
+    parser.add_argument('--slides', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    os.environ.update(
+        DB_ENGINE='sqlite',
+        SQLITE_PATH=os.path.join(directory.name, 'duplicate.sqlite3'),
+        MEDIA_ROOT=directory.name,
+        MEDIA_JOBS_EAGER='False',
+    )
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+
+    from memories.duplication import duplicate_slideshows
+
+    call_command('migrate', verbosity=0)
+    originals = seed(args.slideshows, args.slides)
+
+    results = {
+        'slideshows': args.slideshows,
+        'slides': args.slides,
+        'per-row': measure(per_row_duplicate, originals, args.repeat),
+        'bulk': measure(duplicate_slideshows, originals, args.repeat),
+    }
+    directory.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'Duplicating {args.slideshows} slideshows of {args.slides} slides')
+    for name in ('per-row', 'bulk'):
+        print(f'{name:>8}: {results[name]["seconds"] * 1000:9.1f} ms {results[name]["queries"]:7d} queries')
+    print(f'{"speedup":>8}: {results["per-row"]["seconds"] / results["bulk"]["seconds"]:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Benchmark suite for the public memorial endpoints.
+
+Seeds a throwaway database and media directory with --slideshows
+slideshows of --slides slides each (generated JPEGs), then
+
+  1. counts the SQL queries of every view in-process, with a cold and a
+     warm page cache, and
+  2. starts gunicorn with gunicorn_config.py and drives every view at each
+     --concurrency level for --duration seconds, once with the page cache
+     and once without it (DummyCache), reporting requests/s and latency
+     percentiles.
+
+The views are the profile and slide pages in English and Farsi
+(/slideshows/<slug>/, /show/, ?lang=en|fa, and the /fa/ and /en/ URLs)
+plus the slides.json manifest. Results are written as JSON to
+var/benchmarks/<commit>.json (or --output); pass --compare with an earlier
+file to print the change per view (not with --json).
+
+Usage: python benchmarks/endpoints.py [--slideshows 10] [--slides 20]
+           [--concurrency 1 --concurrency 16] [--duration 5] [--workers 3]
+           [--worker-class sync|uvicorn] [--renditions] [--compare FILE]
+           [--output FILE] [--json]
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+VIEWS = {
+    'profile-en': '/slideshows/{slug}/?lang=en',
+    'profile-fa': '/slideshows/{slug}/?lang=fa',
+    'profile-fa-url': '/slideshows/{slug}/fa/',
+    'slide-en': '/slideshows/{slug}/show/?lang=en',
+    'slide-fa': '/slideshows/{slug}/show/?lang=fa',
+    'slide-en-url': '/slideshows/{slug}/show/en/',
+    'manifest': '/slideshows/{slug}/slides.json?page=1',
+}
+CACHE_MODES = {
+    'cached': {},
+    'uncached': {'CACHE_BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def generated_jpeg(rng, width=1280, height=853):
+    """A gradient JPEG, about the size of a phone photo after upload resizing."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    end = [rng.randrange(256) for _ in range(3)]
+    for y in range(0, height, 4):
+        draw.rectangle([0, y, width, y + 4], fill=tuple(
+            (channel * y + end[i] * (height - y)) // height for i, channel in enumerate(image.getpixel((0, 0)))
+        ))
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.ellipse([x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 200)],
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def seed(slideshow_count, slide_count, renditions):
+    """Create the slideshows with generated media; returns their slugs."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.core.management import call_command
+
+    from accounts.models import User
+    from memories.models import MediaJob, MemorySlideShow, Slide
+
+    rng = random.Random(42)
+    owner = User.objects.create_user('benchmark')
+    slugs = []
+    for i in range(slideshow_count):
+        slideshow = MemorySlideShow.objects.create(
+            owner=owner, title=f'Benchmark Memorial {i}', title_fa=f'یادبود {i}',
+            date_of_birth=datetime.date(1940, 3, 21), date_of_death=datetime.date(2020, 6, 1),
+            description='Lorem ipsum dolor sit amet. ' * 40, description_fa='متن نمونه برای آزمون. ' * 40,
+        )
+        slideshow.mainImage.save('portrait.jpg', ContentFile(generated_jpeg(rng, 800, 1000)))
+        Slide.objects.bulk_create([
+            Slide(
+                slideshow=slideshow, order=order, caption=f'Slide {order} of {slideshow.title}',
+                caption_fa=f'اسلاید {order}',
+                media_file=default_storage.save(
+                    f'slideshows/{slideshow.slug}/slide-{order}.jpg', ContentFile(generated_jpeg(rng)),
+                ),
+            )
+            for order in range(1, slide_count + 1)
+        ])
+        slugs.append(slideshow.slug)
+    if renditions:
+        call_command('generate_derivatives', verbosity=0)
+    MediaJob.objects.all().delete()
+    return slugs
+
+
+def count_queries(slugs):
+    """Queries per view with a cold and a warm page cache, for the first slideshow."""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from memories.visits import visit_buffer
+
+    client = Client()
+    counts = {}
+    for name, template in VIEWS.items():
+        path = template.format(slug=slugs[0])
+        cache.clear()
+        counts[name] = {}
+        for state in ('cold', 'warm'):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}')
+            counts[name][state] = len(queries)
+    visit_buffer.flush()
+    return counts
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+async def fetch(port, path):
+    """One request; returns the status code (None on a connection error)."""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return None
+    try:
+        writer.write((
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nUser-Agent: endpoint-benchmark\r\n'
+            'Accept: text/html\r\nConnection: close\r\n\r\n'
+        ).encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        while await reader.read(65536):
+            pass
+        parts = status_line.split()
+        return int(parts[1]) if len(parts) > 1 else None
+    except OSError:
+        return None
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def load(port, paths, concurrency, duration):
+    """Keep ``concurrency`` requests in flight for ``duration`` seconds."""
+    latencies = []
+    errors = 0
+
+    async def client(rng):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = await fetch(port, rng.choice(paths))
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*[client(random.Random(index)) for index in range(concurrency)])
+    result = {'requests': len(latencies), 'per_second': round(len(latencies) / duration, 1), 'errors': errors}
+    for label, fraction in (('p50_ms', 0.5), ('p90_ms', 0.9), ('p99_ms', 0.99)):
+        value = percentile(latencies, fraction)
+        result[label] = round(value * 1000, 1) if value is not None else None
+    return result
+
+
+def run_load(slugs, env, args):
+    app = 'myMemory.asgi:application' if args.worker_class == 'uvicorn' else 'myMemory.wsgi:application'
+    results = []
+    for cache_mode, cache_env in CACHE_MODES.items():
+        port = free_port()
+        server_env = {**os.environ, **env, **cache_env, 'GUNICORN_WORKERS': str(args.workers)}
+        if args.worker_class == 'uvicorn':
+            server_env['GUNICORN_WORKER_CLASS'] = 'uvicorn'
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '--bind', f'127.0.0.1:{port}', app],
+            cwd=ROOT, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            asyncio.run(wait_for_port(port))
+            for name, template in VIEWS.items():
+                paths = [template.format(slug=slug) for slug in slugs]
+                # Warm the page cache (and the workers) before measuring
+                asyncio.run(load(port, paths, max(args.concurrency), 1))
+                for concurrency in args.concurrency:
+                    result = asyncio.run(load(port, paths, concurrency, args.duration))
+                    results.append({'view': name, 'cache': cache_mode, 'concurrency': concurrency, **result})
+                    if not args.json:
+                        print_load_row(results[-1])
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+    return results
+
+
+def print_load_row(row, previous=None):
+    change = ''
+    if previous and previous.get('per_second'):
+        change = f"{(row['per_second'] - previous['per_second']) / previous['per_second']:>+9.1%}"
+    print(
+        f"{row['view']:<15} {row['cache']:<9} {row['concurrency']:>4} {row['per_second']:>11} "
+        f"{row['p50_ms'] or '-':>8} {row['p90_ms'] or '-':>8} {row['p99_ms'] or '-':>8} {row['errors']:>7}{change}"
+    )
+
+
+def compare(report, path):
+    with open(path) as fh:
+        baseline = json.load(fh)
+    print(f"\nChange against {baseline.get('commit', path)}:")
+    print('view            queries (cold/warm)')
+    for name, counts in report['queries'].items():
+        before = baseline.get('queries', {}).get(name)
+        was = f" (was {before['cold']}/{before['warm']})" if before else ''
+        print(f"{name:<15} {counts['cold']}/{counts['warm']}{was}")
+    previous = {(row['view'], row['cache'], row['concurrency']): row for row in baseline.get('load', [])}
+    print('view            cache     conc  requests/s   p50 ms   p90 ms   p99 ms  errors   req/s')
+    for row in report['load']:
+        print_load_row(row, previous.get((row['view'], row['cache'], row['concurrency'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slideshows', type=int, default=10)
+    parser.add_argument('--slides', type=int, default=20, help='Slides per slideshow.')
+    parser.add_argument('--concurrency', type=int, action='append', help='Concurrent clients (default: 1 and 16).')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per view and concurrency level.')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--worker-class', choices=('sync', 'uvicorn'), default='sync')
+    parser.add_argument('--renditions', action='store_true', help='Generate image renditions for the seeded slides.')
+    parser.add_argument('--output', help='Results file (default: var/benchmarks/<commit>.json).')
+    parser.add_argument('--compare', help='Earlier results file to compare against.')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+    args = parser.parse_args()
+    args.concurrency = args.concurrency or [1, 16]
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            'DEBUG': 'False',
+            'DB_ENGINE': 'sqlite',
+            'SQLITE_PATH': os.path.join(directory, 'db.sqlite3'),
+            'CACHE_LOCATION': os.path.join(directory, 'cache'),
+            'MEDIA_ROOT': os.path.join(directory, 'media'),
+            'VISIT_SPOOL_DIR': os.path.join(directory, 'visits'),
+            'MEDIA_JOBS_EAGER': 'False',
+            'ASYNC_VIEWS': str(args.worker_class == 'uvicorn'),
+        }
+        os.environ.update(env)
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myMemory.settings')
+        import django
+
+        django.setup()
+        from django.core.management import call_command
+        from django.db import connection
+
+        call_command('migrate', verbosity=0)
+        slugs = seed(args.slideshows, args.slides, args.renditions)
+        queries = count_queries(slugs)
+        connection.close()
+        if not args.json:
+            print(f'{args.slideshows} slideshows x {args.slides} slides, {args.workers} {args.worker_class} workers, '
+                  f'{args.duration:g}s per run')
+            print('view            queries (cold/warm)')
+            for name, counts in queries.items():
+                print(f"{name:<15} {counts['cold']}/{counts['warm']}")
+            print('view            cache     conc  requests/s   p50 ms   p90 ms   p99 ms  errors')
+        load_results = run_load(slugs, env, args)
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'config': {
+            'slideshows': args.slideshows, 'slides': args.slides, 'workers': args.workers,
+            'worker_class': args.worker_class, 'duration': args.duration, 'renditions': args.renditions,
+        },
+        'queries': queries,
+        'load': load_results,
+    }
+    output = Path(args.output or ROOT / 'var' / 'benchmarks' / f"{report['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f'Results written to {output}')
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: Farsi profile date formatting per request.
+
+Compares the old per-request khayyam conversion (four JalaliDate objects)
+with reading the Jalali fields precomputed on save.
+
+Usage: python benchmarks/jalali_dates.py [--number 100000]
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myMemory.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from khayyam import JalaliDate  # noqa: E402
+
+from memories.models import MemorySlideShow, set_jalali_dates  # noqa: E402
+
+
+def per_request_conversion(user):
+    return {
+        'date_of_birth': JalaliDate(user.date_of_birth).strftime('%Y/%m/%d'),
+        'date_of_death': JalaliDate(user.date_of_death).strftime('%Y/%m/%d'),
+        'born_year': JalaliDate(user.date_of_birth).strftime('%Y'),
+        'death_year': JalaliDate(user.date_of_death).strftime('%Y'),
+    }
+
+
+def precomputed_fields(user):
+    return {
+        'date_of_birth': user.date_of_birth_fa,
+        'date_of_death': user.date_of_death_fa,
+        'born_year': user.born_year_fa,
+        'death_year': user.death_year_fa,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=100_000)
+    args = parser.parse_args()
+
+    user = MemorySlideShow(
+        title='Benchmark',
+        date_of_birth=datetime.date(1950, 3, 21),
+        date_of_death=datetime.date(2020, 3, 20),
+    )
+    set_jalali_dates(MemorySlideShow, user)
+    assert per_request_conversion(user) == precomputed_fields(user)
+
+    results = {}
+    for name, func in (('per-request', per_request_conversion), ('precomputed', precomputed_fields)):
+        seconds = min(timeit.repeat(lambda: func(user), number=args.number, repeat=5))
+        results[name] = seconds / args.number * 1e6
+        print(f'{name:>12}: {results[name]:8.3f} us/request')
+    print(f'{"speedup":>12}: {results["per-request"] / results["precomputed"]:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+/*
+ * Simulated-timing benchmark for the slideshow prefetcher.
+ *
+ * Drives core/static/js/prefetch.js against a virtual clock and a
+ * bandwidth-shared network model (no browser needed), and compares the
+ * old fixed one-ahead/one-behind preloading with the adaptive scheduler
+ * across connection profiles, autoplay intervals and a fast-skipping
+ * viewer. Reports hit rate, stall time, cancellations, skipped heavy
+ * slides and bytes transferred, and exits non-zero when the adaptive
+ * scheduler stalls more than the fixed one (see checkResults).
+ *
+ * Usage: node benchmarks/prefetch_simulation.js [--slides 60] [--json]
+ */
+'use strict';
+
+const path = require('path');
+const { PrefetchScheduler } = require(path.join(__dirname, '..', 'core', 'static', 'js', 'prefetch.js'));
+
+const KB = 1024;
+const MB = 1024 * KB;
+
+const PROFILES = {
+    '4g': { effectiveType: '4g', downlink: 10, rtt: 50, saveData: false },
+    '3g': { effectiveType: '3g', downlink: 1.5, rtt: 300, saveData: false },
+    '3g-save-data': { effectiveType: '3g', downlink: 1.5, rtt: 300, saveData: true },
+    '2g': { effectiveType: '2g', downlink: 0.25, rtt: 1400, saveData: false },
+};
+
+const STRATEGIES = {
+    // What slide.js did before: one slide ahead, one behind, no signals
+    fixed: { options: { minDepth: 1, maxDepth: 1 }, useConnection: false, useSizes: false },
+    adaptive: { options: {}, useConnection: true, useSizes: true },
+};
+
+const SLIDE_WINDOW = 2; // Mirrors slide.js
+
+function parseArgs(argv) {
+    const args = { slides: 60, json: false };
+    for (let i = 0; i < argv.length; i++) {
+        if (argv[i] === '--slides') args.slides = parseInt(argv[++i], 10);
+        else if (argv[i] === '--json') args.json = true;
+    }
+    return args;
+}
+
+// Deterministic PRNG so every run sees the same deck
+function mulberry32(seed) {
+    return function () {
+        seed |= 0;
+        seed = (seed + 0x6D2B79F5) | 0;
+        let t = Math.imul(seed ^ (seed >>> 15), 1 | seed);
+        t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+        return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+    };
+}
+
+function makeDeck(count) {
+    const random = mulberry32(42);
+    const deck = [];
+    for (let i = 0; i < count; i++) {
+        const roll = random();
+        if (roll < 0.75) deck.push({ type: 'image', bytes: (250 + random() * 350) * KB });
+        else if (roll < 0.9) deck.push({ type: 'video', bytes: (2 + random() * 4) * MB });
+        else deck.push({ type: 'gif', bytes: (1 + random() * 2) * MB });
+    }
+    return deck;
+}
+
+class VirtualClock {
+    constructor() {
+        this.now = 0;
+        this.timers = [];
+        this.sequence = 0;
+    }
+
+    setTimeout(callback, delay) {
+        this.timers.push({ time: this.now + delay, sequence: this.sequence++, callback });
+        this.timers.sort((a, b) => a.time - b.time || a.sequence - b.sequence);
+    }
+
+    nextTimer() {
+        return this.timers.length ? this.timers[0].time : Infinity;
+    }
+
+    runDue() {
+        while (this.timers.length && this.timers[0].time <= this.now) {
+            this.timers.shift().callback();
+        }
+    }
+}
+
+// Transfers share the link bandwidth equally while they overlap
+class Network {
+    constructor(clock, profile) {
+        this.clock = clock;
+        this.bytesPerMs = profile.downlink * 1e6 / 8 / 1000;
+        this.rtt = profile.rtt;
+        this.transfers = new Set();
+        this.bytesTransferred = 0;
+    }
+
+    fetch(bytes, signal) {
+        return new Promise((resolve, reject) => {
+            const startedAt = this.clock.now;
+            const transfer = { remaining: bytes, bytes, resolve: null };
+            transfer.resolve = () => resolve({ bytes, duration: this.clock.now - startedAt });
+            let aborted = false;
+            signal?.addEventListener('abort', () => {
+                aborted = true;
+                this.transfers.delete(transfer);
+                reject(new Error('aborted'));
+            });
+            this.clock.setTimeout(() => {
+                if (!aborted) this.transfers.add(transfer);
+            }, this.rtt);
+        });
+    }
+
+    nextCompletion() {
+        if (!this.transfers.size) return Infinity;
+        const share = this.bytesPerMs / this.transfers.size;
+        const smallest = Math.min(...[...this.transfers].map(t => t.remaining));
+        return this.clock.now + smallest / share;
+    }
+
+    advance(elapsed) {
+        if (!this.transfers.size || elapsed <= 0) return;
+        const moved = elapsed * this.bytesPerMs / this.transfers.size;
+        this.transfers.forEach(transfer => {
+            const step = Math.min(moved, transfer.remaining);
+            transfer.remaining -= step;
+            this.bytesTransferred += step;
+        });
+    }
+
+    completeDue() {
+        this.transfers.forEach(transfer => {
+            if (transfer.remaining <= 1e-6) {
+                this.transfers.delete(transfer);
+                transfer.resolve();
+            }
+        });
+    }
+}
+
+function flushMicrotasks() {
+    return new Promise(resolve => setImmediate(resolve));
+}
+
+// Viewer timeline: autoplay, plus an optional burst of fast "next" presses
+function viewerSchedule(scenario, slideCount) {
+    const moves = [];
+    let time = 0;
+    for (let shown = 1; shown < slideCount; shown++) {
+        if (scenario.skimAt !== undefined && shown >= scenario.skimAt && shown < scenario.skimAt + scenario.skimCount) {
+            time += 400;
+        } else {
+            time += scenario.interval;
+        }
+        moves.push(time);
+    }
+    return moves;
+}
+
+async function simulate(deck, profileName, scenario, strategyName) {
+    const profile = PROFILES[profileName];
+    const strategy = STRATEGIES[strategyName];
+    const clock = new VirtualClock();
+    const network = new Network(clock, profile);
+    const onDemandLoads = new Map(); // Index -> AbortController of the viewer's own load
+    // Time the current slide spent on screen without its media
+    let shown = null;
+    let stalledMs = 0;
+    let stalledSlides = 0;
+    const endStall = () => {
+        if (shown && !shown.ready) {
+            stalledMs += clock.now - shown.at;
+            shown.ready = true;
+        }
+    };
+
+    const fetchSlide = (index, signal) => network.fetch(deck[index].bytes, signal);
+
+    const scheduler = new PrefetchScheduler({
+        ...strategy.options,
+        total: deck.length,
+        connection: strategy.useConnection ? profile : null,
+        slideDuration: scenario.interval,
+        // The manifest's per-slide byte sizes
+        sizeOf: strategy.useSizes ? index => deck[index].bytes : undefined,
+        load(index, { signal, allowHeavy }) {
+            if (!allowHeavy && deck[index].type !== 'image') {
+                return PrefetchScheduler.SKIPPED;
+            }
+            return fetchSlide(index, signal);
+        },
+    });
+
+    const show = (index, direction) => {
+        endStall();
+        scheduler.recordShown(index);
+        shown = { index, at: clock.now, ready: scheduler.ready.has(index) };
+        if (!shown.ready) {
+            stalledSlides++;
+            if (!scheduler.inFlight.has(index) && !onDemandLoads.has(index)) {
+                const controller = new AbortController();
+                onDemandLoads.set(index, controller);
+                fetchSlide(index, controller.signal).then(transfer => {
+                    onDemandLoads.delete(index);
+                    scheduler.markReady(index, transfer);
+                }, () => {});
+            }
+        }
+        scheduler.update(index, direction);
+        // Recycle slides outside the DOM window, as slide.js does; removing
+        // the element also stops whatever it was still downloading
+        const keep = Math.max(SLIDE_WINDOW, scheduler.depth());
+        const outside = other => {
+            const distance = Math.abs(other - index);
+            return Math.min(distance, deck.length - distance) > keep;
+        };
+        [...scheduler.ready].filter(outside).forEach(other => scheduler.forget(other));
+        [...onDemandLoads.keys()].filter(outside).forEach(other => {
+            onDemandLoads.get(other).abort();
+            onDemandLoads.delete(other);
+        });
+    };
+
+    // Loads that land while the slide is on screen end its stall
+    const originalMarkReady = scheduler.markReady.bind(scheduler);
+    scheduler.markReady = (index, transfer) => {
+        originalMarkReady(index, transfer);
+        if (shown && shown.index === index) endStall();
+    };
+
+    // First slide is rendered by the page and loads on demand
+    show(0, 'next');
+    const moves = viewerSchedule(scenario, deck.length);
+    moves.forEach((time, offset) => clock.setTimeout(() => show(offset + 1, 'next'), time));
+    const end = moves[moves.length - 1] + scenario.interval;
+
+    while (clock.now < end) {
+        await flushMicrotasks();
+        const next = Math.min(clock.nextTimer(), network.nextCompletion(), end);
+        network.advance(next - clock.now);
+        clock.now = next;
+        network.completeDue();
+        await flushMicrotasks();
+        clock.runDue();
+    }
+    await flushMicrotasks();
+    endStall();
+
+    const stats = scheduler.snapshot();
+    return {
+        profile: profileName,
+        scenario: scenario.name,
+        strategy: strategyName,
+        hitRate: stats.hitRate,
+        hits: stats.hits,
+        misses: stats.misses,
+        meanStallMs: stalledSlides ? Math.round(stalledMs / stalledSlides) : 0,
+        totalStallMs: Math.round(stalledMs),
+        stalledFraction: Math.round(stalledMs / end * 1000) / 1000,
+        started: stats.started,
+        cancelled: stats.cancelled,
+        skipped: stats.skipped,
+        depth: stats.depth,
+        megabytes: Math.round(network.bytesTransferred / MB * 10) / 10,
+    };
+}
+
+// Without save-data (which trades stalls for bytes) the adaptive scheduler
+// must not stall more than fixed preloading in any 3g scenario and must stall
+// less over all of them, since large media outgrow a one-slide head start
+// there; across every profile it must not stall more in total. Total stall
+// time is compared: the mean per stalled slide rises whenever the short
+// stalls are the ones avoided.
+function checkResults(results) {
+    const failures = [];
+    const totals = { adaptive: 0, fixed: 0 };
+    const totals3g = { adaptive: 0, fixed: 0 };
+    results.filter(r => !PROFILES[r.profile].saveData).forEach(r => {
+        totals[r.strategy] += r.totalStallMs;
+        if (r.profile !== '3g') return;
+        totals3g[r.strategy] += r.totalStallMs;
+        if (r.strategy !== 'adaptive') return;
+        const fixed = results.find(f =>
+            f.profile === r.profile && f.scenario === r.scenario && f.strategy === 'fixed');
+        if (r.totalStallMs > fixed.totalStallMs) {
+            failures.push(`3g ${r.scenario}: adaptive stalled ${r.totalStallMs} ms, fixed ${fixed.totalStallMs} ms`);
+        }
+    });
+    if (totals3g.adaptive >= totals3g.fixed) {
+        failures.push(`3g: adaptive stalled ${totals3g.adaptive} ms, fixed ${totals3g.fixed} ms`);
+    }
+    if (totals.adaptive > totals.fixed) {
+        failures.push(`all profiles: adaptive stalled ${totals.adaptive} ms, fixed ${totals.fixed} ms`);
+    }
+    return failures;
+}
+
+async function main() {
+    const args = parseArgs(process.argv.slice(2));
+    const deck = makeDeck(args.slides);
+    const scenarios = [
+        { name: 'autoplay-7s', interval: 7000 },
+        { name: 'autoplay-3s', interval: 3000 },
+        { name: 'skim', interval: 7000, skimAt: 10, skimCount: 8 },
+    ];
+
+    const results = [];
+    for (const profileName of Object.keys(PROFILES)) {
+        for (const scenario of scenarios) {
+            for (const strategyName of Object.keys(STRATEGIES)) {
+                results.push(await simulate(deck, profileName, scenario, strategyName));
+            }
+        }
+    }
+
+    const failures = checkResults(results);
+    if (failures.length) {
+        process.exitCode = 1;
+    }
+    if (args.json) {
+        console.log(JSON.stringify({ slides: args.slides, results, failures }, null, 2));
+        return;
+    }
+    console.log(`${args.slides} slides`);
+    console.log('profile        scenario      strategy  hit-rate  stall-ms  stalled  depth  cancelled  skipped      MB');
+    results.forEach(r => {
+        console.log([
+            r.profile.padEnd(14),
+            r.scenario.padEnd(13),
+            r.strategy.padEnd(9),
+            `${(r.hitRate * 100).toFixed(1)}%`.padStart(8),
+            String(r.meanStallMs).padStart(9),
+            `${(r.stalledFraction * 100).toFixed(1)}%`.padStart(8),
+            String(r.depth).padStart(6),
+            String(r.cancelled).padStart(10),
+            String(r.skipped).padStart(8),
+            String(r.megabytes).padStart(7),
+        ].join(' '));
+    });
+    failures.forEach(failure => console.error(`FAIL ${failure}`));
+}
+
+main();
@@ -0,0 +1,112 @@
+"""
+Benchmark: slug allocation for titles that many memorials share.
+
+Seeds a throwaway SQLite database with --existing slideshows all titled
+"Mohammad Ahmadi" (slugs mohammad-ahmadi, mohammad-ahmadi-1, ...), then
+saves --count more with the same title, first with the old create_slug
+(one exists() query per taken suffix) and then with the current one
+(memories.models.unique_slug), reporting time and queries per save.
+
+Usage: python benchmarks/slug_allocation.py [--existing 10000] [--count 20] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myMemory.settings')
+
+TITLE = 'Mohammad Ahmadi'
+
+
+def probing_create_slug(sender, instance, *args, **kwargs):
+    """create_slug before it used unique_slug."""
+    from django.utils.text import slugify
+
+    if not instance.slug:
+        base_slug = slugify(instance.title)
+        instance.slug = base_slug
+        counter = 1
+        while sender.objects.filter(slug=instance.slug).exists():
+            instance.slug = f"{base_slug}-{counter}"
+            counter += 1
+
+
+def seed(existing):
+    from django.utils.text import slugify
+
+    from accounts.models import User
+    from memories.models import MemorySlideShow
+
+    owner = User.objects.create_user(username='slug-benchmark')
+    base = slugify(TITLE)
+    MemorySlideShow.objects.bulk_create([
+        MemorySlideShow(owner=owner, title=TITLE, slug=f'{base}-{index}' if index else base)
+        for index in range(existing)
+    ], batch_size=500)
+    return owner
+
+
+def measure(owner, count):
+    from django.db import connection
+
+    from memories.models import MemorySlideShow
+
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        started = time.perf_counter()
+        for _ in range(count):
+            MemorySlideShow.objects.create(owner=owner, title=TITLE)
+        seconds = time.perf_counter() - started
+    return {'ms_per_save': seconds / count * 1000, 'queries_per_save': queries / count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--existing', type=int, default=10_000)
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    os.environ.update(DB_ENGINE='sqlite', SQLITE_PATH=os.path.join(directory.name, 'slugs.sqlite3'))
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+    from django.db.models.signals import pre_save
+
+    from memories.models import MemorySlideShow, create_slug
+
+    call_command('migrate', verbosity=0)
+    owner = seed(args.existing)
+
+    results = {'existing': args.existing, 'count': args.count}
+    pre_save.disconnect(create_slug, sender=MemorySlideShow)
+    pre_save.connect(probing_create_slug, sender=MemorySlideShow)
+    results['probing'] = measure(owner, args.count)
+    pre_save.disconnect(probing_create_slug, sender=MemorySlideShow)
+    pre_save.connect(create_slug, sender=MemorySlideShow)
+    results['single-query'] = measure(owner, args.count)
+    directory.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'Saving {args.count} slideshows titled {TITLE!r} next to {args.existing} existing ones')
+    for name in ('probing', 'single-query'):
+        print(f'{name:>13}: {results[name]["ms_per_save"]:9.2f} ms/save {results[name]["queries_per_save"]:9.1f} queries/save')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Per-connection database setup.
+
+``configure_sqlite`` runs on ``connection_created`` (connected in
+``CoreConfig.ready``) and applies ``settings.SQLITE_PRAGMAS``; other
+backends are left alone.
+"""
+from django.conf import settings
+
+# Pragmas that take a keyword rather than a number
+SQLITE_KEYWORD_PRAGMAS = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+}
+
+
+def sqlite_pragma_statements(pragmas):
+    """``PRAGMA`` statements for ``pragmas``, rejecting unknown values."""
+    statements = []
+    for name, value in pragmas.items():
+        if name in SQLITE_KEYWORD_PRAGMAS:
+            value = str(value).upper()
+            if value not in SQLITE_KEYWORD_PRAGMAS[name]:
+                raise ValueError(f'Unsupported value for PRAGMA {name}: {value}')
+        else:
+            value = int(value)
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in sqlite_pragma_statements(getattr(settings, 'SQLITE_PRAGMAS', {})):
+            cursor.execute(statement)
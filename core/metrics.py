@@ -0,0 +1,271 @@
+"""
+Request performance metrics (opt-in with PERF_METRICS, see
+``core.middleware.PerformanceMiddleware``).
+
+Every request gets a ``RequestStats`` in a context variable; the database
+execute wrapper and the template render wrapper installed by ``install()``
+add to it, which also works for async views since ``sync_to_async`` copies
+the context into its thread. The middleware then records the totals in
+``registry``, a set of per-view histograms.
+
+Each gunicorn worker has its own registry. With PERF_METRICS_DIR set,
+workers write snapshots there (at most every PERF_METRICS_WRITE_INTERVAL
+seconds and on exit) and ``/metrics`` adds them all up, so any worker can
+answer for the whole server. Snapshots of exited workers are kept so
+totals don't drop when gunicorn recycles workers; empty the directory when
+the service restarts.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name: (type, help, buckets)
+METRICS = {
+    'mymemory_requests_total': ('counter', 'Requests by view and status code.', None),
+    'mymemory_request_duration_seconds': ('histogram', 'Total time spent handling a request.', LATENCY_BUCKETS),
+    'mymemory_db_queries': ('histogram', 'Database queries per request.', QUERY_COUNT_BUCKETS),
+    'mymemory_db_duration_seconds': ('histogram', 'Time spent in database queries per request.', LATENCY_BUCKETS),
+    'mymemory_template_render_seconds': ('histogram', 'Time spent rendering templates per request.', LATENCY_BUCKETS),
+    'mymemory_response_size_bytes': ('histogram', 'Response body size.', SIZE_BUCKETS),
+}
+
+current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Timings collected while one request is handled."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper (see ``install``)."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def add_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    add_query_timer(connection)
+
+
+def install():
+    """Instrument database connections and template rendering. Idempotent."""
+    from django.template.backends.django import Template
+
+    connection_created.connect(install_query_timer, dispatch_uid='core.metrics.install_query_timer')
+    for connection in connections.all(initialized_only=True):
+        add_query_timer(connection)
+
+    if getattr(Template.render, 'timed', False):
+        return
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        stats = current_stats.get()
+        if stats is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - started
+
+    timed_render.timed = True
+    Template.render = timed_render
+
+
+def labels_key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self, directory=None, write_interval=None):
+        self.directory = directory
+        self.write_interval = write_interval
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._last_write = time.monotonic()
+        self._snapshot_name = f'{os.getpid()}-{uuid.uuid4().hex}.json'
+
+    def get_directory(self):
+        directory = self.directory or getattr(settings, 'PERF_METRICS_DIR', None)
+        return Path(directory) if directory else None
+
+    def get_write_interval(self):
+        if self.write_interval is not None:
+            return self.write_interval
+        return getattr(settings, 'PERF_METRICS_WRITE_INTERVAL', 5)
+
+    def inc(self, name, labels, amount=1):
+        key = labels_key(labels)
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = labels_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {}).get(key)
+            if series is None:
+                series = self._histograms[name][key] = {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def record(self, view, status, stats, size=None):
+        """Record one finished request."""
+        labels = {'view': view}
+        self.inc('mymemory_requests_total', {'view': view, 'status': str(status)})
+        self.observe('mymemory_request_duration_seconds', labels, stats.elapsed)
+        self.observe('mymemory_db_queries', labels, stats.queries)
+        self.observe('mymemory_db_duration_seconds', labels, stats.db_seconds)
+        self.observe('mymemory_template_render_seconds', labels, stats.template_seconds)
+        if size is not None:
+            self.observe('mymemory_response_size_bytes', labels, size)
+        if time.monotonic() - self._last_write >= self.get_write_interval():
+            self.write_snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({'counters': self._counters, 'histograms': self._histograms}))
+
+    def write_snapshot(self):
+        """Write this process's totals to PERF_METRICS_DIR. Returns True on success."""
+        self._last_write = time.monotonic()
+        directory = self.get_directory()
+        if directory is None:
+            return False
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / self._snapshot_name
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(self.snapshot()))
+            tmp_path.replace(path)
+        except OSError:
+            logger.warning('Could not write metrics snapshot to %s', directory, exc_info=True)
+            return False
+        return True
+
+    def collect(self):
+        """Totals of this process and every snapshot in PERF_METRICS_DIR."""
+        snapshots = [self.snapshot()]
+        directory = self.get_directory()
+        if directory is not None and directory.is_dir():
+            for path in sorted(directory.glob('*.json')):
+                if path.name == self._snapshot_name:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    logger.warning('Skipping unreadable metrics snapshot %s', path)
+        return merge_snapshots(snapshots)
+
+
+def merge_snapshots(snapshots):
+    merged = {'counters': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        for name, values in snapshot.get('counters', {}).items():
+            target = merged['counters'].setdefault(name, {})
+            for key, value in values.items():
+                target[key] = target.get(key, 0) + value
+        for name, values in snapshot.get('histograms', {}).items():
+            target = merged['histograms'].setdefault(name, {})
+            for key, series in values.items():
+                if key not in target:
+                    target[key] = {'buckets': list(series['buckets']), 'sum': series['sum'], 'count': series['count']}
+                    continue
+                total = target[key]
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], series['buckets'])]
+                total['sum'] += series['sum']
+                total['count'] += series['count']
+    return merged
+
+
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items())
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus(snapshot):
+    """``snapshot`` in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        values = snapshot[f'{kind}s'].get(name)
+        if not values:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(values.items()):
+            labels = json.loads(key)
+            if kind == 'counter':
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, value['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels, le="+Inf")} {value["count"]}')
+            lines.append(f'{name}_sum{format_labels(labels)} {value["sum"]}')
+            lines.append(f'{name}_count{format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def write_snapshot():
+    """Save this process's metrics before it exits (gunicorn ``worker_exit``)."""
+    if getattr(settings, 'PERF_METRICS', False):
+        registry.write_snapshot()
+
+
+atexit.register(write_snapshot)
@@ -0,0 +1,97 @@
+// Grouped slide changelist (SlideAdmin.changelist_view): each slideshow's
+// slides are fetched from SlideAdmin.group_slides_view when its group is
+// opened, one page at a time, so the changelist itself never loads slides.
+(function () {
+    'use strict';
+
+    function slideRow(slide) {
+        const row = document.createElement('div');
+        row.className = 'directory-slide';
+
+        const preview = document.createElement('div');
+        preview.className = 'slide-preview';
+        if (slide.thumbnail) {
+            const img = document.createElement('img');
+            img.src = slide.thumbnail;
+            img.height = 40;
+            img.loading = 'lazy';
+            preview.append(img);
+        } else {
+            const label = document.createElement('span');
+            label.textContent = slide.media_type.toUpperCase();
+            preview.append(label);
+        }
+
+        const title = document.createElement('div');
+        title.className = 'slide-title';
+        const caption = document.createElement('strong');
+        caption.textContent = slide.caption;
+        title.append(caption);
+
+        const actions = document.createElement('div');
+        actions.className = 'slide-actions';
+        const edit = document.createElement('a');
+        edit.href = slide.change_url;
+        edit.className = 'button';
+        edit.textContent = 'Edit';
+        const remove = document.createElement('a');
+        remove.href = slide.delete_url;
+        remove.className = 'button deletelink';
+        remove.textContent = 'Delete';
+        actions.append(edit, remove);
+
+        row.append(preview, title, actions);
+        return row;
+    }
+
+    async function loadPage(content, page) {
+        const url = new URL(content.dataset.groupSlides, window.location.href);
+        url.searchParams.set('page', page);
+        const response = await fetch(url, { credentials: 'same-origin' });
+        if (!response.ok) throw new Error(`Could not load slides (${response.status})`);
+        const data = await response.json();
+
+        content.querySelector('.load-more')?.remove();
+        data.slides.forEach(slide => content.append(slideRow(slide)));
+        if (data.next_page) {
+            const more = document.createElement('div');
+            more.className = 'load-more';
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'button';
+            button.textContent = `Load more (${data.count - content.querySelectorAll('.directory-slide').length} left)`;
+            button.addEventListener('click', () => {
+                button.disabled = true;
+                loadPage(content, data.next_page).catch(error => {
+                    button.disabled = false;
+                    button.textContent = error.message;
+                });
+            });
+            more.append(button);
+            content.append(more);
+        }
+    }
+
+    function bindGroup(group) {
+        const toggle = group.querySelector('[data-group-toggle]');
+        const content = group.querySelector('[data-group-slides]');
+        let loaded = false;
+        toggle.addEventListener('click', async () => {
+            content.hidden = !content.hidden;
+            toggle.textContent = content.hidden ? 'Show Slides' : 'Hide Slides';
+            if (content.hidden || loaded) return;
+            loaded = true;
+            content.textContent = '';
+            try {
+                await loadPage(content, 1);
+            } catch (error) {
+                loaded = false;
+                content.textContent = error.message;
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('.directory-group').forEach(bindGroup);
+    });
+})();
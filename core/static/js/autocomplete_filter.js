@@ -0,0 +1,19 @@
+// Changelist filters rendered with an autocomplete select (AutocompleteFilter
+// in memories/admin.py): picking an object reloads the list filtered by it.
+'use strict';
+{
+    const $ = django.jQuery;
+
+    $(function() {
+        $('select[data-autocomplete-filter]').on('change', function() {
+            const params = new URLSearchParams(window.location.search);
+            if (this.value) {
+                params.set(this.name, this.value);
+            } else {
+                params.delete(this.name);
+            }
+            params.delete('p');
+            window.location.search = params.toString();
+        });
+    });
+}
@@ -0,0 +1,177 @@
+// Resumable chunked uploads (memories/uploads.py) for large videos and music.
+//
+// ChunkedUpload sends a file in pieces of the server's chunk size with a
+// Content-Range and a SHA-256 of each piece. After a network error it asks
+// the server for its offset and carries on from there, backing off between
+// attempts. The upload URL is kept in localStorage, so choosing the same
+// file again after a reload resumes instead of starting over.
+//
+// Admin pages mark file inputs with data-chunked-upload (the start URL) and
+// optionally data-target ("slide" or "music") and data-slide (slide id).
+(function (root) {
+    'use strict';
+
+    const STORAGE_PREFIX = 'chunked-upload:';
+    const MAX_RETRIES = 8;
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function toBase64(buffer) {
+        let binary = '';
+        new Uint8Array(buffer).forEach(byte => { binary += String.fromCharCode(byte); });
+        return btoa(binary);
+    }
+
+    async function chunkChecksum(blob) {
+        if (!root.crypto || !root.crypto.subtle) return null; // Needs a secure context
+        const digest = await root.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return `sha256 ${toBase64(digest)}`;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    class ChunkedUpload {
+        constructor(file, options) {
+            this.file = file;
+            this.startUrl = options.startUrl;
+            this.target = options.target || 'slide';
+            this.slide = options.slide || null;
+            this.onProgress = options.onProgress || (() => {});
+            this.state = null;
+            this.storageKey = [STORAGE_PREFIX + this.startUrl, this.target, this.slide, file.name, file.size, file.lastModified].join('|');
+        }
+
+        async request(url, init) {
+            const headers = Object.assign({ 'X-CSRFToken': csrfToken() }, init.headers);
+            return fetch(url, Object.assign({ credentials: 'same-origin' }, init, { headers }));
+        }
+
+        // Reuse the upload started for this file earlier, if the server still has it
+        async begin() {
+            const saved = root.localStorage && root.localStorage.getItem(this.storageKey);
+            if (saved) {
+                const response = await this.request(saved, { method: 'GET' });
+                if (response.ok) {
+                    const state = await response.json();
+                    if (state.status === 'uploading' && state.size === this.file.size) {
+                        this.state = state;
+                        return;
+                    }
+                }
+            }
+            const response = await this.request(this.startUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    filename: this.file.name,
+                    size: this.file.size,
+                    target: this.target,
+                    slide: this.slide,
+                }),
+            });
+            if (!response.ok) throw new Error((await response.json()).error || `Upload failed (${response.status})`);
+            this.state = await response.json();
+            if (root.localStorage) root.localStorage.setItem(this.storageKey, this.state.url);
+        }
+
+        async refresh() {
+            const response = await this.request(this.state.url, { method: 'GET' });
+            if (!response.ok) throw new Error(`Upload is gone (${response.status})`);
+            this.state = await response.json();
+        }
+
+        async sendChunk() {
+            const start = this.state.offset;
+            const end = Math.min(start + this.state.chunk_size, this.file.size) - 1;
+            const chunk = this.file.slice(start, end + 1);
+            const headers = {
+                'Content-Type': 'application/octet-stream',
+                'Content-Range': `bytes ${start}-${end}/${this.file.size}`,
+            };
+            const checksum = await chunkChecksum(chunk);
+            if (checksum) headers['Upload-Checksum'] = checksum;
+            const response = await this.request(this.state.url, { method: 'PUT', headers, body: chunk });
+            const body = await response.json();
+            if (response.status === 409) {
+                // Someone (or an earlier attempt) got further; continue from there
+                this.state.offset = body.offset;
+                return;
+            }
+            if (response.status === 460 && body.error.startsWith('Chunk')) {
+                return; // Corrupted in transit; the server dropped it, send it again
+            }
+            if (!response.ok) {
+                const error = new Error(body.error || `Upload failed (${response.status})`);
+                error.fatal = true;
+                throw error;
+            }
+            this.state = body;
+        }
+
+        async start() {
+            await this.begin();
+            let retries = 0;
+            while (this.state.status === 'uploading') {
+                this.onProgress(this.state.offset, this.file.size);
+                try {
+                    await this.sendChunk();
+                    retries = 0;
+                } catch (error) {
+                    if (error.fatal || ++retries > MAX_RETRIES) throw error;
+                    await sleep(Math.min(1000 * 2 ** retries, 30000));
+                    await this.refresh().catch(() => {});
+                }
+            }
+            if (root.localStorage) root.localStorage.removeItem(this.storageKey);
+            this.onProgress(this.file.size, this.file.size);
+            return this.state;
+        }
+
+        async abort() {
+            if (!this.state) return;
+            await this.request(this.state.url, { method: 'DELETE' });
+            if (root.localStorage) root.localStorage.removeItem(this.storageKey);
+        }
+    }
+
+    function bindInput(input) {
+        const status = document.createElement('span');
+        status.className = 'chunked-upload-status';
+        status.style.marginLeft = '8px';
+        input.after(status);
+        input.addEventListener('change', async () => {
+            const file = input.files[0];
+            if (!file) return;
+            input.disabled = true;
+            const upload = new ChunkedUpload(file, {
+                startUrl: input.dataset.chunkedUpload,
+                target: input.dataset.target,
+                slide: input.dataset.slide,
+                onProgress(sent, total) {
+                    status.textContent = `${Math.floor(sent / total * 100)}% of ${(total / 1048576).toFixed(1)} MB`;
+                },
+            });
+            try {
+                await upload.start();
+                status.textContent = 'Uploaded. Reload the page to see it.';
+            } catch (error) {
+                status.textContent = `${error.message}. Choose the file again to resume.`;
+            } finally {
+                input.disabled = false;
+                input.value = '';
+            }
+        });
+    }
+
+    root.ChunkedUpload = ChunkedUpload;
+    if (root.document) {
+        document.addEventListener('DOMContentLoaded', () => {
+            document.querySelectorAll('input[data-chunked-upload]').forEach(bindInput);
+        });
+    }
+})(typeof window !== 'undefined' ? window : globalThis);
@@ -0,0 +1,227 @@
+// Look-ahead prefetching for the slideshow.
+//
+// PrefetchScheduler decides which slides to load ahead of the current one:
+// far enough that every upcoming slide has time to arrive before it is
+// shown, judged from its size (the `sizeOf` callback, fed by the manifest)
+// against the estimated bandwidth and the autoplay interval. It stays
+// shallow on save-data, where heavy video slides are skipped altogether.
+// Prefetches for slides the viewer has navigated away from are aborted, and
+// every shown slide is counted as a hit (already loaded) or a miss.
+//
+// The scheduler knows nothing about the DOM: slide.js passes a `load`
+// callback, so the same code runs under benchmarks/prefetch_simulation.js.
+(function (root) {
+    'use strict';
+
+    // Typical downlink (Mbps) for each Network Information effectiveType
+    const EFFECTIVE_TYPE_DOWNLINK = { 'slow-2g': 0.05, '2g': 0.25, '3g': 1.5, '4g': 10 };
+
+    // Returned by `load` when a heavy slide was not prefetched on save-data
+    const SKIPPED = 'skipped';
+
+    const DEFAULT_OPTIONS = {
+        minDepth: 1,                    // Slides always prefetched ahead
+        maxDepth: 4,                    // Upper bound on the look-ahead
+        behind: 1,                      // Slides prefetched behind the current one
+        maxConcurrent: 2,               // Prefetches in flight at once
+        averageSlideBytes: 400 * 1024,  // For slides of unknown size, refined by observeTransfer
+        safetyFactor: 1.5,              // Head start wanted over the estimated load time
+        smoothing: 0.3,                 // Weight of the newest transfer in the estimates
+        slideDuration: 7000,            // Autoplay interval in ms, null when paused
+    };
+
+    class PrefetchScheduler {
+        constructor(options) {
+            this.options = Object.assign({}, DEFAULT_OPTIONS, options);
+            this.total = this.options.total;
+            this.load = this.options.load;
+            this.sizeOf = this.options.sizeOf || (() => null); // Slide index -> bytes, null if unknown
+            this.connection = this.options.connection || null;
+            this.slideDuration = this.options.slideDuration;
+            this.slideBytes = this.options.averageSlideBytes;
+            this.throughput = null; // Observed bytes per ms
+            this.current = 0;
+            this.direction = 'next';
+            this.ready = new Set();
+            this.skipped = new Set();
+            this.inFlight = new Map(); // Slide index -> AbortController
+            this.queue = [];
+            this.stats = { hits: 0, misses: 0, started: 0, completed: 0, cancelled: 0, skipped: 0, failed: 0 };
+        }
+
+        get saveData() {
+            return Boolean(this.connection && this.connection.saveData);
+        }
+
+        setSlideDuration(duration) {
+            this.slideDuration = duration;
+        }
+
+        // Expected time (ms) to load `bytes` (one average slide by default),
+        // or null without any bandwidth signal
+        estimatedLoadTime(bytes = this.slideBytes) {
+            let bytesPerMs = this.throughput;
+            if (!bytesPerMs && this.connection) {
+                const downlink = this.connection.downlink
+                    || EFFECTIVE_TYPE_DOWNLINK[this.connection.effectiveType];
+                if (downlink) {
+                    bytesPerMs = downlink * 1e6 / 8 / 1000;
+                }
+            }
+            if (!bytesPerMs) {
+                return null;
+            }
+            const rtt = (this.connection && this.connection.rtt) || 0;
+            return rtt + bytes / bytesPerMs;
+        }
+
+        indexAt(distance, direction = this.direction) {
+            const step = direction === 'prev' ? -1 : 1;
+            return (((this.current + step * distance) % this.total) + this.total) % this.total;
+        }
+
+        // Number of slides to keep loaded ahead of the current one: the
+        // furthest upcoming slide that could not arrive in time if it only
+        // started loading after the next move. Slides still to load in front
+        // of it share the connection, so their bytes count towards its time.
+        depth() {
+            const { minDepth, maxDepth, safetyFactor } = this.options;
+            if (this.saveData || !this.slideDuration) {
+                return minDepth;
+            }
+            if (this.estimatedLoadTime() === null) {
+                return Math.min(minDepth + 1, maxDepth);
+            }
+            let depth = minDepth;
+            let pendingBytes = 0;
+            for (let distance = 1; distance <= maxDepth; distance++) {
+                const index = this.indexAt(distance);
+                if (!this.ready.has(index)) {
+                    const size = this.sizeOf(index);
+                    pendingBytes += size > 0 ? size : this.slideBytes;
+                }
+                const loadTime = this.estimatedLoadTime(pendingBytes);
+                if (distance > depth && loadTime * safetyFactor > (distance - 1) * this.slideDuration) {
+                    depth = distance;
+                }
+            }
+            return depth;
+        }
+
+        // Slides to prefetch around `current`, most urgent first
+        targets(current, direction = 'next') {
+            this.current = current;
+            this.direction = direction;
+            const wanted = [];
+            const add = index => {
+                if (index !== current && !wanted.includes(index)) {
+                    wanted.push(index);
+                }
+            };
+            const depth = this.depth();
+            for (let distance = 1; distance <= depth; distance++) {
+                add(this.indexAt(distance));
+            }
+            const behind = direction === 'prev' ? 'next' : 'prev';
+            for (let distance = 1; distance <= this.options.behind; distance++) {
+                add(this.indexAt(distance, behind));
+            }
+            return wanted;
+        }
+
+        // Re-plan after moving to `current`: abort prefetches that are no
+        // longer wanted and start the most urgent missing ones
+        update(current, direction = 'next') {
+            const wanted = this.targets(current, direction);
+            this.inFlight.forEach((controller, index) => {
+                if (index !== current && !wanted.includes(index)) {
+                    controller.abort();
+                    this.inFlight.delete(index);
+                    this.stats.cancelled++;
+                }
+            });
+            this.queue = wanted.filter(index =>
+                !this.ready.has(index) && !this.inFlight.has(index) && !this.skipped.has(index));
+            this.pump();
+            return wanted;
+        }
+
+        pump() {
+            while (this.inFlight.size < this.options.maxConcurrent && this.queue.length) {
+                this.start(this.queue.shift());
+            }
+        }
+
+        start(index) {
+            const controller = new AbortController();
+            this.inFlight.set(index, controller);
+            this.stats.started++;
+            Promise.resolve()
+                .then(() => this.load(index, { signal: controller.signal, allowHeavy: !this.saveData }))
+                .then(result => {
+                    if (controller.signal.aborted) return;
+                    this.inFlight.delete(index);
+                    if (result === SKIPPED) {
+                        this.skipped.add(index);
+                        this.stats.skipped++;
+                    } else {
+                        this.stats.completed++;
+                        this.markReady(index, result);
+                    }
+                }, () => {
+                    if (controller.signal.aborted) return;
+                    this.inFlight.delete(index);
+                    this.stats.failed++;
+                })
+                .then(() => this.pump());
+        }
+
+        // A slide's media finished loading; `transfer` ({bytes, duration})
+        // refines the throughput estimate when available
+        markReady(index, transfer) {
+            this.ready.add(index);
+            if (transfer && transfer.bytes > 0 && transfer.duration > 0) {
+                this.observeTransfer(transfer.bytes, transfer.duration);
+            }
+        }
+
+        observeTransfer(bytes, duration) {
+            const weight = this.options.smoothing;
+            const rate = bytes / duration;
+            this.throughput = this.throughput === null ? rate : weight * rate + (1 - weight) * this.throughput;
+            this.slideBytes = weight * bytes + (1 - weight) * this.slideBytes;
+        }
+
+        // The slide's element was dropped from the DOM
+        forget(index) {
+            this.ready.delete(index);
+            this.skipped.delete(index);
+        }
+
+        recordShown(index) {
+            if (this.ready.has(index)) {
+                this.stats.hits++;
+            } else {
+                this.stats.misses++;
+            }
+        }
+
+        snapshot() {
+            const shown = this.stats.hits + this.stats.misses;
+            return Object.assign({}, this.stats, {
+                hitRate: shown ? this.stats.hits / shown : null,
+                depth: this.depth(),
+            });
+        }
+    }
+
+    PrefetchScheduler.SKIPPED = SKIPPED;
+    PrefetchScheduler.EFFECTIVE_TYPE_DOWNLINK = EFFECTIVE_TYPE_DOWNLINK;
+    PrefetchScheduler.DEFAULT_OPTIONS = DEFAULT_OPTIONS;
+
+    if (typeof module === 'object' && module.exports) {
+        module.exports = { PrefetchScheduler };
+    } else {
+        root.PrefetchScheduler = PrefetchScheduler;
+    }
+})(typeof self !== 'undefined' ? self : this);
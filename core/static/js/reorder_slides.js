@@ -0,0 +1,76 @@
+// Drag-and-drop slide order (admin "Reorder slides" page). The complete new
+// order is sent in one POST to views.reorderSlides, which only rewrites the
+// order keys of the slides that actually moved.
+(function () {
+    'use strict';
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function renumber(list) {
+        list.querySelectorAll('[data-slide] .position').forEach((position, index) => {
+            position.textContent = index + 1;
+        });
+    }
+
+    // The item the pointer is above the middle of, or null for the end
+    function itemAfter(list, y) {
+        const items = [...list.querySelectorAll('[data-slide]:not(.dragging)')];
+        return items.find(item => {
+            const box = item.getBoundingClientRect();
+            return y < box.top + box.height / 2;
+        }) || null;
+    }
+
+    function bind(list) {
+        const save = document.querySelector('[data-reorder-save]');
+        const status = document.querySelector('[data-reorder-status]');
+        let dragged = null;
+
+        list.addEventListener('dragstart', event => {
+            dragged = event.target.closest('[data-slide]');
+            if (!dragged) return;
+            dragged.classList.add('dragging');
+            event.dataTransfer.effectAllowed = 'move';
+        });
+        list.addEventListener('dragover', event => {
+            if (!dragged) return;
+            event.preventDefault();
+            list.insertBefore(dragged, itemAfter(list, event.clientY));
+        });
+        list.addEventListener('dragend', () => {
+            if (!dragged) return;
+            dragged.classList.remove('dragging');
+            dragged = null;
+            renumber(list);
+            status.textContent = 'Unsaved changes';
+        });
+
+        save.addEventListener('click', async () => {
+            save.disabled = true;
+            status.textContent = 'Saving…';
+            const slides = [...list.querySelectorAll('[data-slide]')].map(item => Number(item.dataset.slide));
+            try {
+                const response = await fetch(list.dataset.reorderSlides, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken() },
+                    body: JSON.stringify({ slides }),
+                });
+                const body = await response.json();
+                if (!response.ok) throw new Error(body.error || `Saving failed (${response.status})`);
+                status.textContent = `Saved (${body.updated} slide${body.updated === 1 ? '' : 's'} moved).`;
+            } catch (error) {
+                status.textContent = error.message;
+            } finally {
+                save.disabled = false;
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-reorder-slides]').forEach(bind);
+    });
+})();
@@ -1,6 +1,6 @@
 // Global variables
 let currentSlide = 0;
-let slides = [];
+const slideElements = new Map(); // Slide index -> element currently in the DOM
 let totalSlides = 0;
 let slideCounter = null;
 let totalSlidesCounter = null;
@@ -13,6 +13,23 @@ let pauseStartTime = 0;
 let totalPausedTime = 0;
 const loadedSlides = new Set(); // Track which slides have been loaded
 
+// Only slides within SLIDE_WINDOW of the current one are kept in the DOM;
+// the rest are built on demand from the paginated JSON manifest
+const SLIDE_WINDOW = 2;
+let manifestUrl = null;
+let manifestPageSize = 50;
+const manifestEntries = new Map(); // Slide index -> manifest entry
+const manifestRequests = new Map(); // Manifest page -> pending fetch
+
+// Look-ahead prefetching (see prefetch.js); tune the scheduler here
+const PREFETCH_OPTIONS = {
+    minDepth: 1,
+    maxDepth: 4,
+    behind: 1,
+    maxConcurrent: 2,
+};
+let prefetcher = null;
+
 function handleFirstInteraction() {
     if (backgroundMusic && !isMuted) {
         backgroundMusic.play().catch(e => {
@@ -60,8 +77,13 @@ function getLanguage() {
 // Initialize everything
 function initialize() {
     // Initialize DOM references
-    slides = document.querySelectorAll('.slide');
-    totalSlides = slides.length;
+    const container = document.querySelector('.slideshow-container');
+    document.querySelectorAll('.slide').forEach(slide => {
+        slideElements.set(parseInt(slide.getAttribute('data-slide-index'), 10), slide);
+    });
+    manifestUrl = container ? container.getAttribute('data-manifest') : null;
+    manifestPageSize = parseInt(container?.getAttribute('data-page-size'), 10) || manifestPageSize;
+    totalSlides = parseInt(container?.getAttribute('data-total'), 10) || slideElements.size;
     slideCounter = document.getElementById('current-slide');
     totalSlidesCounter = document.getElementById('total-slides');
     
@@ -70,6 +92,18 @@ function initialize() {
         return;
     }
     
+    prefetcher = new PrefetchScheduler({
+        ...PREFETCH_OPTIONS,
+        total: totalSlides,
+        connection: navigator.connection || null,
+        slideDuration: SLIDE_DURATION,
+        load: prefetchSlide,
+        sizeOf: slideBytes,
+    });
+    window.addEventListener('pagehide', () => {
+        console.debug('Slide prefetch stats:', prefetcher.snapshot());
+    });
+
     initializeAudio();
     updateTotalSlidesCounter();
     setupInitialSlides();
@@ -140,12 +174,14 @@ function toggleAutoPlay() {
         pauseStartTime = 0;
         totalPausedTime = 0;
         startAutoPlay();
+        prefetcher?.setSlideDuration(SLIDE_DURATION);
         if (autoPlayText) {
             autoPlayText.textContent = lang === 'fa' ? 'توقف' : 'Pause';
         }
     } else {
         // Pause autoplay - use stopAutoPlay to ensure interval is cleared
         stopAutoPlay();
+        prefetcher?.setSlideDuration(null);
         if (autoPlayText) {
             autoPlayText.textContent = lang === 'fa' ? 'پخش' : 'Play';
         }
@@ -159,13 +195,14 @@ function updateTotalSlidesCounter() {
 }
 
 function setupInitialSlides() {
-    slides.forEach((slide, index) => {
+    slideElements.forEach((slide, index) => {
         slide.style.transition = 'transform 0.6s ease-in-out, opacity 0.6s ease-in-out';
         if (index === 0) {
             slide.classList.add('active');
             slide.style.transform = 'translateX(0)';
             // Load first slide immediately
             loadSlideMedia(index);
+            waitForSlideMedia(slide).then(transfer => prefetcher.markReady(index, transfer), () => {});
         } else {
             slide.style.transform = 'translateX(100%)';
         }
@@ -175,10 +212,144 @@ function setupInitialSlides() {
         slideCounter.textContent = '1';
     }
     
-    // Preload next slide for smooth transition
+    // Preload neighbours (fetching the manifest for the last slide)
     if (totalSlides > 1) {
-        preloadSlide(1);
+        preloadAdjacentSlides(0);
+    }
+}
+
+// Fetch the manifest page holding slide `index` (once per page)
+function fetchManifestPage(index) {
+    const page = Math.floor(index / manifestPageSize) + 1;
+    if (!manifestRequests.has(page)) {
+        const request = fetch(`${manifestUrl}?page=${page}`, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) throw new Error(`Manifest page ${page}: ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                data.slides.forEach(entry => manifestEntries.set(entry.index, entry));
+            })
+            .catch(e => {
+                manifestRequests.delete(page); // Allow a retry on the next move
+                throw e;
+            });
+        manifestRequests.set(page, request);
+    }
+    return manifestRequests.get(page);
+}
+
+function getManifestEntry(index) {
+    if (manifestEntries.has(index)) {
+        return Promise.resolve(manifestEntries.get(index));
+    }
+    if (!manifestUrl) {
+        return Promise.reject(new Error('No slide manifest'));
     }
+    return fetchManifestPage(index).then(() => manifestEntries.get(index));
+}
+
+function createElement(tag, attributes = {}) {
+    const element = document.createElement(tag);
+    Object.entries(attributes).forEach(([name, value]) => {
+        if (value !== null && value !== undefined) {
+            element.setAttribute(name, value);
+        }
+    });
+    return element;
+}
+
+// Build a slide element from a manifest entry, mirroring the markup of
+// slideEn.html/slideFa.html so loadSlideMedia can handle it
+function buildSlideElement(entry) {
+    const lang = getLanguage();
+    const dir = lang === 'fa' ? 'rtl' : 'ltr';
+    const caption = entry.caption[lang];
+    const slide = createElement('div', { class: `slide ${dir}`, 'data-slide-index': entry.index });
+
+    if (entry.src) {
+        const videoAttributes = { autoplay: '', muted: '', loop: '', playsinline: '', preload: 'none' };
+        if (entry.type === 'video') {
+            slide.appendChild(createElement('video', {
+                'data-src': entry.src, 'data-poster': entry.poster, ...videoAttributes,
+            }));
+        } else if (entry.type === 'image') {
+            const picture = createElement('picture');
+            (entry.sources || []).forEach(source => {
+                picture.appendChild(createElement('source', {
+                    type: source.type, 'data-srcset': source.srcset, sizes: '90vw',
+                }));
+            });
+            picture.appendChild(createElement('img', { 'data-src': entry.src, alt: caption || '', loading: 'lazy' }));
+            slide.appendChild(picture);
+        } else if (entry.type === 'gif' && entry.videos && entry.videos.length) {
+            const video = createElement('video', {
+                'data-poster': entry.poster, 'data-fallback': entry.src, ...videoAttributes,
+            });
+            entry.videos.forEach(source => {
+                video.appendChild(createElement('source', { 'data-src': source.url, type: source.type }));
+            });
+            slide.appendChild(video);
+        } else if (entry.type === 'gif') {
+            slide.appendChild(createElement('img', { 'data-src': entry.src, alt: caption || '', loading: 'lazy' }));
+        }
+    }
+    if (caption) {
+        const quote = createElement('div', { class: 'quote' });
+        quote.textContent = caption;
+        slide.appendChild(quote);
+    }
+
+    slide.querySelectorAll('video').forEach(video => { video.muted = true; });
+    slide.style.transition = 'transform 0.6s ease-in-out, opacity 0.6s ease-in-out';
+    slide.style.transform = 'translateX(100%)';
+    return slide;
+}
+
+// Resolve with the element for slide `index`, building it if needed
+function ensureSlideElement(index) {
+    if (slideElements.has(index)) {
+        return Promise.resolve(slideElements.get(index));
+    }
+    return getManifestEntry(index).then(entry => {
+        if (!entry) throw new Error(`Slide ${index} missing from manifest`);
+        // Another caller may have built it while the manifest was loading
+        if (!slideElements.has(index)) {
+            const slide = buildSlideElement(entry);
+            const container = document.querySelector('.slideshow-container');
+            container.insertBefore(slide, container.querySelector('.controls-overlay'));
+            slideElements.set(index, slide);
+        }
+        return slideElements.get(index);
+    });
+}
+
+// Distance between two slides going round the deck either way
+function slideDistance(a, b) {
+    const distance = Math.abs(a - b);
+    return Math.min(distance, totalSlides - distance);
+}
+
+// Drop slide elements that have left the window around `centerIndex`
+function recycleSlides(centerIndex) {
+    // Keep everything the prefetcher may have loaded ahead
+    const keep = Math.max(SLIDE_WINDOW, prefetcher ? prefetcher.depth() : 0);
+    slideElements.forEach((slide, index) => {
+        if (slideDistance(index, centerIndex) <= keep || slide.classList.contains('active')) {
+            return;
+        }
+        // Release decoders and network connections held by media
+        slide.querySelectorAll('video').forEach(video => {
+            video.pause();
+            video.removeAttribute('src');
+            video.querySelectorAll('source').forEach(source => source.removeAttribute('src'));
+            video.load();
+        });
+        slide.remove();
+        slideElements.delete(index);
+        loadedSlides.delete(index);
+        prefetcher?.forget(index);
+    });
 }
 
 // Load media for a specific slide
@@ -187,14 +358,21 @@ function loadSlideMedia(index) {
         return; // Already loaded or invalid index
     }
     
-    const slide = slides[index];
+    const slide = slideElements.get(index);
     if (!slide) return;
     
     // Find media element (img or video)
     const img = slide.querySelector('img[data-src]');
     const video = slide.querySelector('video[data-src]');
+    const loopVideo = slide.querySelector('video[data-fallback]');
     
     if (img) {
+        // Responsive renditions (<picture><source data-srcset>) go first so
+        // the browser picks a derivative instead of the original upload
+        slide.querySelectorAll('source[data-srcset]').forEach(source => {
+            source.srcset = source.getAttribute('data-srcset');
+            source.removeAttribute('data-srcset');
+        });
         const dataSrc = img.getAttribute('data-src');
         if (dataSrc) {
             img.src = dataSrc;
@@ -204,6 +382,11 @@ function loadSlideMedia(index) {
     }
     
     if (video) {
+        const dataPoster = video.getAttribute('data-poster');
+        if (dataPoster) {
+            video.poster = dataPoster;
+            video.removeAttribute('data-poster');
+        }
         const dataSrc = video.getAttribute('data-src');
         if (dataSrc) {
             video.src = dataSrc;
@@ -212,33 +395,162 @@ function loadSlideMedia(index) {
             loadedSlides.add(index);
         }
     }
+
+    if (loopVideo) {
+        loadLoopVideo(loopVideo);
+        loadedSlides.add(index);
+    }
+}
+
+// Load a GIF slide's video renditions (<source data-src>), falling back to
+// the original GIF if the browser can play none of them
+function loadLoopVideo(video) {
+    const sources = video.querySelectorAll('source[data-src]');
+    if (sources.length === 0) return;
+
+    const dataPoster = video.getAttribute('data-poster');
+    if (dataPoster) {
+        video.poster = dataPoster;
+        video.removeAttribute('data-poster');
+    }
+    sources.forEach(source => {
+        source.src = source.getAttribute('data-src');
+        source.removeAttribute('data-src');
+    });
+    // The last <source> fires 'error' once every candidate has failed
+    sources[sources.length - 1].addEventListener('error', () => {
+        const img = document.createElement('img');
+        img.src = video.getAttribute('data-fallback');
+        video.replaceWith(img);
+    });
+    video.load();
 }
 
-// Preload a slide (for smooth transitions)
-function preloadSlide(index) {
-    if (index < 0 || index >= totalSlides) return;
-    loadSlideMedia(index);
+// Slides whose media is a video (video slides and converted GIFs)
+function isHeavySlide(slide) {
+    return slide.querySelector('video') !== null;
 }
 
-// Preload adjacent slides for smooth navigation
-function preloadAdjacentSlides(currentIndex) {
-    // Preload next slide
-    const nextIndex = (currentIndex + 1) % totalSlides;
-    preloadSlide(nextIndex);
-    
-    // Preload previous slide
-    const prevIndex = (currentIndex - 1 + totalSlides) % totalSlides;
-    preloadSlide(prevIndex);
+// Size and duration of the last transfer of `url`, from Resource Timing
+function transferTiming(url) {
+    if (!url || !window.performance || !performance.getEntriesByName) return null;
+    const entries = performance.getEntriesByName(new URL(url, window.location.href).href);
+    const entry = entries[entries.length - 1];
+    return entry ? { bytes: entry.transferSize || entry.encodedBodySize, duration: entry.duration } : null;
+}
+
+// Resolve once the slide's media can be shown (with its transfer timing),
+// reject if `signal` aborts first
+function waitForSlideMedia(slide, signal) {
+    const media = slide.querySelector('img[src], video');
+    if (!media) return Promise.resolve(null);
+    const isVideo = media.tagName === 'VIDEO';
+    if (isVideo ? media.readyState >= 2 : media.complete) {
+        return Promise.resolve(transferTiming(media.currentSrc || media.src));
+    }
+    return new Promise((resolve, reject) => {
+        const done = () => {
+            cleanup();
+            resolve(transferTiming(media.currentSrc || media.src));
+        };
+        const abort = () => {
+            cleanup();
+            reject(new DOMException('Prefetch aborted', 'AbortError'));
+        };
+        const cleanup = () => {
+            media.removeEventListener(isVideo ? 'loadeddata' : 'load', done);
+            media.removeEventListener('error', done);
+            signal?.removeEventListener('abort', abort);
+        };
+        media.addEventListener(isVideo ? 'loadeddata' : 'load', done);
+        media.addEventListener('error', done);
+        signal?.addEventListener('abort', abort);
+    });
+}
+
+// Undo loadSlideMedia for a slide whose prefetch was cancelled, so the
+// browser drops the download and the slide can be loaded again later
+function cancelSlideMedia(index) {
+    const slide = slideElements.get(index);
+    if (!slide || slide.classList.contains('active')) return;
+    slide.querySelectorAll('source[srcset]').forEach(source => {
+        source.setAttribute('data-srcset', source.getAttribute('srcset'));
+        source.removeAttribute('srcset');
+    });
+    slide.querySelectorAll('img[src]').forEach(img => {
+        if (img.complete) return;
+        img.setAttribute('data-src', img.getAttribute('src'));
+        img.removeAttribute('src');
+    });
+    slide.querySelectorAll('video').forEach(video => {
+        video.pause();
+        if (video.hasAttribute('src')) {
+            video.setAttribute('data-src', video.getAttribute('src'));
+            video.removeAttribute('src');
+        }
+        video.querySelectorAll('source[src]').forEach(source => {
+            source.setAttribute('data-src', source.getAttribute('src'));
+            source.removeAttribute('src');
+        });
+        video.load();
+    });
+    loadedSlides.delete(index);
+}
+
+// PrefetchScheduler `load` callback: build the slide if needed and load
+// its media, skipping heavy slides when the scheduler asks to
+function prefetchSlide(index, { signal, allowHeavy }) {
+    return ensureSlideElement(index).then(slide => {
+        if (signal.aborted) return null;
+        if (!allowHeavy && isHeavySlide(slide)) return PrefetchScheduler.SKIPPED;
+        slide.querySelectorAll('video').forEach(video => { video.preload = 'auto'; });
+        signal.addEventListener('abort', () => cancelSlideMedia(index), { once: true });
+        loadSlideMedia(index);
+        return waitForSlideMedia(slide, signal);
+    });
+}
+
+// PrefetchScheduler `sizeOf` callback: media size from the manifest, or
+// from data-bytes on slides rendered by the page; null when not known yet
+function slideBytes(index) {
+    const entry = manifestEntries.get(index);
+    if (entry && entry.bytes) return entry.bytes;
+    const bytes = parseInt(slideElements.get(index)?.getAttribute('data-bytes'), 10);
+    return bytes > 0 ? bytes : null;
+}
+
+// Re-plan prefetching around the current slide and drop far-away slides
+function preloadAdjacentSlides(currentIndex, direction = 'next') {
+    prefetcher.update(currentIndex, direction);
+    recycleSlides(currentIndex);
 }
 
 function showSlide(index, direction = 'next') {
+    prefetcher?.recordShown(index);
+    revealSlide(index, direction);
+}
+
+function revealSlide(index, direction) {
+    if (!slideElements.has(index)) {
+        // Outside the window: build it from the manifest, then transition
+        ensureSlideElement(index)
+            .then(() => {
+                if (currentSlide === index) revealSlide(index, direction);
+            })
+            .catch(e => console.error('Slide load failed:', e));
+        return;
+    }
+
     const currentActiveSlide = document.querySelector('.slide.active');
-    const newSlide = slides[index];
+    const newSlide = slideElements.get(index);
     
     if (currentActiveSlide === newSlide) return;
     
     // Load media for the new slide if not already loaded
-    loadSlideMedia(index);
+    if (!loadedSlides.has(index)) {
+        loadSlideMedia(index);
+        waitForSlideMedia(newSlide).then(transfer => prefetcher?.markReady(index, transfer), () => {});
+    }
     
     // Prepare new slide position
     newSlide.style.transform = direction === 'next' ? 'translateX(100%)' : 'translateX(-100%)';
@@ -261,7 +573,7 @@ function showSlide(index, direction = 'next') {
     }
     
     // Preload adjacent slides for smooth future navigation
-    preloadAdjacentSlides(index);
+    preloadAdjacentSlides(index, direction);
     
     // Clean up classes after transition
     setTimeout(() => {
@@ -446,6 +758,7 @@ window.toggleAutoPlay = toggleAutoPlay;
 window.goHome = goHome;
 window.nextSlide = nextSlide;
 window.previousSlide = previousSlide;
+window.getPrefetchStats = () => prefetcher?.snapshot();
 
 // Initialize when DOM is ready
 if (document.readyState === 'loading') {
@@ -0,0 +1,23 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from memories.visits import visit_buffer
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Writes visits directly and never spools them during a test run: counts
+    left in the buffer at exit would otherwise be spooled and replayed against
+    the real database by its next flush. Tests that exercise the buffer turn
+    it back on with ``override_settings(VISIT_BUFFERING=True)``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.visit_settings = override_settings(VISIT_BUFFERING=False, VISIT_SPOOL_DIR=None)
+        self.visit_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        visit_buffer.drain()
+        self.visit_settings.disable()
+        super().teardown_test_environment(**kwargs)
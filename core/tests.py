@@ -1,3 +1,147 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.models import User
+from memories.models import MemorySlideShow
+from memories.visits import visit_buffer
+
+from . import metrics
+from .db import sqlite_pragma_statements
+from .metrics import MetricsRegistry, RequestStats, render_prometheus
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def open_connection(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = dict(connection.settings_dict, NAME=os.path.join(directory.name, 'test.sqlite3'))
+        wrapper = DatabaseWrapper(settings_dict, alias='pragma-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'wal', 'synchronous': 'NORMAL', 'busy_timeout': 7000, 'mmap_size': 1048576,
+    })
+    def test_pragmas_are_applied_to_new_connections(self):
+        wrapper = self.open_connection()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 7000)
+        self.assertEqual(self.pragma(wrapper, 'mmap_size'), 1048576)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_no_pragmas_keeps_sqlite_defaults(self):
+        self.assertEqual(self.pragma(self.open_connection(), 'journal_mode'), 'delete')
+
+    def test_values_are_validated(self):
+        self.assertEqual(
+            sqlite_pragma_statements({'journal_mode': 'wal', 'busy_timeout': '100'}),
+            ['PRAGMA journal_mode = WAL', 'PRAGMA busy_timeout = 100'],
+        )
+        with self.assertRaises(ValueError):
+            sqlite_pragma_statements({'journal_mode': 'WAL; DROP TABLE x'})
+        with self.assertRaises(ValueError):
+            sqlite_pragma_statements({'mmap_size': '1; DROP TABLE x'})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PerformanceMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('metrics-owner')
+        cls.slideshow = MemorySlideShow.objects.create(owner=owner, title='Metrics Test')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        metrics.install()
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.addCleanup(visit_buffer.drain)
+        self.registry = MetricsRegistry(directory=self.directory, write_interval=3600)
+        for target in ('core.middleware.registry', 'core.views.registry'):
+            patcher = mock.patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_disabled_by_default(self):
+        response = self.client.get(f'/slideshows/{self.slideshow.slug}/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(PERF_METRICS=True, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+    def test_server_timing_and_metrics(self):
+        response = self.client.get(f'/slideshows/{self.slideshow.slug}/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+        series = self.registry.snapshot()['histograms']['mymemory_template_render_seconds']['{"view": "memoir-profile"}']
+        self.assertEqual(series['count'], 1)
+        self.assertGreater(series['sum'], 0)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('mymemory_requests_total{status="200",view="memoir-profile"} 1', body)
+        self.assertIn('mymemory_request_duration_seconds_count{view="memoir-profile"} 1', body)
+        self.assertIn('mymemory_response_size_bytes_bucket{le="+Inf",view="memoir-profile"} 1', body)
+        # /metrics itself is not recorded
+        self.assertNotIn('view="metrics"', body)
+
+    @override_settings(PERF_METRICS=True, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+    async def test_async_requests_are_timed(self):
+        response = await self.async_client.get(f'/slideshows/{self.slideshow.slug}/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    @override_settings(PERF_METRICS=True)
+    def test_metrics_add_up_worker_snapshots(self):
+        other = MetricsRegistry(directory=self.directory)
+        stats = RequestStats()
+        stats.queries = 2
+        other.record('memoir-profile', 200, stats, 2048)
+        self.assertTrue(other.write_snapshot())
+        self.registry.record('memoir-profile', 200, stats, 2048)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('mymemory_requests_total{status="200",view="memoir-profile"} 2', body)
+        self.assertIn('mymemory_db_queries_sum{view="memoir-profile"} 4', body)
+
+
+class PrometheusFormatTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(write_interval=3600)
+        for value in (0, 2, 2, 7, 500):
+            registry.observe('mymemory_db_queries', {'view': 'v'}, value)
+        body = render_prometheus(registry.collect())
+        self.assertIn('# TYPE mymemory_db_queries histogram', body)
+        self.assertIn('mymemory_db_queries_bucket{le="0",view="v"} 1', body)
+        self.assertIn('mymemory_db_queries_bucket{le="2",view="v"} 3', body)
+        self.assertIn('mymemory_db_queries_bucket{le="10",view="v"} 4', body)
+        self.assertIn('mymemory_db_queries_bucket{le="100",view="v"} 4', body)
+        self.assertIn('mymemory_db_queries_bucket{le="+Inf",view="v"} 5', body)
+        self.assertIn('mymemory_db_queries_count{view="v"} 5', body)
+        self.assertIn('mymemory_db_queries_sum{view="v"} 511', body)
@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
 
-# Create your views here.
+from .metrics import registry, render_prometheus
+
+
+@require_safe
+def metrics(request):
+    """Request metrics in the Prometheus text format (restricted to localhost by nginx)"""
+    if not getattr(settings, 'PERF_METRICS', False):
+        raise Http404('Metrics are disabled.')
+    return HttpResponse(render_prometheus(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
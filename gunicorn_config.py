@@ -1,5 +1,7 @@
 # Gunicorn configuration file
 # Usage: gunicorn -c gunicorn_config.py myMemory.wsgi:application
+# ASGI:  GUNICORN_WORKER_CLASS=uvicorn gunicorn -c gunicorn_config.py myMemory.asgi:application
+#        (needs: pip install "uvicorn[standard]")
 
 import multiprocessing
 import os
@@ -9,11 +11,19 @@ bind = "unix:/run/memory-slideshow.sock"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+if os.environ.get("GUNICORN_WORKER_CLASS") == "uvicorn":
+    # One event loop per core; each serves many slow clients at once and can
+    # afford to hold idle keep-alive connections open
+    workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1))
+    worker_class = "uvicorn.workers.UvicornWorker"
+    keepalive = 15
+else:
+    workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+    worker_class = "sync"
+    keepalive = 2
 worker_connections = 1000
 timeout = 30
-keepalive = 2
+graceful_timeout = 30
 
 # Logging
 accesslog = "-"  # Log to stdout
@@ -32,6 +42,14 @@ user = None
 group = None
 tmp_upload_dir = None
 
+# Flush buffered visit counts (and save request metrics) before a worker goes away
+def worker_exit(server, worker):
+    from memories.visits import visit_buffer
+    visit_buffer.shutdown()
+
+    from core.metrics import write_snapshot
+    write_snapshot()
+
 # SSL (if needed, uncomment and configure)
 # keyfile = "/path/to/keyfile"
 # certfile = "/path/to/certfile"
@@ -0,0 +1,118 @@
+"""
+Access control for private (``is_public=False``) slideshows.
+
+Private memorials are visible to their owner and staff, and to anyone
+holding a signed, expiring share token. Tokens are verified with the
+SECRET_KEY alone, so checking one costs no database query; public
+slideshows skip the check entirely.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .cache import get_page_cache, visibility_cache_key
+
+SHARE_TOKEN_SALT = 'memories.share'
+SHARE_TOKEN_PARAM = 'token'
+
+
+def share_cookie_name(slug):
+    return f'memorial_{slug}'
+
+
+def make_share_token(slug, max_age=None):
+    """Signed token granting access to ``slug`` for ``max_age`` seconds."""
+    if max_age is None:
+        max_age = getattr(settings, 'SHARE_TOKEN_MAX_AGE', 30 * 24 * 60 * 60)
+    return signing.dumps({'slug': slug, 'exp': int(time.time()) + max_age}, salt=SHARE_TOKEN_SALT, compress=True)
+
+
+def share_url(slideshow, max_age=None):
+    """Relative URL of the profile page carrying a fresh share token."""
+    token = make_share_token(slideshow.slug, max_age)
+    return f"{reverse('memoir-profile', args=[slideshow.slug])}?{urlencode({SHARE_TOKEN_PARAM: token})}"
+
+
+def token_expiry(token, slug):
+    """Expiry timestamp of a valid token for ``slug``, or None."""
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=SHARE_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(payload, dict) or payload.get('slug') != slug:
+        return None
+    expires = payload.get('exp', 0)
+    return expires if expires > time.time() else None
+
+
+def request_share_token(request, slug):
+    """The valid share token presented by the request (query or cookie), if any."""
+    for token in (request.GET.get(SHARE_TOKEN_PARAM), request.COOKIES.get(share_cookie_name(slug))):
+        if token_expiry(token, slug):
+            return token
+    return None
+
+
+def is_owner_or_staff(request, owner_id):
+    user = request.user
+    return user.is_authenticated and (user.is_staff or user.pk == owner_id)
+
+
+def can_view(request, slug, visibility):
+    """
+    Authorization decision for a slideshow given its cached ``visibility``
+    ({'is_public': bool, 'owner_id': int}). Public slideshows never touch the
+    session; private ones accept a share token before falling back to the
+    logged-in user.
+    """
+    if visibility['is_public']:
+        return True
+    if request_share_token(request, slug):
+        return True
+    return is_owner_or_staff(request, visibility['owner_id'])
+
+
+async def acan_view(request, slug, visibility):
+    """``can_view`` for async views; only the session lookup runs in a thread."""
+    if visibility['is_public'] or request_share_token(request, slug):
+        return True
+    return await sync_to_async(is_owner_or_staff)(request, visibility['owner_id'])
+
+
+def remember_share_token(request, response, slug):
+    """
+    Persist a token from the query string as a cookie so the slideshow page
+    and its media (which carry no token in their URLs) stay accessible.
+    """
+    token = request.GET.get(SHARE_TOKEN_PARAM)
+    expires = token_expiry(token, slug)
+    if expires and request.COOKIES.get(share_cookie_name(slug)) != token:
+        response.set_cookie(
+            share_cookie_name(slug), token,
+            max_age=int(expires - time.time()),
+            secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+def slideshow_visibility(slug):
+    """
+    ``{'is_public', 'owner_id'}`` for ``slug`` (None if it does not exist),
+    cached alongside the rendered pages and dropped by the same signals.
+    """
+    from .models import MemorySlideShow
+
+    cache = get_page_cache()
+    key = visibility_cache_key(slug)
+    visibility = cache.get(key)
+    if visibility is None:
+        visibility = MemorySlideShow.objects.filter(slug=slug).values('is_public', 'owner_id').first() or {}
+        cache.set(key, visibility, getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60))
+    return visibility or None
@@ -1,22 +1,97 @@
+from django import forms
 from django.contrib import admin
-from django.urls import reverse
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.forms.models import BaseInlineFormSet
+from django.urls import path, reverse
 from django.utils.html import format_html
 from django.contrib import messages
 from django.db import models
-from .models import MemorySlideShow, Slide
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.template.defaultfilters import filesizeformat
+from .models import MediaJob, MemorySlideShow, Slide
+from .access import share_url
+from .bulk_import import SORT_ORDERS, import_slides, upload_entries
+from .cache import invalidate_pages
+from .duplication import duplicate_slideshows
+from .ordering import move_slides, next_order
 from accounts.models import User
 
 
+class SlideInlineFormSet(BaseInlineFormSet):
+    """Slides added inline go after the last slide; the order is changed on the reorder page."""
+
+    def save_new(self, form, commit=True):
+        form.instance.order = next_order(self.instance)
+        return super().save_new(form, commit)
+
+
 class SlideInline(admin.TabularInline):
     """Inline admin for Slide model."""
     model = Slide
+    formset = SlideInlineFormSet
+    template = 'core/slide_inline.html'
     extra = 1
     fields = ('media_type', 'media_file', 'caption', 'caption_fa', 'order')
+    readonly_fields = ('order',)
     ordering = ('order',)
     verbose_name = 'Slide'
     verbose_name_plural = 'Slides'
 
 
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """Related-object filter picked with the admin autocomplete instead of a full list."""
+    template = 'core/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        form_field = field.formfield(widget=AutocompleteSelect(field, model_admin.admin_site))
+        self.widget_html = form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val, attrs={'data-autocomplete-filter': ''},
+        )
+
+    def field_choices(self, field, request, model_admin):
+        # Only the selected object; the rest come from the autocomplete view
+        if not self.lookup_val:
+            return []
+        try:
+            return field.get_choices(include_blank=False, limit_choices_to={'pk': self.lookup_val})
+        except (ValueError, ValidationError):
+            return []
+
+    def has_output(self):
+        return True
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """File field that accepts several files at once."""
+    widget = MultipleFileInput
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(item, initial) for item in data]
+        return [single_file_clean(data, initial)]
+
+
+class SlideImportForm(forms.Form):
+    """Upload for MemorySlideShowAdmin.import_slides_view."""
+    files = MultipleFileField(help_text='Photos, videos and audio, or zip archives of them.')
+    order = forms.ChoiceField(
+        choices=[(value, label) for value, label in zip(SORT_ORDERS, ('Capture date (EXIF), then file name', 'File name'))],
+        initial='date',
+    )
+
+
 @admin.register(MemorySlideShow)
 class MemorySlideShowAdmin(admin.ModelAdmin):
     """Enhanced admin for MemorySlideShow model."""
@@ -26,6 +101,7 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
         'owner_link',
         'preview_image',
         'slide_count',
+        'media_total',
         'date_range',
         'is_public',
         'visit_count',
@@ -33,7 +109,7 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
     )
     list_filter = (
         'is_public',
-        'owner',
+        ('owner', AutocompleteFilter),
         'created_at',
         'date_of_birth',
         'profile_theme',
@@ -54,7 +130,12 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
         'visit_count',
         'preview_image_display',
         'preview_music_display',
+        'share_link',
+        'import_slides_link',
+        'reorder_slides_link',
+        'large_upload',
     )
+    autocomplete_fields = ('owner',)
     inlines = [SlideInline]
     date_hierarchy = 'created_at'
     list_per_page = 25
@@ -71,17 +152,122 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
             'fields': ('description', 'description_fa')
         }),
         ('Media', {
-            'fields': ('mainImage', 'preview_image_display', 'music', 'preview_music_display')
+            'fields': (
+                'mainImage', 'preview_image_display', 'music', 'preview_music_display',
+                'import_slides_link', 'reorder_slides_link', 'large_upload',
+            )
         }),
         ('Themes', {
             'fields': ('profile_theme', 'slide_theme')
         }),
         ('Settings', {
-            'fields': ('is_public', 'visit_count', 'created_at')
+            'fields': ('is_public', 'share_link', 'visit_count', 'created_at')
         }),
     )
     
-    actions = ['make_public', 'make_private', 'duplicate_slideshow']
+    actions = ['make_public', 'make_private', 'duplicate_slideshow', 'bulk_import_slides']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('owner').annotate(
+            slide_count=models.Count('slides'),
+            media_bytes=models.Sum('slides__media_size'),
+        )
+    
+    def get_urls(self):
+        urls = [
+            path(
+                '<path:object_id>/import-slides/',
+                self.admin_site.admin_view(self.import_slides_view),
+                name='memories_memoryslideshow_import_slides',
+            ),
+            path(
+                '<path:object_id>/reorder-slides/',
+                self.admin_site.admin_view(self.reorder_slides_view),
+                name='memories_memoryslideshow_reorder_slides',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def import_slides_view(self, request, object_id):
+        """Add many slides at once from uploaded files or zip archives."""
+        slideshow = get_object_or_404(MemorySlideShow, pk=object_id)
+        if not self.has_change_permission(request, slideshow):
+            raise PermissionDenied
+        form = SlideImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            result = import_slides(slideshow, upload_entries(form.cleaned_data['files']), form.cleaned_data['order'])
+            for name, reason in result.skipped:
+                self.message_user(request, f'Skipped {name}: {reason}', messages.WARNING)
+            self.message_user(request, f'{result}.', messages.SUCCESS)
+            return HttpResponseRedirect(reverse('admin:memories_memoryslideshow_change', args=[slideshow.pk]))
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Import slides into {slideshow.title}',
+            'opts': self.model._meta,
+            'original': slideshow,
+            'form': form,
+        }
+        return TemplateResponse(request, 'core/import_slides.html', context)
+    
+    def reorder_slides_view(self, request, object_id):
+        """Drag-and-drop slide order, saved in one request (views.reorderSlides)."""
+        slideshow = get_object_or_404(MemorySlideShow, pk=object_id)
+        if not self.has_change_permission(request, slideshow):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Reorder slides of {slideshow.title}',
+            'opts': self.model._meta,
+            'original': slideshow,
+            'slides': slideshow.slides.order_by('order', 'pk').only(
+                'slideshow_id', 'order', 'caption', 'media_type', 'media_file', 'renditions',
+            ),
+            'save_url': reverse('reorder-slides', args=[slideshow.slug]),
+        }
+        return TemplateResponse(request, 'core/reorder_slides.html', context)
+    
+    @property
+    def media(self):
+        owner_widget = AutocompleteSelect(self.model._meta.get_field('owner'), self.admin_site)
+        return super().media + owner_widget.media + forms.Media(
+            js=['js/chunked_upload.js', 'js/autocomplete_filter.js'],
+        )
+    
+    def large_upload(self, obj):
+        """Resumable upload inputs for files too large for the form."""
+        if not obj.pk:
+            return '-'
+        url = reverse('start-upload', args=[obj.slug])
+        return format_html(
+            'Music: <input type="file" accept="audio/*" data-chunked-upload="{}" data-target="music"><br>'
+            'New video slide: <input type="file" accept="video/*,image/gif" data-chunked-upload="{}" data-target="slide">',
+            url, url,
+        )
+    large_upload.short_description = 'Large Files'
+    
+    def import_slides_link(self, obj):
+        """Link to the bulk slide import page."""
+        if not obj.pk:
+            return '-'
+        url = reverse('admin:memories_memoryslideshow_import_slides', args=[obj.pk])
+        return format_html('<a href="{}">Import photos, videos or a zip archive</a>', url)
+    import_slides_link.short_description = 'Bulk Import'
+    
+    def reorder_slides_link(self, obj):
+        """Link to the drag-and-drop slide order page."""
+        if not obj.pk:
+            return '-'
+        url = reverse('admin:memories_memoryslideshow_reorder_slides', args=[obj.pk])
+        return format_html('<a href="{}">Reorder slides</a>', url)
+    reorder_slides_link.short_description = 'Slide Order'
+    
+    def bulk_import_slides(self, request, queryset):
+        """Action to open the bulk slide import page."""
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one slideshow to import slides into.', messages.WARNING)
+            return None
+        return HttpResponseRedirect(reverse('admin:memories_memoryslideshow_import_slides', args=[queryset.get().pk]))
+    bulk_import_slides.short_description = 'Import slides from files or a zip archive'
     
     def owner_link(self, obj):
         """Link to owner's admin page."""
@@ -97,7 +283,7 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
         if obj.mainImage:
             return format_html(
                 '<img src="{}" style="max-height: 50px; max-width: 50px; object-fit: cover;" />',
-                obj.mainImage.url
+                obj.main_image_thumbnail_url
             )
         return '-'
     preview_image.short_description = 'Image'
@@ -123,15 +309,29 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
         return 'No music file uploaded'
     preview_music_display.short_description = 'Preview Music'
     
+    def share_link(self, obj):
+        """Expiring link that opens a private slideshow without logging in."""
+        if not obj.pk or obj.is_public:
+            return '-'
+        url = share_url(obj)
+        return format_html('<a href="{}" target="_blank">{}</a>', url, url)
+    share_link.short_description = 'Share Link'
+    
     def slide_count(self, obj):
         """Display slide count with link."""
-        count = obj.slides.count()
+        count = obj.slide_count
         if count > 0:
             url = reverse('admin:memories_slide_changelist') + f'?slideshow__id__exact={obj.pk}'
             return format_html('<a href="{}">{}</a>', url, count)
         return count
     slide_count.short_description = 'Slides'
-    slide_count.admin_order_field = 'slides__count'
+    slide_count.admin_order_field = 'slide_count'
+    
+    def media_total(self, obj):
+        """Total size of the slides' media files."""
+        return filesizeformat(obj.media_bytes or 0)
+    media_total.short_description = 'Media Size'
+    media_total.admin_order_field = 'media_bytes'
     
     def date_range(self, obj):
         """Display date range."""
@@ -146,7 +346,12 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
     
     def make_public(self, request, queryset):
         """Action to make slideshows public."""
+        # Collect the slugs first: on a filtered changelist (e.g. by is_public)
+        # the queryset no longer matches the rows once they are updated.
+        slugs = list(queryset.values_list('slug', flat=True))
         updated = queryset.update(is_public=True)
+        for slug in slugs:
+            invalidate_pages(slug)
         self.message_user(
             request,
             f'{updated} slideshow(s) marked as public.',
@@ -156,7 +361,10 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
     
     def make_private(self, request, queryset):
         """Action to make slideshows private."""
+        slugs = list(queryset.values_list('slug', flat=True))
         updated = queryset.update(is_public=False)
+        for slug in slugs:
+            invalidate_pages(slug)
         self.message_user(
             request,
             f'{updated} slideshow(s) marked as private.',
@@ -166,37 +374,10 @@ class MemorySlideShowAdmin(admin.ModelAdmin):
     
     def duplicate_slideshow(self, request, queryset):
         """Action to duplicate slideshows."""
-        count = 0
-        for slideshow in queryset:
-            # Create new slideshow
-            new_slideshow = MemorySlideShow.objects.create(
-                owner=slideshow.owner,
-                title=f"{slideshow.title} (Copy)",
-                title_fa=slideshow.title_fa,
-                date_of_birth=slideshow.date_of_birth,
-                date_of_death=slideshow.date_of_death,
-                description=slideshow.description,
-                description_fa=slideshow.description_fa,
-                mainImage=slideshow.mainImage,
-                music=slideshow.music,
-                profile_theme=slideshow.profile_theme,
-                slide_theme=slideshow.slide_theme,
-                is_public=False,
-            )
-            # Copy slides
-            for slide in slideshow.slides.all():
-                Slide.objects.create(
-                    slideshow=new_slideshow,
-                    media_type=slide.media_type,
-                    media_file=slide.media_file,
-                    caption=slide.caption,
-                    caption_fa=slide.caption_fa,
-                    order=slide.order,
-                )
-            count += 1
+        copies = duplicate_slideshows(queryset)
         self.message_user(
             request,
-            f'{count} slideshow(s) duplicated successfully.',
+            f'{len(copies)} slideshow(s) duplicated successfully.',
             messages.SUCCESS
         )
     duplicate_slideshow.short_description = 'Duplicate selected slideshows'
@@ -216,8 +397,8 @@ class SlideAdmin(admin.ModelAdmin):
     )
     list_filter = (
         'media_type',
-        'slideshow__owner',
-        'slideshow',
+        ('slideshow__owner', AutocompleteFilter),
+        ('slideshow', AutocompleteFilter),
         'slideshow__is_public',
     )
     search_fields = (
@@ -229,6 +410,7 @@ class SlideAdmin(admin.ModelAdmin):
         'slideshow__slug',
     )
     list_per_page = 50
+    list_select_related = ('slideshow', 'slideshow__owner')
     ordering = ('slideshow', 'order')
     date_hierarchy = 'slideshow__created_at'
     
@@ -237,15 +419,32 @@ class SlideAdmin(admin.ModelAdmin):
             'fields': ('slideshow', 'order', 'media_type', 'caption', 'caption_fa')
         }),
         ('Media File', {
-            'fields': ('media_file', 'preview_media_display')
+            'fields': ('media_file', 'preview_media_display', 'large_upload')
         }),
     )
     
-    readonly_fields = ('preview_media_display',)
+    readonly_fields = ('preview_media_display', 'large_upload')
     change_list_template = 'core/change_list.html'
     
     actions = ['move_up', 'move_down', 'change_media_type_to_image']
     
+    @property
+    def media(self):
+        slideshow_widget = AutocompleteSelect(self.model._meta.get_field('slideshow'), self.admin_site)
+        return super().media + slideshow_widget.media + forms.Media(
+            js=['js/chunked_upload.js', 'js/autocomplete_filter.js'],
+        )
+    
+    def large_upload(self, obj):
+        """Resumable upload that replaces this slide's media file."""
+        if not obj.pk:
+            return '-'
+        return format_html(
+            '<input type="file" data-chunked-upload="{}" data-target="slide" data-slide="{}">',
+            reverse('start-upload', args=[obj.slideshow.slug]), obj.pk,
+        )
+    large_upload.short_description = 'Large File'
+    
     def caption_preview(self, obj):
         """Display caption preview."""
         caption = obj.caption or obj.caption_fa or '-'
@@ -279,7 +478,7 @@ class SlideAdmin(admin.ModelAdmin):
             if obj.media_type == 'image':
                 return format_html(
                     '<img src="{}" style="max-height: 50px; max-width: 50px; object-fit: cover;" />',
-                    obj.media_file.url
+                    obj.thumbnail_url
                 )
             elif obj.media_type == 'video':
                 return format_html('<span style="color: red;">▶ VIDEO</span>')
@@ -300,8 +499,9 @@ class SlideAdmin(admin.ModelAdmin):
                 )
             elif obj.media_type == 'video':
                 return format_html(
-                    '<video controls style="max-width: 400px;"><source src="{}" type="video/mp4">Your browser does not support the video tag.</video>',
-                    obj.media_file.url
+                    '<video controls preload="metadata" poster="{}" style="max-width: 400px;"><source src="{}" type="video/mp4">Your browser does not support the video tag.</video>',
+                    obj.poster_url or '',
+                    obj.video_url
                 )
             elif obj.media_type == 'gif':
                 return format_html(
@@ -326,42 +526,23 @@ class SlideAdmin(admin.ModelAdmin):
     
     def move_up(self, request, queryset):
         """Action to move slides up (decrease order)."""
-        for slide in queryset:
-            if slide.order > 1:
-                # Swap with previous slide
-                prev_slide = Slide.objects.filter(
-                    slideshow=slide.slideshow,
-                    order=slide.order - 1
-                ).first()
-                if prev_slide:
-                    prev_slide.order, slide.order = slide.order, prev_slide.order
-                    prev_slide.save()
-                    slide.save()
+        move_slides(queryset, -1)
         self.message_user(request, 'Selected slides moved up.', messages.SUCCESS)
     move_up.short_description = 'Move selected slides up'
     
     def move_down(self, request, queryset):
         """Action to move slides down (increase order)."""
-        for slide in queryset.order_by('-order'):
-            max_order = Slide.objects.filter(slideshow=slide.slideshow).aggregate(
-                max_order=models.Max('order')
-            )['max_order'] or 0
-            if slide.order < max_order:
-                # Swap with next slide
-                next_slide = Slide.objects.filter(
-                    slideshow=slide.slideshow,
-                    order=slide.order + 1
-                ).first()
-                if next_slide:
-                    next_slide.order, slide.order = slide.order, next_slide.order
-                    next_slide.save()
-                    slide.save()
+        move_slides(queryset, 1)
         self.message_user(request, 'Selected slides moved down.', messages.SUCCESS)
     move_down.short_description = 'Move selected slides down'
     
     def change_media_type_to_image(self, request, queryset):
         """Action to change media type to image."""
+        # update() sends no signals, so the cached pages are dropped here
+        slugs = set(queryset.values_list('slideshow__slug', flat=True))
         updated = queryset.update(media_type='image')
+        for slug in slugs:
+            invalidate_pages(slug)
         self.message_user(
             request,
             f'{updated} slide(s) changed to image type.',
@@ -369,26 +550,121 @@ class SlideAdmin(admin.ModelAdmin):
         )
     change_media_type_to_image.short_description = 'Change selected slides to image type'
     
+    GROUPED_VIEW_EXCLUDED_PARAMS = ('slideshow__owner__id__exact', 'slideshow__id__exact', 'q', 'media_type')
+    
+    def get_urls(self):
+        urls = [
+            path(
+                'groups/<int:slideshow_id>/slides.json',
+                self.admin_site.admin_view(self.group_slides_view),
+                name='memories_slide_group_slides',
+            ),
+        ]
+        return urls + super().get_urls()
+    
     def changelist_view(self, request, extra_context=None):
-        """Custom changelist view with grouped slideshows."""
+        """Changelist grouped by slideshow, one page of groups at a time."""
         # Only show grouped view if no specific filter/search is applied
-        if not any(key in request.GET for key in ['slideshow__owner__id__exact', 'slideshow__id__exact', 'q', 'media_type']):
+        if not any(key in request.GET for key in self.GROUPED_VIEW_EXCLUDED_PARAMS):
+            # Not a changelist filter; keep it away from ChangeList
+            request.GET = request.GET.copy()
+            group_page = request.GET.pop('group_page', [None])[-1]
+            slideshows = MemorySlideShow.objects.select_related('owner').only(
+                'title', 'slug', 'created_at', 'owner__username',
+            ).annotate(slide_count=models.Count('slides')).filter(slide_count__gt=0).order_by('owner__username', 'title', 'pk')
+            paginator = Paginator(slideshows, getattr(settings, 'SLIDE_ADMIN_GROUPS_PER_PAGE', 25))
             extra_context = extra_context or {}
-            slideshows = MemorySlideShow.objects.select_related('owner').prefetch_related('slides').all()
-            
-            slideshow_groups = []
-            for slideshow in slideshows:
-                slides = slideshow.slides.all()
-                if slides.exists():
-                    slideshow_groups.append({
-                        'id': slideshow.id,
-                        'title': slideshow.title,
-                        'user': slideshow.owner,
-                        'slug': slideshow.slug,
-                        'slides': slides,
-                        'count': slides.count(),
-                    })
-            
-            extra_context['slideshow_groups'] = slideshow_groups
+            extra_context['slideshow_groups'] = paginator.get_page(group_page)
         
-        return super().changelist_view(request, extra_context=extra_context)
\ No newline at end of file
+        return super().changelist_view(request, extra_context=extra_context)
+    
+    def group_slides_view(self, request, slideshow_id):
+        """One page of a slideshow's slides for the grouped changelist (JSON)."""
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        slides = Slide.objects.filter(slideshow_id=slideshow_id).only(
+            'caption', 'media_type', 'media_file', 'renditions', 'order',
+        ).order_by('order', 'pk')
+        page = Paginator(slides, getattr(settings, 'SLIDE_ADMIN_GROUP_PAGE_SIZE', 50)).get_page(request.GET.get('page'))
+        return JsonResponse({
+            'slides': [
+                {
+                    'id': slide.pk,
+                    'order': slide.order,
+                    'caption': slide.caption,
+                    'media_type': slide.media_type,
+                    'thumbnail': slide.thumbnail_url if slide.media_file and slide.media_type == 'image' else None,
+                    'change_url': reverse('admin:memories_slide_change', args=[slide.pk]),
+                    'delete_url': reverse('admin:memories_slide_delete', args=[slide.pk]),
+                }
+                for slide in page
+            ],
+            'count': page.paginator.count,
+            'next_page': page.next_page_number() if page.has_next() else None,
+        })
+
+
+@admin.register(MediaJob)
+class MediaJobAdmin(admin.ModelAdmin):
+    """Read-only view of the media job queue."""
+    list_display = (
+        'task',
+        'slideshow',
+        'slide',
+        'status_badge',
+        'attempts',
+        'run_after',
+        'updated_at',
+        'error_preview',
+    )
+    list_filter = ('status', 'task')
+    search_fields = ('slideshow__title', 'slideshow__slug', 'last_error')
+    list_select_related = ('slideshow', 'slide')
+    readonly_fields = (
+        'task', 'slideshow', 'slide', 'status', 'attempts', 'max_attempts', 'last_error',
+        'run_after', 'started_at', 'finished_at', 'created_at', 'updated_at',
+    )
+    list_per_page = 50
+    ordering = ('-created_at',)
+    actions = ['retry_jobs']
+
+    STATUS_COLORS = {
+        MediaJob.STATUS_PENDING: 'gray',
+        MediaJob.STATUS_RUNNING: 'blue',
+        MediaJob.STATUS_DONE: 'green',
+        MediaJob.STATUS_FAILED: 'red',
+    }
+
+    def has_add_permission(self, request):
+        """Jobs are created by uploads, not by hand."""
+        return False
+
+    def status_badge(self, obj):
+        """Display status with a color."""
+        return format_html(
+            '<span style="color: {};">{}</span>',
+            self.STATUS_COLORS.get(obj.status, 'gray'),
+            obj.get_status_display()
+        )
+    status_badge.short_description = 'Status'
+    status_badge.admin_order_field = 'status'
+
+    def error_preview(self, obj):
+        """Display the last line of the last error."""
+        lines = obj.last_error.strip().splitlines()
+        return lines[-1][:80] if lines else '-'
+    error_preview.short_description = 'Last error'
+
+    def retry_jobs(self, request, queryset):
+        """Action to put failed or finished jobs back on the queue."""
+        updated = queryset.exclude(status=MediaJob.STATUS_RUNNING).update(
+            status=MediaJob.STATUS_PENDING,
+            attempts=0,
+            run_after=timezone.now(),
+        )
+        self.message_user(
+            request,
+            f'{updated} job(s) queued for retry.',
+            messages.SUCCESS
+        )
+    retry_jobs.short_description = 'Retry selected jobs'
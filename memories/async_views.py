@@ -0,0 +1,78 @@
+"""
+Async versions of the memorial page views, routed instead of the sync ones
+when ASYNC_VIEWS is on (the default under myMemory.asgi). Under ASGI a sync
+view is run in a thread shared by all sync views, so a worker handling many
+slow clients would serialize on it; these stay on the event loop and only
+leave it for the ORM and the occasional visit flush.
+"""
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import render
+
+from .access import acan_view
+from .cache import acache_page, aget_cached_page, visibility_of
+from .manifest import manifest_page_size
+from .models import MemorySlideShow
+from .views import finish_page, get_language
+from .visits import arecord_visit
+
+
+async def showProfileAsync(request, slug):
+    """Async showProfile"""
+    lang = get_language(request)
+    cached = await aget_cached_page(slug, lang, 'profile')
+    if cached is not None:
+        response, visibility = cached
+        if not await acan_view(request, slug, visibility):
+            raise Http404('No MemorySlideShow matches the given query.')
+        await arecord_visit(slug)
+        return finish_page(request, response, slug, lang, visibility)
+
+    try:
+        user = await MemorySlideShow.objects.aget(slug=slug)
+    except MemorySlideShow.DoesNotExist:
+        raise Http404('No MemorySlideShow matches the given query.')
+    if not await acan_view(request, slug, visibility_of(user)):
+        raise Http404('No MemorySlideShow matches the given query.')
+
+    await arecord_visit(user.slug)
+
+    template = 'core/profileFa.html' if lang == 'fa' else 'core/profileEn.html'
+    response = render(request, template, {'user': user, 'lang': lang})
+    await acache_page(user, lang, 'profile', response)
+    return finish_page(request, response, slug, lang, visibility_of(user))
+
+
+async def showSlideAsync(request, slug):
+    """Async showSlide"""
+    lang = get_language(request)
+    cached = await aget_cached_page(slug, lang, 'slide')
+    if cached is not None:
+        response, visibility = cached
+        if not await acan_view(request, slug, visibility):
+            raise Http404('No MemorySlideShow matches the given query.')
+        await arecord_visit(slug)
+        return finish_page(request, response, slug, lang, visibility)
+
+    initial_count = getattr(settings, 'SLIDE_INITIAL_COUNT', 3)
+    try:
+        user = await MemorySlideShow.objects.for_slide_page(lang, limit=initial_count).aget(slug=slug)
+    except MemorySlideShow.DoesNotExist:
+        raise Http404('No MemorySlideShow matches the given query.')
+    if not await acan_view(request, slug, visibility_of(user)):
+        raise Http404('No MemorySlideShow matches the given query.')
+
+    await arecord_visit(user.slug)
+
+    context = {
+        'user': user,
+        'slides': user.page_slides,
+        'slide_count': user.slide_count,
+        'manifest_page_size': manifest_page_size(),
+        'music_url': user.music.url if user.music else None,
+        'lang': lang
+    }
+    template = 'core/slideFa.html' if lang == 'fa' else 'core/slideEn.html'
+    response = render(request, template, context)
+    await acache_page(user, lang, 'slide', response)
+    return finish_page(request, response, slug, lang, visibility_of(user))
@@ -0,0 +1,185 @@
+"""
+Bulk slide import from a zip archive, a directory or a batch of uploads.
+
+Files are streamed one at a time into storage (zip members are read
+straight from the archive, never extracted to memory or disk as a whole).
+The media type is sniffed from the first bytes, not the extension, and
+files that are not images, video or audio are skipped. Slides are ordered
+by EXIF capture date, falling back to a natural sort of the file names,
+and numbered after the slideshow's current last slide. All rows are
+created with one ``bulk_create`` in a single transaction; derivative jobs
+are queued for the media worker (see jobs.enqueue_slides).
+"""
+import datetime
+import os
+import posixpath
+import re
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from .cache import invalidate_pages
+from .jobs import enqueue_slides
+from .models import Slide, media_file_size
+from .ordering import ORDER_GAP, next_order
+
+# (offset, signature, media type); checked in order
+MAGIC_NUMBERS = (
+    (0, b'\xff\xd8\xff', 'image'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (8, b'WEBP', 'image'),
+    (8, b'WAVE', 'audio'),
+    (0, b'\x1a\x45\xdf\xa3', 'video'),  # WebM / Matroska
+    (0, b'ID3', 'audio'),
+    (0, b'OggS', 'audio'),
+    (0, b'fLaC', 'audio'),
+)
+# ISO base media brands (bytes 8-12 after 'ftyp')
+IMAGE_BRANDS = {b'heic', b'heix', b'mif1', b'msf1', b'avif'}
+AUDIO_BRANDS = {b'M4A ', b'M4B '}
+
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+
+SORT_ORDERS = ('date', 'name')
+
+
+def sniff_media_type(head):
+    """Slide media type of a file starting with ``head``, or None."""
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in IMAGE_BRANDS:
+            return 'image'
+        if brand in AUDIO_BRANDS:
+            return 'audio'
+        return 'video'
+    if head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):  # MPEG audio frame
+        return 'audio'
+    for offset, signature, media_type in MAGIC_NUMBERS:
+        if head[offset:offset + len(signature)] == signature:
+            return media_type
+    return None
+
+
+def capture_date(fh):
+    """EXIF capture date of an image, or None."""
+    try:
+        with Image.open(fh) as image:
+            exif = image.getexif()
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    try:
+        return datetime.datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def is_hidden(name):
+    return any(part.startswith('.') or part == '__MACOSX' for part in re.split(r'[\\/]', name))
+
+
+def zip_entries(archive):
+    """``(name, size, opener)`` for the files in a zip archive (a path or file object)."""
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or is_hidden(info.filename):
+                continue
+            yield info.filename, info.file_size, lambda info=info: zf.open(info)
+
+
+def directory_entries(path):
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not is_hidden(d))
+        for filename in sorted(files):
+            if is_hidden(filename):
+                continue
+            full_path = os.path.join(root, filename)
+            yield os.path.relpath(full_path, path), os.path.getsize(full_path), lambda p=full_path: open(p, 'rb')
+
+
+def upload_entries(uploaded_files):
+    """Entries for uploaded files; an uploaded zip contributes its members."""
+    for uploaded in uploaded_files:
+        if zipfile.is_zipfile(uploaded):
+            uploaded.seek(0)
+            yield from zip_entries(uploaded)
+        else:
+            uploaded.seek(0)
+            yield uploaded.name, uploaded.size, lambda uploaded=uploaded: File(uploaded, uploaded.name)
+
+
+def source_entries(path):
+    """Entries of a zip archive or directory on disk."""
+    if os.path.isdir(path):
+        return directory_entries(path)
+    if zipfile.is_zipfile(path):
+        return zip_entries(path)
+    raise ValueError(f'{path} is neither a directory nor a zip archive')
+
+
+class ImportResult:
+    def __init__(self):
+        self.slides = []
+        self.skipped = []  # (name, reason)
+
+    def __str__(self):
+        return f'{len(self.slides)} slide(s) imported, {len(self.skipped)} file(s) skipped'
+
+
+def import_slides(slideshow, entries, order_by='date'):
+    """
+    Add a slide for every media file in ``entries`` (see ``zip_entries``,
+    ``directory_entries``, ``upload_entries``) to ``slideshow``.
+    """
+    if order_by not in SORT_ORDERS:
+        raise ValueError(f'Unknown slide order: {order_by}')
+    max_size = getattr(settings, 'SLIDE_IMPORT_MAX_FILE_SIZE', 200 * 1024 * 1024)
+    result = ImportResult()
+    pending = []  # (sort key, slide)
+    try:
+        for name, size, opener in entries:
+            if size > max_size:
+                result.skipped.append((name, 'too large'))
+                continue
+            with opener() as fh:
+                media_type = sniff_media_type(fh.read(16))
+                if media_type is None:
+                    result.skipped.append((name, 'not a supported media file'))
+                    continue
+                fh.seek(0)
+                taken = capture_date(fh) if media_type == 'image' and order_by == 'date' else None
+                fh.seek(0)
+                slide = Slide(slideshow=slideshow, media_type=media_type)
+                slide.media_file.save(posixpath.basename(name.replace('\\', '/')), File(fh), save=False)
+                # bulk_create skips the pre_save receiver that sets this
+                slide.media_size = media_file_size(slide.media_file)
+            key = (0, taken, natural_key(name)) if taken else (1, natural_key(name))
+            pending.append((key, slide))
+
+        pending.sort(key=lambda item: item[0])
+        with transaction.atomic():
+            first = next_order(slideshow)
+            for offset, (_, slide) in enumerate(pending):
+                slide.order = first + offset * ORDER_GAP
+            result.slides = Slide.objects.bulk_create([slide for _, slide in pending])
+            enqueue_slides(result.slides)
+    except BaseException:
+        # Nothing was created; don't leave the copied files behind
+        for _, slide in pending:
+            slide.media_file.delete(save=False)
+        raise
+
+    if result.slides:
+        invalidate_pages(slideshow.slug)
+    return result
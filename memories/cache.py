@@ -0,0 +1,104 @@
+"""
+Rendered-page cache for the memorial pages.
+
+Responses from ``showProfile``/``showSlide`` are stored per (view, slug,
+lang) together with the slideshow's visibility, so a cache hit can be
+authorized without a query. Entries are dropped by the model signals in
+``memories.models`` whenever the slideshow or one of its slides changes.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .proxy_cache import purge_proxy_cache
+
+PAGE_VIEWS = ('profile', 'slide')
+PAGE_LANGUAGES = ('en', 'fa')
+
+
+def get_page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def page_cache_key(slug, lang, view):
+    return f'memories:page:{view}:{slug}:{lang}'
+
+
+def visibility_cache_key(slug):
+    return f'memories:visibility:{slug}'
+
+
+def visibility_of(slideshow):
+    return {'is_public': slideshow.is_public, 'owner_id': slideshow.owner_id}
+
+
+def get_cached_page(slug, lang, view):
+    """
+    Return ``(response, visibility)`` for a cached page, or None on a miss.
+    ``visibility`` is ``{'is_public': bool, 'owner_id': int}``.
+    """
+    cached = get_page_cache().get(page_cache_key(slug, lang, view))
+    if cached is None:
+        return None
+    content, content_type, visibility = cached
+    return HttpResponse(content, content_type=content_type), visibility
+
+
+async def aget_cached_page(slug, lang, view):
+    """``get_cached_page`` for async views."""
+    cached = await get_page_cache().aget(page_cache_key(slug, lang, view))
+    if cached is None:
+        return None
+    content, content_type, visibility = cached
+    return HttpResponse(content, content_type=content_type), visibility
+
+
+def cache_page(slideshow, lang, view, response):
+    """Store a rendered 200 response for later requests."""
+    if response.status_code != 200:
+        return
+    get_page_cache().set(
+        page_cache_key(slideshow.slug, lang, view),
+        (response.content, response['Content-Type'], visibility_of(slideshow)),
+        getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60),
+    )
+
+
+async def acache_page(slideshow, lang, view, response):
+    """``cache_page`` for async views."""
+    if response.status_code != 200:
+        return
+    await get_page_cache().aset(
+        page_cache_key(slideshow.slug, lang, view),
+        (response.content, response['Content-Type'], visibility_of(slideshow)),
+        getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60),
+    )
+
+
+def patch_page_cache_headers(response, visibility, vary_on_cookie=True):
+    """
+    Let browsers, CDNs and the nginx proxy cache (for NGINX_CACHE_SECONDS,
+    purged on change) keep public responses. Private slideshows and
+    responses setting a cookie stay out of shared caches.
+    """
+    if visibility['is_public'] and not response.cookies:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'PAGE_BROWSER_MAX_AGE', 60))
+        response['X-Accel-Expires'] = getattr(settings, 'NGINX_CACHE_SECONDS', 600)
+        if vary_on_cookie:
+            patch_vary_headers(response, ['Cookie'])
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+        response['X-Accel-Expires'] = 0
+
+
+def invalidate_pages(slug):
+    """Drop every cached page rendered for ``slug``, here and in nginx."""
+    if not slug:
+        return
+    get_page_cache().delete_many([
+        page_cache_key(slug, lang, view)
+        for view in PAGE_VIEWS
+        for lang in PAGE_LANGUAGES
+    ] + [visibility_cache_key(slug)])
+    purge_proxy_cache(slug)
@@ -0,0 +1,117 @@
+"""
+Copying slideshows (the admin "Duplicate selected slideshows" action).
+
+A copy gets new rows and its own names for the original's files under
+``slideshows/<copy-slug>/``, so media access is decided by the copy's own
+visibility (see ``memories.views.serveMedia``). On local storage the names
+are hard links: the bytes are shared and the filesystem counts references,
+so nothing is copied or re-encoded and deleting either slideshow leaves the
+other intact. Renditions are linked along with their source. Everything
+else happens in one transaction: one INSERT and one slug query per
+slideshow, and a single ``bulk_create`` for the slides of all of them.
+"""
+import os
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .jobs import enqueue, enqueue_slides
+from .media import map_rendition_files, needs_derivatives
+from .models import MemorySlideShow, Slide
+
+COPIED_FIELDS = (
+    'owner_id', 'title_fa', 'date_of_birth', 'date_of_death', 'description', 'description_fa',
+    'profile_theme', 'slide_theme',
+)
+COPIED_SLIDE_FIELDS = ('media_type', 'caption', 'caption_fa', 'order', 'media_size')
+
+
+class MediaLinker:
+    """Gives files new names under one slideshow's directory, remembering them for cleanup."""
+
+    def __init__(self, storage, slug):
+        self.storage = storage
+        self.slug = slug
+        self.created = []
+
+    def link(self, name):
+        """
+        New name for the file ``name`` in this slideshow's directory: a hard
+        link on local storage, a copy otherwise. Missing files keep their name.
+        """
+        if not name:
+            return name
+        if not self.storage.exists(name):
+            return name
+        target = self.storage.get_available_name(f'slideshows/{self.slug}/{posixpath.basename(name)}')
+        try:
+            target_path = self.storage.path(target)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            os.link(self.storage.path(name), target_path)
+        except (NotImplementedError, OSError):
+            with self.storage.open(name) as fh:
+                target = self.storage.save(target, fh)
+        self.created.append(target)
+        return target
+
+    def link_renditions(self, renditions, source, new_source):
+        """Linked ``renditions``, still current if they were for ``source``."""
+        renditions = map_rendition_files(renditions, self.link)
+        if renditions and renditions.get('source') == source:
+            renditions['source'] = new_source
+        return renditions
+
+    def remove_created(self):
+        for name in self.created:
+            self.storage.delete(name)
+
+
+def duplicate_slideshows(slideshows):
+    """Private copies of ``slideshows`` with all their slides; returns the copies."""
+    copies = {}
+    linkers = {}
+    try:
+        with transaction.atomic():
+            for slideshow in slideshows:
+                copy = MemorySlideShow(
+                    title=f'{slideshow.title} (Copy)',
+                    is_public=False,
+                    **{field: getattr(slideshow, field) for field in COPIED_FIELDS},
+                )
+                copy.save()
+                linker = linkers[slideshow.pk] = MediaLinker(default_storage, copy.slug)
+                # The directory is named after the copy's slug, known once saved
+                copy.mainImage = linker.link(slideshow.mainImage.name)
+                copy.main_image_renditions = linker.link_renditions(
+                    slideshow.main_image_renditions, slideshow.mainImage.name, copy.mainImage.name,
+                )
+                copy.music = linker.link(slideshow.music.name)
+                if copy.mainImage or copy.music:
+                    MemorySlideShow.objects.filter(pk=copy.pk).update(
+                        mainImage=copy.mainImage.name, main_image_renditions=copy.main_image_renditions,
+                        music=copy.music.name,
+                    )
+                    if needs_derivatives(copy.mainImage, copy.main_image_renditions):
+                        enqueue('image_derivatives', copy)
+                copies[slideshow.pk] = copy
+
+            slides = Slide.objects.filter(slideshow__in=list(copies)).order_by('slideshow', 'order', 'pk')
+            new_slides = []
+            for slide in slides.iterator(chunk_size=2000):
+                linker = linkers[slide.slideshow_id]
+                media_file = linker.link(slide.media_file.name)
+                new_slides.append(Slide(
+                    slideshow=copies[slide.slideshow_id], media_file=media_file,
+                    renditions=linker.link_renditions(slide.renditions, slide.media_file.name, media_file),
+                    **{field: getattr(slide, field) for field in COPIED_SLIDE_FIELDS},
+                ))
+            new_slides = Slide.objects.bulk_create(new_slides, batch_size=500)
+            # Only slides whose original was still waiting for its renditions
+            enqueue_slides(new_slides)
+    except BaseException:
+        # Nothing was created; don't leave the linked files behind
+        for linker in linkers.values():
+            linker.remove_created()
+        raise
+    return list(copies.values())
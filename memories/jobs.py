@@ -0,0 +1,203 @@
+"""
+Database-backed queue for post-upload media work.
+
+Model signals enqueue ``MediaJob`` rows; ``manage.py run_media_worker``
+claims and runs them outside the gunicorn request cycle, retrying failures
+with exponential backoff. No external broker is needed.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_pages
+from .media import (
+    convert_gif as convert, generate_image_derivatives, needs_derivatives, rendition_files,
+    transcode_video as transcode,
+)
+from .models import MediaJob, MemorySlideShow, Slide, media_is_referenced
+
+logger = logging.getLogger(__name__)
+
+
+def discard_renditions(storage, old, new):
+    """
+    Once committed, delete the files of ``old`` renditions replaced by
+    ``new`` ones, unless another row still uses the old source.
+    """
+    source = (old or {}).get('source')
+    stale = set(rendition_files(old)) - set(rendition_files(new))
+    if not source or not stale:
+        return
+
+    def delete_files():
+        if not media_is_referenced(source):
+            for name in stale:
+                storage.delete(name)
+    transaction.on_commit(delete_files)
+
+
+def update_slide_renditions(slide, renditions):
+    Slide.objects.filter(pk=slide.pk).update(renditions=renditions)
+    discard_renditions(slide.media_file.storage, slide.renditions, renditions)
+
+
+def image_derivatives(job):
+    if job.slide_id:
+        slide = job.slide
+        if slide.media_type == 'image' and needs_derivatives(slide.media_file, slide.renditions):
+            update_slide_renditions(slide, generate_image_derivatives(slide.media_file))
+    else:
+        slideshow = job.slideshow
+        if needs_derivatives(slideshow.mainImage, slideshow.main_image_renditions):
+            renditions = generate_image_derivatives(slideshow.mainImage)
+            MemorySlideShow.objects.filter(pk=slideshow.pk).update(main_image_renditions=renditions)
+            discard_renditions(slideshow.mainImage.storage, slideshow.main_image_renditions, renditions)
+
+
+def transcode_video(job):
+    slide = job.slide
+    if slide.media_type == 'video' and needs_derivatives(slide.media_file, slide.renditions):
+        update_slide_renditions(slide, transcode(slide.media_file))
+
+
+def convert_gif(job):
+    slide = job.slide
+    if slide.media_type == 'gif' and needs_derivatives(slide.media_file, slide.renditions):
+        update_slide_renditions(slide, convert(slide.media_file))
+
+
+TASKS = {
+    'image_derivatives': image_derivatives,
+    'transcode_video': transcode_video,
+    'convert_gif': convert_gif,
+}
+
+
+def enqueue(task, slideshow, slide=None):
+    """
+    Queue ``task`` for a slideshow (or one of its slides) unless an identical
+    job is already waiting. Runs the job inline when MEDIA_JOBS_EAGER is set.
+    """
+    if task not in TASKS:
+        raise ValueError(f'Unknown media task: {task}')
+    job = MediaJob.objects.filter(
+        task=task, slideshow=slideshow, slide=slide, status=MediaJob.STATUS_PENDING,
+    ).first()
+    if job is None:
+        job = MediaJob.objects.create(
+            task=task,
+            slideshow=slideshow,
+            slide=slide,
+            max_attempts=getattr(settings, 'MEDIA_JOB_MAX_ATTEMPTS', 3),
+        )
+    if getattr(settings, 'MEDIA_JOBS_EAGER', False):
+        job = claim_job(pk=job.pk)
+        if job is not None:
+            run_job(job)
+    return job
+
+
+def enqueue_slides(slides):
+    """
+    Queue the derivative job of each of ``slides`` (just created, so none
+    has a job yet) with one INSERT. Eager jobs run once the transaction
+    commits.
+    """
+    max_attempts = getattr(settings, 'MEDIA_JOB_MAX_ATTEMPTS', 3)
+    jobs = MediaJob.objects.bulk_create([
+        MediaJob(
+            task=Slide.MEDIA_TASKS[slide.media_type],
+            slideshow=slide.slideshow,
+            slide=slide,
+            max_attempts=max_attempts,
+        )
+        for slide in slides
+        if slide.media_type in Slide.MEDIA_TASKS and needs_derivatives(slide.media_file, slide.renditions)
+    ])
+    if getattr(settings, 'MEDIA_JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_jobs(jobs))
+    return jobs
+
+
+def run_jobs(jobs):
+    for job in jobs:
+        job = claim_job(pk=job.pk)
+        if job is not None:
+            run_job(job)
+
+
+def claim_job(tasks=None, pk=None):
+    """
+    Atomically move the next due pending job to 'running' and return it, or
+    return None if nothing is due. Safe to call from concurrent workers.
+    """
+    now = timezone.now()
+    candidates = MediaJob.objects.filter(status=MediaJob.STATUS_PENDING, run_after__lte=now)
+    if tasks:
+        candidates = candidates.filter(task__in=tasks)
+    if pk is not None:
+        candidates = candidates.filter(pk=pk)
+    for job_id in candidates.order_by('run_after', 'pk').values_list('pk', flat=True)[:10]:
+        claimed = MediaJob.objects.filter(pk=job_id, status=MediaJob.STATUS_PENDING).update(
+            status=MediaJob.STATUS_RUNNING,
+            started_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return MediaJob.objects.select_related('slideshow', 'slide').get(pk=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'MEDIA_JOB_RETRY_DELAY', 30)
+    return timedelta(seconds=base * 2 ** max(attempts - 1, 0))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    try:
+        TASKS[job.task](job)
+    except Exception:
+        logger.exception('Media job %s failed (attempt %d/%d)', job.pk, job.attempts, job.max_attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = MediaJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = MediaJob.STATUS_PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+        job.save(update_fields=['status', 'last_error', 'run_after', 'finished_at', 'updated_at'])
+        return False
+
+    job.status = MediaJob.STATUS_DONE
+    job.last_error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'updated_at'])
+    invalidate_pages(job.slideshow.slug)
+    return True
+
+
+def requeue_stale_jobs():
+    """
+    Return jobs left 'running' by a crashed worker to the queue, or fail
+    them if they have used up their attempts.
+    """
+    now = timezone.now()
+    stale = MediaJob.objects.filter(
+        status=MediaJob.STATUS_RUNNING,
+        started_at__lt=now - timedelta(seconds=getattr(settings, 'MEDIA_JOB_TIMEOUT', 3600)),
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=MediaJob.STATUS_FAILED, finished_at=now,
+        last_error='Worker timed out on the final attempt', updated_at=now,
+    )
+    return stale.filter(attempts__lt=F('max_attempts')).update(
+        status=MediaJob.STATUS_PENDING, run_after=now,
+        last_error='Requeued after worker timeout', updated_at=now,
+    )
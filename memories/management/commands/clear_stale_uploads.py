@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from memories.models import ChunkedUpload
+from memories.uploads import abort_upload
+
+
+class Command(BaseCommand):
+    help = 'Remove resumable uploads that have not received data for CHUNKED_UPLOAD_EXPIRY seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60),
+            help='Age in seconds of the last chunk.',
+        )
+
+    def handle(self, *args, older_than, **options):
+        cutoff = timezone.now() - timedelta(seconds=older_than)
+        stale = ChunkedUpload.objects.exclude(status=ChunkedUpload.STATUS_COMPLETE).filter(updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.select_related('slideshow'):
+            abort_upload(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Removed {count} stale upload(s).'))
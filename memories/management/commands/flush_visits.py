@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from memories.visits import flush_visits
+
+
+class Command(BaseCommand):
+    help = (
+        'Write spooled visit counts to MemorySlideShow.visit_count. Visits still '
+        'buffered in running workers are flushed by those workers.'
+    )
+
+    def handle(self, *args, **options):
+        written = flush_visits()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} visit(s).'))
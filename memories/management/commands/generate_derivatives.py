@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from memories.cache import invalidate_pages
+from memories.media import generate_image_derivatives, needs_derivatives
+from memories.models import MemorySlideShow, Slide
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image renditions for existing slides and profile images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Only process these slideshows.')
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions.')
+
+    def handle(self, *args, slugs=(), force=False, **options):
+        slideshows = MemorySlideShow.objects.exclude(mainImage='')
+        slides = Slide.objects.filter(media_type='image').exclude(media_file='').select_related('slideshow')
+        if slugs:
+            slideshows = slideshows.filter(slug__in=slugs)
+            slides = slides.filter(slideshow__slug__in=slugs)
+
+        touched = set()
+        count = 0
+        for slideshow in slideshows.iterator():
+            if force or needs_derivatives(slideshow.mainImage, slideshow.main_image_renditions):
+                renditions = generate_image_derivatives(slideshow.mainImage)
+                MemorySlideShow.objects.filter(pk=slideshow.pk).update(main_image_renditions=renditions)
+                touched.add(slideshow.slug)
+                count += 1
+        for slide in slides.iterator():
+            if force or needs_derivatives(slide.media_file, slide.renditions):
+                renditions = generate_image_derivatives(slide.media_file)
+                Slide.objects.filter(pk=slide.pk).update(renditions=renditions)
+                touched.add(slide.slideshow.slug)
+                count += 1
+
+        for slug in touched:
+            invalidate_pages(slug)
+        self.stdout.write(self.style.SUCCESS(f'Generated renditions for {count} image(s).'))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from memories.proxy_cache import read_visit_log, save_visit_log_offset
+from memories.visits import write_visits
+
+
+class Command(BaseCommand):
+    help = 'Add page views answered by the nginx cache (NGINX_VISIT_LOG) to visit_count.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=getattr(settings, 'NGINX_VISIT_LOG', ''), help='Path of the nginx visit log.')
+
+    def handle(self, *args, log, **options):
+        if not log:
+            raise CommandError('Set NGINX_VISIT_LOG or pass --log.')
+        counts, offset = read_visit_log(log)
+        write_visits(counts)
+        save_visit_log_offset(log, offset)
+        self.stdout.write(self.style.SUCCESS(f'Imported {sum(counts.values())} cached visit(s).'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from memories.bulk_import import SORT_ORDERS, import_slides, source_entries
+from memories.models import MemorySlideShow
+
+
+class Command(BaseCommand):
+    help = 'Add slides to a slideshow from a zip archive or a directory of media files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slideshow to add the slides to.')
+        parser.add_argument('source', help='Zip archive or directory.')
+        parser.add_argument(
+            '--order', choices=SORT_ORDERS, default='date',
+            help='Order slides by EXIF capture date (then file name) or by file name only.',
+        )
+
+    def handle(self, *args, slug, source, order, **options):
+        try:
+            slideshow = MemorySlideShow.objects.get(slug=slug)
+        except MemorySlideShow.DoesNotExist:
+            raise CommandError(f'No slideshow with slug "{slug}".')
+        try:
+            entries = source_entries(source)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        result = import_slides(slideshow, entries, order_by=order)
+        for name, reason in result.skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {name}: {reason}'))
+        self.stdout.write(self.style.SUCCESS(f'{result} into "{slideshow.title}".'))
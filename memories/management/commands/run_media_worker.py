@@ -0,0 +1,86 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from memories.jobs import TASKS, claim_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued media jobs (renditions, transcodes) outside the web workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'MEDIA_WORKER_CONCURRENCY', 2),
+            help='Number of jobs to run at the same time.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=getattr(settings, 'MEDIA_WORKER_POLL_INTERVAL', 5),
+            help='Seconds to wait between polls when the queue is empty.',
+        )
+        parser.add_argument('--task', action='append', choices=sorted(TASKS), help='Only run these tasks.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, concurrency, poll_interval, task, once, **options):
+        self.stopping = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        previous_handlers = {
+            signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+
+        try:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale job(s).')
+
+            if concurrency <= 1:
+                self.work(task, once, poll_interval)
+            else:
+                threads = [
+                    threading.Thread(
+                        target=self.work_in_thread, args=(task, once, poll_interval), name=f'media-worker-{i}',
+                    )
+                    for i in range(concurrency)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {self.processed} job(s), {self.failed} failed.'
+        ))
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after current jobs...')
+        self.stopping.set()
+
+    def work_in_thread(self, tasks, once, poll_interval):
+        try:
+            self.work(tasks, once, poll_interval)
+        finally:
+            connection.close()
+
+    def work(self, tasks, once, poll_interval):
+        while not self.stopping.is_set():
+            job = claim_job(tasks)
+            if job is None:
+                if once:
+                    return
+                self.stopping.wait(poll_interval)
+                close_old_connections()
+                requeue_stale_jobs()
+                continue
+            succeeded = run_job(job)
+            with self.lock:
+                self.processed += 1
+                self.failed += not succeeded
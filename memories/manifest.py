@@ -0,0 +1,64 @@
+"""
+JSON manifest of a slideshow's slides.
+
+The slide page only renders the first few slides; ``slide.js`` pages
+through this manifest to build the rest on demand, keeping a small
+window of slide elements in the DOM.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+
+def manifest_page_size():
+    return getattr(settings, 'SLIDE_MANIFEST_PAGE_SIZE', 50)
+
+
+def slide_entry(slide, index):
+    """Everything slide.js needs to build one slide element."""
+    entry = {
+        'index': index,
+        'order': slide.order,
+        'type': slide.media_type,
+        'src': slide.media_file.url if slide.media_file else None,
+        'caption': {'en': slide.caption, 'fa': slide.caption_fa},
+    }
+    if not slide.media_file:
+        return entry
+    # Size of the upload; the prefetcher weighs it against the bandwidth
+    entry['bytes'] = slide.media_size
+    if slide.media_type == 'image':
+        entry['sources'] = slide.image_sources
+    elif slide.media_type == 'video':
+        entry['src'] = slide.video_url
+        entry['poster'] = slide.poster_url
+    elif slide.media_type == 'gif':
+        entry['videos'] = slide.video_sources
+        entry['poster'] = slide.poster_url
+    return entry
+
+
+def build_manifest(slug, page_number):
+    """
+    One page of the manifest as ``(body, etag)``. Raises InvalidPage for
+    out-of-range pages.
+    """
+    from .models import Slide
+
+    slides = Slide.objects.filter(slideshow__slug=slug).order_by('order', 'pk').only(
+        'order', 'media_type', 'media_file', 'renditions', 'media_size', 'caption', 'caption_fa',
+    )
+    page = Paginator(slides, manifest_page_size(), allow_empty_first_page=True).page(page_number)
+    data = {
+        'slug': slug,
+        'count': page.paginator.count,
+        'page': page.number,
+        'pages': page.paginator.num_pages,
+        'page_size': page.paginator.per_page,
+        'next': page.next_page_number() if page.has_next() else None,
+        'slides': [slide_entry(slide, page.start_index() - 1 + offset) for offset, slide in enumerate(page)],
+    }
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+    return body, f'"{hashlib.md5(body).hexdigest()}"'
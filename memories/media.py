@@ -0,0 +1,301 @@
+"""
+Derived media for slides and profile images.
+
+Uploaded images are resized to a fixed set of widths and re-encoded in
+modern formats next to the original (``slideshows/<slug>/``); videos are
+transcoded to a web-optimized MP4 with a poster frame. The result is
+recorded as a small JSON "renditions" dict on the model so templates can
+reference the derived files without touching storage.
+
+Animated GIFs are converted to looping, muted WebM/MP4 renditions, which are
+typically 5-20x smaller than the GIF itself.
+"""
+import contextlib
+import io
+import os
+import posixpath
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+class MediaProcessingError(Exception):
+    """Raised when an external media tool fails on an upload."""
+
+
+FORMAT_MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+}
+
+
+def derivative_widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1024, 1600)))
+
+
+def derivative_formats():
+    """Output formats supported by the installed Pillow, best first."""
+    Image.init()
+    formats = getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', ('avif', 'webp'))
+    return [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+
+
+def derivative_name(name, width, fmt):
+    stem, _ = posixpath.splitext(name)
+    return f'{stem}-{width}w.{fmt}'
+
+
+def save_derivative(storage, name, content):
+    """Write ``content`` to ``name``, replacing any previous rendition."""
+    if storage.exists(name):
+        storage.delete(name)
+    if not hasattr(content, 'read'):
+        content = ContentFile(content)
+    return storage.save(name, content)
+
+
+def save_derivative_file(storage, name, path):
+    with open(path, 'rb') as fh:
+        return save_derivative(storage, name, fh)
+
+
+def target_widths(source_width):
+    """Configured widths below the source width (never upscale)."""
+    widths = [width for width in derivative_widths() if width < source_width]
+    return widths or [source_width]
+
+
+def generate_image_derivatives(fieldfile):
+    """
+    Create resized renditions of an image ``FieldFile``.
+
+    Returns a renditions dict::
+
+        {'source': 'slideshows/jane/a.jpg', 'width': 4032, 'height': 3024,
+         'images': {'webp': [[320, 'slideshows/jane/a-320w.webp'], ...]}}
+    """
+    storage = fieldfile.storage
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+    with fieldfile.open('rb') as fh:
+        image = Image.open(fh)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+    source_width, source_height = image.size
+    images = {}
+    for fmt in derivative_formats():
+        images[fmt] = []
+        for width in target_widths(source_width):
+            height = max(1, round(source_height * width / source_width))
+            resized = image if width == source_width else image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt.upper(), quality=quality)
+            name = save_derivative(storage, derivative_name(fieldfile.name, width, fmt), buffer.getvalue())
+            images[fmt].append([width, name])
+    return {
+        'source': fieldfile.name,
+        'width': source_width,
+        'height': source_height,
+        'images': images,
+    }
+
+
+def rendition_files(renditions):
+    """Names of every derived file recorded in a renditions dict."""
+    renditions = renditions or {}
+    names = [name for entries in renditions.get('images', {}).values() for _, name in entries]
+    names.extend(renditions.get('videos', {}).values())
+    if renditions.get('poster'):
+        names.append(renditions['poster'])
+    return names
+
+
+def map_rendition_files(renditions, func):
+    """Copy of ``renditions`` with every derived file name passed through ``func``."""
+    if not renditions:
+        return renditions
+    mapped = dict(renditions)
+    if 'images' in renditions:
+        mapped['images'] = {
+            fmt: [[width, func(name)] for width, name in entries]
+            for fmt, entries in renditions['images'].items()
+        }
+    if 'videos' in renditions:
+        mapped['videos'] = {kind: func(name) for kind, name in renditions['videos'].items()}
+    if renditions.get('poster'):
+        mapped['poster'] = func(renditions['poster'])
+    return mapped
+
+
+def needs_derivatives(fieldfile, renditions):
+    return bool(fieldfile) and (renditions or {}).get('source') != fieldfile.name
+
+
+def image_sources(renditions, storage):
+    """``[{'type': mime, 'srcset': '...'}]`` for ``<picture><source>`` tags."""
+    sources = []
+    for fmt, entries in (renditions or {}).get('images', {}).items():
+        if not entries:
+            continue
+        sources.append({
+            'type': FORMAT_MIME_TYPES.get(fmt, f'image/{fmt}'),
+            'srcset': ', '.join(f'{storage.url(name)} {width}w' for width, name in entries),
+        })
+    return sources
+
+
+def smallest_image_url(renditions, storage):
+    """URL of the narrowest rendition (any format), or None."""
+    entries = [entry for items in (renditions or {}).get('images', {}).values() for entry in items]
+    if not entries:
+        return None
+    return storage.url(min(entries)[1])
+
+
+def ffmpeg_binary():
+    return getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+
+
+def run_ffmpeg(*args):
+    """Run ffmpeg with ``args``; raise MediaProcessingError on failure."""
+    command = [ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-nostdin', '-y', *args]
+    try:
+        subprocess.run(
+            command, check=True, capture_output=True,
+            timeout=getattr(settings, 'FFMPEG_TIMEOUT', 1800),
+        )
+    except FileNotFoundError as exc:
+        raise MediaProcessingError(f'ffmpeg not found: {command[0]}') from exc
+    except subprocess.TimeoutExpired as exc:
+        raise MediaProcessingError(f'ffmpeg timed out after {exc.timeout}s') from exc
+    except subprocess.CalledProcessError as exc:
+        raise MediaProcessingError(exc.stderr.decode(errors='replace').strip() or str(exc)) from exc
+
+
+@contextlib.contextmanager
+def local_path(fieldfile):
+    """Yield a filesystem path for ``fieldfile``, copying it out of remote storage if needed."""
+    try:
+        yield fieldfile.path
+        return
+    except NotImplementedError:
+        pass
+    suffix = posixpath.splitext(fieldfile.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        with fieldfile.open('rb') as fh:
+            shutil.copyfileobj(fh, tmp)
+        tmp.flush()
+        yield tmp.name
+
+
+def scale_filter(max_dimension):
+    """Cap the longest side at ``max_dimension`` keeping even dimensions for yuv420p."""
+    return (
+        f"scale='if(gte(iw,ih),trunc(min({max_dimension},iw)/2)*2,-2)':"
+        f"'if(gte(iw,ih),-2,trunc(min({max_dimension},ih)/2)*2)'"
+    )
+
+
+def extract_poster(source_path, output_path, max_dimension):
+    """Write a representative frame of ``source_path`` as a JPEG."""
+    run_ffmpeg(
+        '-i', source_path,
+        '-vf', f'thumbnail=30,{scale_filter(max_dimension)}',
+        '-frames:v', '1', '-q:v', '3',
+        output_path,
+    )
+
+
+def transcode_video(fieldfile):
+    """
+    Transcode a video ``FieldFile`` to a muted, faststart H.264 MP4 with a
+    capped resolution and bitrate, plus a poster JPEG.
+
+    Returns a renditions dict::
+
+        {'source': 'slideshows/jane/clip.mov',
+         'videos': {'mp4': 'slideshows/jane/clip-web.mp4'},
+         'poster': 'slideshows/jane/clip-poster.jpg'}
+    """
+    storage = fieldfile.storage
+    max_dimension = getattr(settings, 'VIDEO_MAX_DIMENSION', 1280)
+    max_kbps = getattr(settings, 'VIDEO_MAX_BITRATE_KBPS', 2500)
+    stem, _ = posixpath.splitext(fieldfile.name)
+    with local_path(fieldfile) as source_path, tempfile.TemporaryDirectory() as workdir:
+        video_path = os.path.join(workdir, 'web.mp4')
+        poster_path = os.path.join(workdir, 'poster.jpg')
+        # Slides play muted behind the background music, so audio is dropped.
+        run_ffmpeg(
+            '-i', source_path,
+            '-map', '0:v:0', '-an', '-sn',
+            '-vf', scale_filter(max_dimension),
+            '-c:v', 'libx264', '-preset', 'medium', '-crf', str(getattr(settings, 'VIDEO_CRF', 23)),
+            '-maxrate', f'{max_kbps}k', '-bufsize', f'{max_kbps * 2}k',
+            '-pix_fmt', 'yuv420p', '-profile:v', 'high',
+            '-movflags', '+faststart',
+            video_path,
+        )
+        extract_poster(source_path, poster_path, max_dimension)
+        return {
+            'source': fieldfile.name,
+            'videos': {'mp4': save_derivative_file(storage, f'{stem}-web.mp4', video_path)},
+            'poster': save_derivative_file(storage, f'{stem}-poster.jpg', poster_path),
+        }
+
+
+def save_first_frame(source_path, output_path):
+    """Write the first frame of an animated image as a JPEG still."""
+    with Image.open(source_path) as image:
+        image.seek(0)
+        frame = image.convert('RGBA')
+    background = Image.new('RGB', frame.size, (255, 255, 255))
+    background.paste(frame, mask=frame.getchannel('A'))
+    background.save(output_path, 'JPEG', quality=getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80))
+
+
+def convert_gif(fieldfile):
+    """
+    Convert an animated GIF ``FieldFile`` to muted, looping-friendly WebM
+    (VP9) and MP4 (H.264) renditions plus a first-frame still.
+
+    Returns a renditions dict::
+
+        {'source': 'slideshows/jane/wave.gif',
+         'videos': {'webm': 'slideshows/jane/wave-loop.webm',
+                    'mp4': 'slideshows/jane/wave-loop.mp4'},
+         'poster': 'slideshows/jane/wave-still.jpg'}
+    """
+    storage = fieldfile.storage
+    scale = scale_filter(getattr(settings, 'VIDEO_MAX_DIMENSION', 1280))
+    crf = str(getattr(settings, 'VIDEO_CRF', 23))
+    stem, _ = posixpath.splitext(fieldfile.name)
+    with local_path(fieldfile) as source_path, tempfile.TemporaryDirectory() as workdir:
+        webm_path = os.path.join(workdir, 'loop.webm')
+        mp4_path = os.path.join(workdir, 'loop.mp4')
+        still_path = os.path.join(workdir, 'still.jpg')
+        run_ffmpeg(
+            '-i', source_path, '-an', '-vf', scale,
+            '-c:v', 'libvpx-vp9', '-b:v', '0', '-crf', str(getattr(settings, 'VIDEO_WEBM_CRF', 35)), '-row-mt', '1',
+            '-pix_fmt', 'yuv420p',
+            webm_path,
+        )
+        run_ffmpeg(
+            '-i', source_path, '-an', '-vf', scale,
+            '-c:v', 'libx264', '-preset', 'medium', '-crf', crf,
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            mp4_path,
+        )
+        save_first_frame(source_path, still_path)
+        return {
+            'source': fieldfile.name,
+            'videos': {
+                'webm': save_derivative_file(storage, f'{stem}-loop.webm', webm_path),
+                'mp4': save_derivative_file(storage, f'{stem}-loop.mp4', mp4_path),
+            },
+            'poster': save_derivative_file(storage, f'{stem}-still.jpg', still_path),
+        }
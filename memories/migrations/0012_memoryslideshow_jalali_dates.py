@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-17 15:32
+
+from django.db import migrations, models
+from khayyam import JalaliDate
+
+
+def to_jalali(date):
+    return JalaliDate(date).strftime('%Y/%m/%d') if date else ''
+
+
+def backfill_jalali_dates(apps, schema_editor):
+    MemorySlideShow = apps.get_model('memories', 'MemorySlideShow')
+    slideshows = list(MemorySlideShow.objects.only('date_of_birth', 'date_of_death'))
+    for slideshow in slideshows:
+        slideshow.date_of_birth_fa = to_jalali(slideshow.date_of_birth)
+        slideshow.date_of_death_fa = to_jalali(slideshow.date_of_death)
+    MemorySlideShow.objects.bulk_update(slideshows, ['date_of_birth_fa', 'date_of_death_fa'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memories', '0011_add_visit_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memoryslideshow',
+            name='date_of_birth_fa',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='memoryslideshow',
+            name='date_of_death_fa',
+            field=models.CharField(blank=True, editable=False, max_length=10),
+        ),
+        migrations.RunPython(backfill_jalali_dates, migrations.RunPython.noop),
+    ]
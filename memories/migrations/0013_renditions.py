@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-17 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memories', '0012_memoryslideshow_jalali_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memoryslideshow',
+            name='main_image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='slide',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
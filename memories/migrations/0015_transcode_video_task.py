@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memories', '0014_mediajob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediajob',
+            name='task',
+            field=models.CharField(choices=[('image_derivatives', 'Image renditions'), ('transcode_video', 'Video transcode')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+def backfill_media_sizes(apps, schema_editor):
+    Slide = apps.get_model('memories', 'Slide')
+    slides = list(Slide.objects.exclude(media_file='').only('media_file'))
+    for slide in slides:
+        try:
+            slide.media_size = slide.media_file.size
+        except OSError:
+            slide.media_size = 0
+    Slide.objects.bulk_update(slides, ['media_size'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memories', '0017_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slide',
+            name='media_size',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_media_sizes, migrations.RunPython.noop),
+    ]
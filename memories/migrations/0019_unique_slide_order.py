@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-17 16:17
+
+from django.db import migrations, models
+
+ORDER_GAP = 1024  # memories.ordering.ORDER_GAP
+
+
+def respace_slide_order(apps, schema_editor):
+    """Sparse, unique order keys; ties keep their creation order."""
+    Slide = apps.get_model('memories', 'Slide')
+    slides, slideshow_id, position = [], None, 0
+    for slide in Slide.objects.order_by('slideshow_id', 'order', 'pk').only('slideshow_id', 'order').iterator(chunk_size=2000):
+        position = position + 1 if slide.slideshow_id == slideshow_id else 1
+        slideshow_id = slide.slideshow_id
+        slide.order = position * ORDER_GAP
+        slides.append(slide)
+    Slide.objects.bulk_update(slides, ['order'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('memories', '0018_slide_media_size'),
+    ]
+
+    operations = [
+        migrations.RunPython(respace_slide_order, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='slide',
+            constraint=models.UniqueConstraint(fields=('slideshow', 'order'), name='unique_slide_order'),
+        ),
+    ]
@@ -1,8 +1,17 @@
-from django.db import models
+import re
+import uuid
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.dispatch import receiver
 from accounts.models import User
 from django.utils.text import slugify
-from django.db.models.signals import pre_save
+from django.db.models import Prefetch, Q
+from django.db.models.functions import Cast, Substr
+from django.db.models.signals import pre_save, post_save, post_delete
+from khayyam import JalaliDate
+from .cache import invalidate_pages
+from .media import image_sources, needs_derivatives, rendition_files, smallest_image_url
 
 def slide_media_upload_path(instance, filename: str) -> str:
     slideshow_id = instance.slug
@@ -12,16 +21,47 @@ def slide_media_upload_path_not_profile(instance, filename):
     slideshow_id = instance.slideshow.slug
     return f'slideshows/{slideshow_id}/{filename}'
 
+def to_jalali(date) -> str:
+    """Render a Gregorian date as a Jalali 'YYYY/MM/DD' string ('' for None)."""
+    if date is None:
+        return ''
+    return JalaliDate(date).strftime('%Y/%m/%d')
+
+class MemorySlideShowQuerySet(models.QuerySet):
+    def for_slide_page(self, lang='en', limit=None):
+        """
+        Slideshows with the columns the slide page renders and their first
+        ``limit`` slides (all if None), ordered, in ``page_slides``, plus the
+        total in ``slide_count``: two queries, whatever the slide count.
+        """
+        suffix = '_fa' if lang == 'fa' else ''
+        slides = Slide.objects.order_by('order', 'pk').only(
+            'slideshow_id', 'media_type', 'media_file', 'renditions', 'media_size', f'caption{suffix}',
+        )
+        if limit is not None:
+            slides = slides[:limit]
+        return self.only(
+            'slug', 'owner_id', 'is_public', 'music', 'slide_theme', 'title', 'title_fa',
+        ).annotate(
+            slide_count=models.Count('slides'),
+        ).prefetch_related(Prefetch('slides', queryset=slides, to_attr='page_slides'))
+
+
 class MemorySlideShow(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slideshows')
     title = models.CharField(max_length=200)
     title_fa = models.CharField(max_length=200, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField(null=True, blank=True)
+    # Jalali renderings of the dates above, kept in sync on save
+    date_of_birth_fa = models.CharField(max_length=10, blank=True, editable=False)
+    date_of_death_fa = models.CharField(max_length=10, blank=True, editable=False)
     description = models.TextField(blank=True)
     description_fa = models.TextField(blank=True)
     mainImage = models.ImageField(upload_to= slide_media_upload_path, null=True, blank=True)
     music = models.FileField(upload_to= slide_media_upload_path, null=True, blank=True) #type: ignore
+    # Resized/re-encoded copies of mainImage (see memories/media.py)
+    main_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     THEME_CHOICES = [
         ('modern', 'Modern'),
         ('classic', 'Classic'),
@@ -47,6 +87,7 @@ class MemorySlideShow(models.Model):
     is_public = models.BooleanField(default=True) #type: ignore
     visit_count = models.PositiveIntegerField(default=0, help_text='Total number of visits to this slideshow')
 
+    objects = MemorySlideShowQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
@@ -54,20 +95,84 @@ class MemorySlideShow(models.Model):
     def __str__(self):
         return f"{self.title} ({self.date_of_birth} - {self.date_of_death})"
 
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+        # create_slug picks a slug; a concurrent save may commit it first
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = MemorySlideShow.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not taken or attempt == SLUG_SAVE_ATTEMPTS - 1:
+                    raise
+                self.slug = ''
+
     @property
     def ordered_slides(self):
         return self.slides.order_by('order') #type: ignore
 
+    @property
+    def main_image_sources(self):
+        return image_sources(self.main_image_renditions, self.mainImage.storage)
+
+    @property
+    def main_image_thumbnail_url(self):
+        if not self.mainImage:
+            return None
+        return smallest_image_url(self.main_image_renditions, self.mainImage.storage) or self.mainImage.url
+
+    @property
+    def born_year_fa(self):
+        return self.date_of_birth_fa.split('/')[0]
+
+    @property
+    def death_year_fa(self):
+        return self.date_of_death_fa.split('/')[0]
+
+# Room left in the slug field for a "-<n>" suffix up to -9999; longer
+# suffixes shorten the base further
+SLUG_SUFFIX_LENGTH = 5
+SLUG_SAVE_ATTEMPTS = 5
+
+def _slugs_taken(base_slug):
+    return MemorySlideShow.objects.filter(slug__startswith=base_slug).aggregate(
+        base=models.Count('pk', filter=Q(slug=base_slug)),
+        last=models.Max(
+            Cast(Substr('slug', len(base_slug) + 2), models.IntegerField()),
+            filter=Q(slug__regex=rf'^{re.escape(base_slug)}-[0-9]+$'),
+        ),
+    )
+
+def unique_slug(base_slug):
+    """
+    ``base_slug`` if free, otherwise ``base_slug-<n>`` after the highest
+    suffix in use, found with one aggregate query. Racing saves can still
+    pick the same slug; ``MemorySlideShow.save`` retries on the conflict.
+    """
+    max_length = MemorySlideShow._meta.get_field('slug').max_length
+    base_slug = base_slug[:max_length - SLUG_SUFFIX_LENGTH].rstrip('-')
+    taken = _slugs_taken(base_slug)
+    if not taken['base']:
+        return base_slug
+    suffix = (taken['last'] or 0) + 1
+    # Past the reserved room, cut the base to fit the actual suffix. The
+    # shorter base has its own "-<n>" slugs, so continue after those too.
+    while len(base_slug) + len(f'-{suffix}') > max_length:
+        base_slug = base_slug[:max_length - len(f'-{suffix}')].rstrip('-')
+        suffix = max(suffix, (_slugs_taken(base_slug)['last'] or 0) + 1)
+    return f'{base_slug}-{suffix}'
+
 @receiver(pre_save, sender=MemorySlideShow)
 def create_slug(sender, instance, *args, **kwargs):
     if not instance.slug:
-        base_slug = slugify(instance.title)
-        instance.slug = base_slug
-        counter = 1
-        # Ensure slug is unique
-        while sender.objects.filter(slug=instance.slug).exists():
-            instance.slug = f"{base_slug}-{counter}"
-            counter += 1
+        instance.slug = unique_slug(slugify(instance.title))
+
+@receiver(pre_save, sender=MemorySlideShow)
+def set_jalali_dates(sender, instance, *args, **kwargs):
+    instance.date_of_birth_fa = to_jalali(instance.date_of_birth)
+    instance.date_of_death_fa = to_jalali(instance.date_of_death)
 
 class Slide(models.Model):
     slideshow = models.ForeignKey(MemorySlideShow, on_delete=models.CASCADE, related_name='slides')
@@ -77,16 +182,210 @@ class Slide(models.Model):
         ('gif', 'GIF'),
         ('audio', 'Audio'),
     ]
+    # Media job that derives web renditions for each media type
+    MEDIA_TASKS = {
+        'image': 'image_derivatives',
+        'video': 'transcode_video',
+        'gif': 'convert_gif',
+    }
 
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPES, default='image')
     media_file = models.FileField(upload_to=slide_media_upload_path_not_profile, blank=True) #type: ignore
     caption = models.TextField(blank=True)
     caption_fa = models.TextField(blank=True)
     order = models.PositiveIntegerField()
+    # Resized/re-encoded copies of media_file (see memories/media.py)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Bytes of media_file, so admin totals don't have to stat every file
+    media_size = models.PositiveBigIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['order']
+        # Also the index behind "slides of a slideshow in order"
+        constraints = [
+            models.UniqueConstraint(fields=['slideshow', 'order'], name='unique_slide_order'),
+        ]
 
     def __str__(self):
         return f"Slide {self.order}"
 
+    @property
+    def image_sources(self):
+        return image_sources(self.renditions, self.media_file.storage)
+
+    @property
+    def thumbnail_url(self):
+        if not self.media_file:
+            return None
+        return smallest_image_url(self.renditions, self.media_file.storage) or self.media_file.url
+
+    @property
+    def video_url(self):
+        """Web-optimized MP4 once transcoded, otherwise the original upload."""
+        mp4 = self.renditions.get('videos', {}).get('mp4')
+        return self.media_file.storage.url(mp4) if mp4 else self.media_file.url
+
+    @property
+    def video_sources(self):
+        """``[{'type': mime, 'url': url}]`` for every video rendition, WebM first."""
+        videos = self.renditions.get('videos', {})
+        return [
+            {'type': f'video/{fmt}', 'url': self.media_file.storage.url(videos[fmt])}
+            for fmt in ('webm', 'mp4') if fmt in videos
+        ]
+
+    @property
+    def poster_url(self):
+        poster = self.renditions.get('poster')
+        return self.media_file.storage.url(poster) if poster else None
+
+def media_file_size(media_file):
+    if not media_file:
+        return 0
+    try:
+        return media_file.size
+    except OSError:
+        return 0
+
+def media_is_referenced(name):
+    """Whether a slide or slideshow still uses the file ``name``, directly or as a rendition source."""
+    return (
+        Slide.objects.filter(Q(media_file=name) | Q(renditions__source=name)).exists()
+        or MemorySlideShow.objects.filter(
+            Q(mainImage=name) | Q(music=name) | Q(main_image_renditions__source=name)
+        ).exists()
+    )
+
+def delete_unreferenced_media(storage, name, renditions=None):
+    """
+    Delete the upload ``name`` and the files rendered from ``renditions``'
+    source, each only once no row references it any more. Copies made
+    before duplication linked files under their own slug share names with
+    the original, so a name can outlive the row being deleted.
+    """
+    if name and not media_is_referenced(name):
+        storage.delete(name)
+    source = (renditions or {}).get('source')
+    if source and not media_is_referenced(source):
+        for rendition in rendition_files(renditions):
+            storage.delete(rendition)
+
+@receiver(pre_save, sender=Slide)
+def set_media_size(sender, instance, *args, **kwargs):
+    instance.media_size = media_file_size(instance.media_file)
+
+@receiver([post_save, post_delete], sender=MemorySlideShow)
+def invalidate_slideshow_pages(sender, instance, **kwargs):
+    invalidate_pages(instance.slug)
+
+@receiver(post_delete, sender=Slide)
+def delete_slide_media(sender, instance, **kwargs):
+    # Once committed: a rolled back delete keeps its files, and the
+    # reference check sees the rows that really remain
+    media_file, renditions = instance.media_file, instance.renditions
+    transaction.on_commit(lambda: delete_unreferenced_media(media_file.storage, media_file.name, renditions))
+
+@receiver(post_delete, sender=MemorySlideShow)
+def delete_slideshow_media(sender, instance, **kwargs):
+    main_image, renditions, music = instance.mainImage, instance.main_image_renditions, instance.music
+
+    def delete_files():
+        delete_unreferenced_media(main_image.storage, main_image.name, renditions)
+        delete_unreferenced_media(music.storage, music.name)
+    transaction.on_commit(delete_files)
+
+@receiver([post_save, post_delete], sender=Slide)
+def invalidate_slide_pages(sender, instance, **kwargs):
+    slug = MemorySlideShow.objects.filter(pk=instance.slideshow_id).values_list('slug', flat=True).first()
+    invalidate_pages(slug)
+
+class MediaJob(models.Model):
+    """A unit of post-upload media work, run by `manage.py run_media_worker`."""
+    TASK_CHOICES = [
+        ('image_derivatives', 'Image renditions'),
+        ('transcode_video', 'Video transcode'),
+        ('convert_gif', 'GIF to video'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=50, choices=TASK_CHOICES)
+    slideshow = models.ForeignKey(MemorySlideShow, on_delete=models.CASCADE, related_name='media_jobs')
+    slide = models.ForeignKey(Slide, on_delete=models.CASCADE, null=True, blank=True, related_name='media_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        target = f"slide {self.slide_id}" if self.slide_id else f"slideshow {self.slideshow_id}"
+        return f"{self.get_task_display()} for {target} ({self.status})"
+
+@receiver(post_save, sender=MemorySlideShow)
+def enqueue_main_image_derivatives(sender, instance, **kwargs):
+    if needs_derivatives(instance.mainImage, instance.main_image_renditions):
+        from .jobs import enqueue
+        enqueue('image_derivatives', instance)
+
+@receiver(post_save, sender=Slide)
+def enqueue_slide_derivatives(sender, instance, **kwargs):
+    task = Slide.MEDIA_TASKS.get(instance.media_type)
+    if task and needs_derivatives(instance.media_file, instance.renditions):
+        from .jobs import enqueue
+        enqueue(task, instance.slideshow, slide=instance)
+
+class ChunkedUpload(models.Model):
+    """A resumable upload assembled in place in storage (see memories/uploads.py)."""
+    TARGET_SLIDE = 'slide'
+    TARGET_MUSIC = 'music'
+    TARGET_CHOICES = [
+        (TARGET_SLIDE, 'Slide media'),
+        (TARGET_MUSIC, 'Slideshow music'),
+    ]
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, 'Uploading'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    slideshow = models.ForeignKey(MemorySlideShow, on_delete=models.CASCADE, related_name='uploads')
+    # Slide whose media_file is replaced; a new slide is added when empty
+    slide = models.ForeignKey(Slide, on_delete=models.CASCADE, null=True, blank=True, related_name='uploads')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    media_type = models.CharField(max_length=10, choices=Slide.MEDIA_TYPES, blank=True)
+    # Storage name the finished file gets (reserved when the upload starts)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, help_text='Expected checksum of the whole file (hex)')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.offset}/{self.size} bytes, {self.status})"
@@ -0,0 +1,131 @@
+"""
+Slide order keys.
+
+``Slide.order`` is a sparse sort key, unique per slideshow: new slides are
+numbered ``ORDER_GAP`` apart, so a slide moved between two others gets a
+key in the gap and is the only row written. Applying a new ordering keeps
+the keys of the longest run of slides that are already in increasing
+order and only renumbers the rest, into the gaps around them; the whole
+slideshow is respaced when a gap is too small.
+
+Writes never trip the (slideshow, order) unique constraint halfway: when a
+moved slide takes a key another moved slide still holds, the moved rows
+are first parked above every key in use.
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import F, Max
+
+from .cache import invalidate_pages
+from .models import Slide
+
+ORDER_GAP = 1024
+
+
+def next_order(slideshow):
+    """Key for a slide added after the current last slide."""
+    last = slideshow.slides.aggregate(last=Max('order'))['last'] or 0
+    return last + ORDER_GAP
+
+
+def increasing_run(keys):
+    """Indices of a longest strictly increasing subsequence of ``keys``."""
+    tails, tail_indices, previous = [], [], [None] * len(keys)
+    for index, key in enumerate(keys):
+        position = bisect_left(tails, key)
+        if position == len(tails):
+            tails.append(key)
+            tail_indices.append(index)
+        else:
+            tails[position] = key
+            tail_indices[position] = index
+        previous[index] = tail_indices[position - 1] if position else None
+    run = []
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        run.append(index)
+        index = previous[index]
+    return run[::-1]
+
+
+def order_keys(current):
+    """
+    New keys for slides listed in their new order, whose keys are
+    ``current``: as many as possible stay the same.
+    """
+    keep = set(increasing_run(current))
+    keys = list(current)
+    lower, pending = 0, []
+    for index in range(len(current) + 1):
+        if index < len(current) and index not in keep:
+            pending.append(index)
+            continue
+        upper = current[index] if index < len(current) else lower + ORDER_GAP * (len(pending) + 1)
+        if upper - lower <= len(pending):
+            return [ORDER_GAP * (position + 1) for position in range(len(current))]
+        for position, pending_index in enumerate(pending, start=1):
+            keys[pending_index] = lower + (upper - lower) * position // (len(pending) + 1)
+        pending = []
+        if index < len(current):
+            lower = current[index]
+    return keys
+
+
+def save_order(slide_ids, current):
+    """
+    Store the order ``slide_ids`` (every slide of one slideshow) given the
+    ``current`` ``{pk: key}``; returns the number of slides written.
+    """
+    keys = order_keys([current[pk] for pk in slide_ids])
+    changed = {pk: key for pk, key in zip(slide_ids, keys) if current[pk] != key}
+    if not changed:
+        return 0
+    if set(changed.values()) & {current[pk] for pk in changed}:
+        shift = max(max(current.values()), max(changed.values())) + 1
+        Slide.objects.filter(pk__in=changed).update(order=F('order') + shift)
+    Slide.objects.bulk_update([Slide(pk=pk, order=key) for pk, key in changed.items()], ['order'], batch_size=500)
+    return len(changed)
+
+
+def current_order(slideshow_id):
+    """``[(pk, key)]`` of a slideshow's slides in order, locked until the transaction ends."""
+    slides = Slide.objects.select_for_update().filter(slideshow_id=slideshow_id)
+    return list(slides.order_by('order', 'pk').values_list('pk', 'order'))
+
+
+def reorder_slides(slideshow, slide_ids):
+    """
+    Put the slides of ``slideshow`` in the order of ``slide_ids``, which
+    must list each of them once. Returns the number of slides written.
+    """
+    with transaction.atomic():
+        current = dict(current_order(slideshow.pk))
+        if len(slide_ids) != len(current) or set(slide_ids) != set(current):
+            raise ValueError('The new order must list every slide of the slideshow once')
+        updated = save_order(slide_ids, current)
+    if updated:
+        invalidate_pages(slideshow.slug)
+    return updated
+
+
+def move_slides(slides, step):
+    """Move ``slides`` (a queryset) one place up (``step`` -1) or down (1) in their slideshows."""
+    selected = {}
+    for pk, slideshow_id, slug in slides.values_list('pk', 'slideshow_id', 'slideshow__slug'):
+        selected.setdefault((slideshow_id, slug), set()).add(pk)
+    moved = 0
+    for (slideshow_id, slug), pks in selected.items():
+        with transaction.atomic():
+            current = current_order(slideshow_id)
+            slide_ids = [pk for pk, _ in current]
+            positions = range(len(slide_ids)) if step < 0 else reversed(range(len(slide_ids)))
+            for position in positions:
+                neighbour = position + step
+                if slide_ids[position] in pks and 0 <= neighbour < len(slide_ids) and slide_ids[neighbour] not in pks:
+                    slide_ids[position], slide_ids[neighbour] = slide_ids[neighbour], slide_ids[position]
+            updated = save_order(slide_ids, dict(current))
+        if updated:
+            invalidate_pages(slug)
+            moved += updated
+    return moved
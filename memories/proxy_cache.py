@@ -0,0 +1,117 @@
+"""
+Integration with the nginx ``proxy_cache`` in front of the memorial pages.
+
+Django marks public pages cacheable (``X-Accel-Expires``) and, when a
+slideshow changes, deletes nginx's cache files for it directly: nginx
+stores each entry under ``md5(cache key)``, so the files can be located
+without a purge module. Keys must match ``proxy_cache_key`` in
+nginx_mymemory.conf: ``$uri|$memorial_lang|$arg_page``.
+
+nginx answers cache hits without waking Django, so it logs their URIs to
+NGINX_VISIT_LOG and ``manage.py import_cached_visits`` adds them to
+``visit_count``.
+"""
+import hashlib
+import math
+import os
+import re
+
+from django.conf import settings
+from django.urls import reverse
+
+from .manifest import manifest_page_size
+
+PAGE_URL_NAMES = (
+    'memoir-profile', 'memoir-profile-en', 'memoir-profile-fa',
+    'play-slide', 'play-slide-en', 'play-slide-fa',
+)
+CACHE_KEY_LANGUAGES = ('en', 'fa')
+
+# URIs of cached pages that count as visits (not the slides.json manifest)
+VISIT_URI_RE = re.compile(r'^/slideshows/(?P<slug>[-\w]+)/(?:show/)?(?:(?:en|fa)/)?$')
+
+
+def proxy_cache_keys(slug, slide_count=0):
+    """Every nginx cache key a page or manifest of ``slug`` can be stored under."""
+    uris = [(reverse(name, args=[slug]), ['']) for name in PAGE_URL_NAMES]
+    # One page past the current last one, in case a slide was just removed
+    pages = math.ceil(slide_count / manifest_page_size()) + 1
+    uris.append((reverse('slides-manifest', args=[slug]), [''] + [str(page) for page in range(1, pages + 1)]))
+    return [
+        f'{uri}|{lang}|{page}'
+        for uri, page_args in uris
+        for lang in CACHE_KEY_LANGUAGES
+        for page in page_args
+    ]
+
+
+def proxy_cache_file(key, cache_path, levels):
+    """Path of nginx's cache file for ``key`` under ``levels`` such as '1:2'."""
+    digest = hashlib.md5(key.encode()).hexdigest()
+    parts = []
+    end = len(digest)
+    for level in levels.split(':'):
+        width = int(level)
+        parts.append(digest[end - width:end])
+        end -= width
+    return os.path.join(cache_path, *parts, digest)
+
+
+def purge_proxy_cache(slug):
+    """Delete nginx's cached copies of every page of ``slug``; returns the count."""
+    cache_path = getattr(settings, 'NGINX_CACHE_PATH', '')
+    if not cache_path or not slug:
+        return 0
+    from .models import Slide
+
+    slide_count = Slide.objects.filter(slideshow__slug=slug).count()
+    levels = getattr(settings, 'NGINX_CACHE_LEVELS', '1:2')
+    removed = 0
+    for key in proxy_cache_keys(slug, slide_count):
+        try:
+            os.remove(proxy_cache_file(key, cache_path, levels))
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def visit_log_offset_path(path):
+    return f'{path}.offset'
+
+
+def read_visit_log(path):
+    """
+    ``({slug: visits}, offset)`` for the lines appended to nginx's visit log
+    since the last saved offset (see save_visit_log_offset). Starts over
+    when the log has been rotated.
+    """
+    try:
+        with open(visit_log_offset_path(path)) as fh:
+            offset = int(fh.read() or 0)
+    except (FileNotFoundError, ValueError):
+        offset = 0
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return {}, 0
+    if size < offset:
+        offset = 0
+
+    counts = {}
+    with open(path, 'rb') as fh:
+        fh.seek(offset)
+        for line in fh:
+            if not line.endswith(b'\n'):
+                # Partially written line; pick it up next time
+                break
+            offset += len(line)
+            match = VISIT_URI_RE.match(line.decode('utf-8', 'replace').strip())
+            if match:
+                counts[match['slug']] = counts.get(match['slug'], 0) + 1
+    return counts, offset
+
+
+def save_visit_log_offset(path, offset):
+    with open(visit_log_offset_path(path), 'w') as fh:
+        fh.write(str(offset))
@@ -0,0 +1,70 @@
+"""
+Helpers for serving uploaded media through Django.
+
+Used by ``memories.views.serveMedia`` when nginx does not serve /media/
+itself, or when it hands the byte streaming back to nginx via
+X-Accel-Redirect after Django has authorized the request.
+"""
+import re
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a single-range ``Range`` header into an inclusive ``(start, end)``.
+
+    Returns None when the header should be ignored (absent, malformed, an
+    invalid range such as ``bytes=5-3`` or a multi-range request) so the
+    whole file is served, and raises RangeNotSatisfiable when a valid range
+    lies outside the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def file_range_iterator(path, start, length, chunk_size=CHUNK_SIZE):
+    """Yield ``length`` bytes of ``path`` starting at ``start``."""
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def media_slug(path):
+    """Slideshow slug owning a media path (``slideshows/<slug>/...``), or None."""
+    parts = path.split('/')
+    if len(parts) >= 3 and parts[0] == 'slideshows':
+        return parts[1]
+    return None
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
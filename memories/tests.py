@@ -1,3 +1,1708 @@
-from django.test import TestCase
+import base64
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from PIL import Image
+
+from accounts.models import User
+from . import async_views
+from .jobs import claim_job, enqueue, requeue_stale_jobs, run_job
+from .media import MediaProcessingError, transcode_video
+from .access import make_share_token, share_cookie_name, share_url
+from .bulk_import import import_slides, sniff_media_type, zip_entries
+from .duplication import duplicate_slideshows
+from .ordering import ORDER_GAP, order_keys
+from .proxy_cache import proxy_cache_file, purge_proxy_cache
+from .models import ChunkedUpload, MediaJob, MemorySlideShow, Slide, unique_slug
+from . import visits
+from .visits import VisitBuffer, visit_buffer
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_image(name='photo.jpg', size=(2000, 1500), fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (180, 120, 60)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class MediaRootMixin:
+    """Point MEDIA_ROOT at a throwaway directory for the test."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+
+def create_slideshow(title='Jane Doe', **kwargs):
+    owner = kwargs.pop('owner', None) or User.objects.create_user(username=f'owner-{title}')
+    return MemorySlideShow.objects.create(owner=owner, title=title, **kwargs)
+
+
+@override_settings(CACHES=TEST_CACHES, VISIT_BUFFERING=True)
+class VisitBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spool_dir.cleanup)
+        self.slideshow = create_slideshow()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+
+    def make_buffer(self, threshold=1000, interval=3600):
+        return VisitBuffer(threshold=threshold, interval=interval, spool_dir=self.spool_dir.name)
+
+    def visit_count(self):
+        self.slideshow.refresh_from_db()
+        return self.slideshow.visit_count
+
+    def test_visits_are_buffered_until_flush(self):
+        buffer = self.make_buffer()
+        for _ in range(3):
+            buffer.record(self.slideshow.slug)
+        self.assertEqual(self.visit_count(), 0)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(self.visit_count(), 3)
+        self.assertEqual(buffer.pending, 0)
+
+    def test_threshold_triggers_flush(self):
+        buffer = self.make_buffer(threshold=2)
+        buffer.record(self.slideshow.slug)
+        self.assertEqual(self.visit_count(), 0)
+        buffer.record(self.slideshow.slug)
+        self.assertEqual(self.visit_count(), 2)
+
+    def test_flush_is_a_single_update(self):
+        other = create_slideshow('John Roe')
+        buffer = self.make_buffer()
+        buffer.record(self.slideshow.slug)
+        buffer.record(other.slug, count=4)
+        with self.assertNumQueries(1):
+            buffer.flush()
+        other.refresh_from_db()
+        self.assertEqual(self.visit_count(), 1)
+        self.assertEqual(other.visit_count, 4)
+
+    def test_shutdown_flushes_pending_visits(self):
+        buffer = self.make_buffer()
+        for _ in range(5):
+            buffer.record(self.slideshow.slug)
+        buffer.shutdown()
+        self.assertEqual(self.visit_count(), 5)
+
+    def test_shutdown_spools_when_database_is_unavailable(self):
+        buffer = self.make_buffer()
+        for _ in range(7):
+            buffer.record(self.slideshow.slug)
+        with mock.patch('memories.visits.write_visits', side_effect=RuntimeError('database is locked')), \
+                self.assertLogs('memories.visits', 'ERROR'):
+            buffer.shutdown()
+        self.assertEqual(buffer.pending, 0)
+        self.assertEqual(self.visit_count(), 0)
+
+        # A fresh process picks the spooled counts up on its next flush.
+        self.assertEqual(self.make_buffer().flush(), 7)
+        self.assertEqual(self.visit_count(), 7)
+
+    def test_failed_flush_keeps_visits_pending(self):
+        buffer = self.make_buffer()
+        buffer.record(self.slideshow.slug)
+        with mock.patch('memories.visits.write_visits', side_effect=RuntimeError), \
+                self.assertLogs('memories.visits', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending, 1)
+
+    def test_spool_file_is_applied_by_one_worker(self):
+        self.make_buffer().spool({self.slideshow.slug: 3})
+        first, second = self.make_buffer(), self.make_buffer()
+        write_visits = visits.write_visits
+
+        def write_while_other_worker_flushes(pending):
+            self.assertEqual(second.flush(), 0)
+            return write_visits(pending)
+
+        with mock.patch('memories.visits.write_visits', side_effect=write_while_other_worker_flushes):
+            self.assertEqual(first.flush(), 3)
+        self.assertEqual(self.visit_count(), 3)
+        self.assertEqual(os.listdir(self.spool_dir.name), [])
+
+    def test_failed_flush_releases_spool_without_duplicating(self):
+        buffer = self.make_buffer()
+        buffer.spool({self.slideshow.slug: 3})
+        buffer.record(self.slideshow.slug)
+        with mock.patch('memories.visits.write_visits', side_effect=RuntimeError), \
+                self.assertLogs('memories.visits', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending, 1)
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(self.visit_count(), 4)
+
+    def test_flush_visits_command_applies_spool(self):
+        with override_settings(VISIT_SPOOL_DIR=self.spool_dir.name):
+            visit_buffer.spool({self.slideshow.slug: 3})
+            visit_buffer.record(self.slideshow.slug)
+            out = StringIO()
+            call_command('flush_visits', stdout=out)
+        self.assertIn('Flushed 4 visit(s)', out.getvalue())
+        self.assertEqual(self.visit_count(), 4)
+
+    def test_test_runs_never_spool(self):
+        # VISIT_SPOOL_DIR is cleared by core.test_runner.TestRunner
+        visit_buffer.record(self.slideshow.slug)
+        self.assertIsNone(visit_buffer.get_spool_dir())
+        self.assertFalse(visit_buffer.spool(visit_buffer.drain()))
+
+    @override_settings(VISIT_FLUSH_THRESHOLD=1000, VISIT_FLUSH_INTERVAL=3600)
+    def test_views_do_not_write_visit_count_per_request(self):
+        url = reverse('memoir-profile', args=[self.slideshow.slug])
+        self.client.get(url)
+        self.client.get(reverse('play-slide', args=[self.slideshow.slug]))
+        self.assertEqual(self.visit_count(), 0)
+        self.assertEqual(visit_buffer.pending, 2)
+        visit_buffer.flush()
+        self.assertEqual(self.visit_count(), 2)
+
+
+@override_settings(
+    CACHES=TEST_CACHES, VISIT_BUFFERING=True, VISIT_FLUSH_THRESHOLD=1000, VISIT_FLUSH_INTERVAL=3600,
+)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+        self.slideshow = create_slideshow(
+            title_fa='جین دو',
+            date_of_birth=datetime.date(1950, 3, 21),
+            date_of_death=datetime.date(2020, 3, 20),
+        )
+        self.slide = Slide.objects.create(slideshow=self.slideshow, caption='First light', order=1)
+        self.profile_url = reverse('memoir-profile', args=[self.slideshow.slug])
+        self.slide_url = reverse('play-slide', args=[self.slideshow.slug])
+
+    def assertServedFromCache(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'memories_' in q['sql']], queries.captured_queries)
+        self.assertTemplateNotUsed(response, 'core/profileEn.html')
+        self.assertTemplateNotUsed(response, 'core/slideEn.html')
+        return response
+
+    def test_repeat_views_skip_orm_and_templates(self):
+        first = self.client.get(self.slide_url)
+        self.assertTemplateUsed(first, 'core/slideEn.html')
+        second = self.assertServedFromCache(self.slide_url)
+        self.assertEqual(first.content, second.content)
+
+        self.client.get(self.profile_url)
+        self.assertServedFromCache(self.profile_url)
+
+    def test_cache_is_keyed_by_language(self):
+        english = self.client.get(self.profile_url, {'lang': 'en'})
+        farsi = self.client.get(self.profile_url, {'lang': 'fa'})
+        self.assertTemplateUsed(farsi, 'core/profileFa.html')
+        self.assertNotEqual(english.content, farsi.content)
+        cached = self.assertServedFromCache(self.profile_url, lang='fa')
+        self.assertEqual(cached.content, farsi.content)
+
+    def test_cached_hits_still_count_visits(self):
+        self.client.get(self.slide_url)
+        self.client.get(self.slide_url)
+        self.assertEqual(visit_buffer.pending, 2)
+
+    def test_slideshow_save_invalidates(self):
+        self.client.get(self.profile_url)
+        self.slideshow.title = 'Jane Q. Doe'
+        self.slideshow.save()
+        self.assertContains(self.client.get(self.profile_url), 'Jane Q. Doe')
+
+    def test_slide_save_and_delete_invalidate(self):
+        self.client.get(self.slide_url)
+        self.slide.caption = 'Last light'
+        self.slide.save()
+        self.assertContains(self.client.get(self.slide_url), 'Last light')
+
+        self.slide.delete()
+        self.assertNotContains(self.client.get(self.slide_url), 'Last light')
+
+    def test_admin_media_type_action_invalidates(self):
+        Slide.objects.filter(pk=self.slide.pk).update(media_type='audio', media_file='slideshows/jane/a.jpg')
+        cache.clear()
+        self.assertNotContains(self.client.get(self.slide_url), '<picture>')
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.post(reverse('admin:memories_slide_changelist') + '?media_type__exact=audio', {
+            'action': 'change_media_type_to_image', '_selected_action': [self.slide.pk],
+        })
+        self.assertContains(self.client.get(self.slide_url), '<picture>')
+
+    def test_missing_slideshow_is_not_cached(self):
+        url = reverse('memoir-profile', args=['nobody'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        create_slideshow('Nobody')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class JalaliDateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_jalali_dates_are_computed_on_save(self):
+        slideshow = create_slideshow(date_of_birth=datetime.date(1950, 3, 21), date_of_death=datetime.date(2020, 3, 20))
+        self.assertEqual(slideshow.date_of_birth_fa, '1329/01/01')
+        self.assertEqual(slideshow.date_of_death_fa, '1399/01/01')
+        self.assertEqual(slideshow.born_year_fa, '1329')
+        self.assertEqual(slideshow.death_year_fa, '1399')
+
+        slideshow.date_of_death = None
+        slideshow.save()
+        self.assertEqual(slideshow.date_of_death_fa, '')
+        self.assertEqual(slideshow.death_year_fa, '')
+
+    def test_farsi_profile_renders_precomputed_dates(self):
+        slideshow = create_slideshow(date_of_birth=datetime.date(1950, 3, 21), date_of_death=datetime.date(2020, 3, 20))
+        with mock.patch('memories.models.JalaliDate', side_effect=AssertionError('converted per request')):
+            response = self.client.get(reverse('memoir-profile', args=[slideshow.slug]), {'lang': 'fa'})
+        self.assertContains(response, '1399 - 1329')
+        self.assertContains(response, '1329/01/01')
+
+    def test_farsi_profile_without_dates(self):
+        slideshow = create_slideshow()
+        response = self.client.get(reverse('memoir-profile', args=[slideshow.slug]), {'lang': 'fa'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'birth-death')
+
+
+@override_settings(
+    CACHES=TEST_CACHES, MEDIA_JOBS_EAGER=True,
+    IMAGE_DERIVATIVE_WIDTHS=(320, 640), IMAGE_DERIVATIVE_FORMATS=('webp',),
+)
+class ImageDerivativeTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+
+    def test_slide_upload_creates_renditions_next_to_original(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        slide.refresh_from_db()
+        folder = f'slideshows/{self.slideshow.slug}'
+        self.assertEqual(slide.renditions['source'], f'{folder}/photo.jpg')
+        self.assertEqual(slide.renditions['images']['webp'], [
+            [320, f'{folder}/photo-320w.webp'],
+            [640, f'{folder}/photo-640w.webp'],
+        ])
+        with Image.open(os.path.join(self.media_root, folder, 'photo-640w.webp')) as rendition:
+            self.assertEqual(rendition.size, (640, 480))
+        self.assertEqual(slide.thumbnail_url, f'/media/{folder}/photo-320w.webp')
+
+    def test_small_images_are_not_upscaled(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(size=(200, 100)), order=1)
+        slide.refresh_from_db()
+        self.assertEqual([w for w, _ in slide.renditions['images']['webp']], [200])
+
+    def test_renditions_are_only_generated_once(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        slide.refresh_from_db()
+        with mock.patch('memories.jobs.generate_image_derivatives') as generate:
+            slide.caption = 'Edited'
+            slide.save()
+        generate.assert_not_called()
+
+    def test_replaced_and_deleted_images_leave_no_renditions(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        folder = os.path.join(self.media_root, 'slideshows', self.slideshow.slug)
+        slide.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            slide.media_file = make_image('other.jpg')
+            slide.save()
+        self.assertEqual(sorted(name for name in os.listdir(folder) if name.endswith('.webp')), [
+            'other-320w.webp', 'other-640w.webp',
+        ])
+
+        slide.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            slide.delete()
+        self.assertEqual(os.listdir(folder), ['photo.jpg'])
+
+    def test_non_image_slides_are_skipped(self):
+        slide = Slide.objects.create(
+            slideshow=self.slideshow, media_type='audio',
+            media_file=SimpleUploadedFile('song.mp3', b'ID3'), order=1,
+        )
+        self.assertEqual(slide.renditions, {})
+
+    def test_templates_expose_srcset(self):
+        Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        self.slideshow.mainImage = make_image('portrait.jpg')
+        self.slideshow.save()
+        folder = f'/media/slideshows/{self.slideshow.slug}'
+
+        response = self.client.get(reverse('play-slide', args=[self.slideshow.slug]))
+        self.assertContains(response, f'data-srcset="{folder}/photo-320w.webp 320w, {folder}/photo-640w.webp 640w"')
+        self.assertContains(response, 'type="image/webp"')
+
+        response = self.client.get(reverse('memoir-profile', args=[self.slideshow.slug]))
+        self.assertContains(response, f'srcset="{folder}/portrait-320w.webp 320w')
+
+    def test_generate_derivatives_command_backfills(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        Slide.objects.filter(pk=slide.pk).update(renditions={})
+        out = StringIO()
+        call_command('generate_derivatives', stdout=out)
+        slide.refresh_from_db()
+        self.assertIn('Generated renditions for 1 image(s)', out.getvalue())
+        self.assertIn('webp', slide.renditions['images'])
+
+
+@override_settings(
+    CACHES=TEST_CACHES, MEDIA_JOBS_EAGER=False,
+    IMAGE_DERIVATIVE_WIDTHS=(320,), IMAGE_DERIVATIVE_FORMATS=('webp',),
+)
+class MediaJobTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+
+    def run_worker(self, *args):
+        out = StringIO()
+        call_command('run_media_worker', '--once', '--concurrency', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_upload_is_queued_not_processed_inline(self):
+        with mock.patch('memories.jobs.generate_image_derivatives') as generate:
+            slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        generate.assert_not_called()
+        job = MediaJob.objects.get()
+        self.assertEqual((job.task, job.slide, job.status), ('image_derivatives', slide, MediaJob.STATUS_PENDING))
+
+        self.assertIn('Processed 1 job(s), 0 failed', self.run_worker())
+        job.refresh_from_db()
+        slide.refresh_from_db()
+        self.assertEqual(job.status, MediaJob.STATUS_DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('webp', slide.renditions['images'])
+
+    def test_profile_image_is_queued(self):
+        self.slideshow.mainImage = make_image('portrait.jpg')
+        self.slideshow.save()
+        self.run_worker()
+        self.slideshow.refresh_from_db()
+        self.assertEqual(self.slideshow.main_image_renditions['source'], self.slideshow.mainImage.name)
+
+    def test_pending_jobs_are_not_duplicated(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        enqueue('image_derivatives', self.slideshow, slide=slide)
+        self.assertEqual(MediaJob.objects.count(), 1)
+
+    def test_failures_are_retried_with_backoff_then_marked_failed(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        job = MediaJob.objects.get()
+        with mock.patch('memories.jobs.generate_image_derivatives', side_effect=OSError('disk full')), \
+                self.assertLogs('memories.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim_job()))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (MediaJob.STATUS_PENDING, 1))
+            self.assertIn('disk full', job.last_error)
+            self.assertIsNone(claim_job(), 'retry should wait for its backoff')
+
+            for _ in range(job.max_attempts - 1):
+                MediaJob.objects.filter(pk=job.pk).update(run_after=job.created_at)
+                run_job(claim_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (MediaJob.STATUS_FAILED, 3))
+        slide.refresh_from_db()
+        self.assertEqual(slide.renditions, {})
+
+    def test_jobs_abandoned_by_a_dead_worker_are_requeued(self):
+        Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        job = claim_job()
+        MediaJob.objects.filter(pk=job.pk).update(started_at=job.created_at - datetime.timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, MediaJob.STATUS_PENDING)
+
+    def test_job_status_is_visible_in_admin(self):
+        Slide.objects.create(slideshow=self.slideshow, media_file=make_image(), order=1)
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:memories_mediajob_changelist'))
+        self.assertContains(response, 'Pending')
+
+
+def make_gif(name='wave.gif', size=(101, 75), frames=4):
+    images = [Image.new('RGB', size, (40 * i, 200, 90)) for i in range(frames)]
+    buffer = BytesIO()
+    images[0].save(buffer, 'GIF', save_all=True, append_images=images[1:], duration=100, loop=0)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/gif')
+
+
+def make_clip(path, size='320x240', duration=1, rate=10, codec='mpeg4'):
+    """Render a tiny synthetic test clip with ffmpeg."""
+    subprocess.run([
+        settings.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc=size={size}:rate={rate}:duration={duration}',
+        '-c:v', codec, path,
+    ], check=True)
+    with open(path, 'rb') as fh:
+        return SimpleUploadedFile(os.path.basename(path), fh.read(), content_type='video/quicktime')
+
+
+HAS_FFMPEG = bool(shutil.which(settings.FFMPEG_BINARY))
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES=TEST_CACHES, MEDIA_JOBS_EAGER=True, VIDEO_MAX_DIMENSION=160)
+class VideoTranscodeTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+
+    def create_video_slide(self, **clip_options):
+        clip = make_clip(os.path.join(self.workdir, 'clip.mov'), **clip_options)
+        slide = Slide.objects.create(slideshow=self.slideshow, media_type='video', media_file=clip, order=1)
+        slide.refresh_from_db()
+        return slide
+
+    def test_video_slide_gets_web_mp4_and_poster(self):
+        slide = self.create_video_slide()
+        folder = f'slideshows/{self.slideshow.slug}'
+        self.assertEqual(slide.renditions['videos'], {'mp4': f'{folder}/clip-web.mp4'})
+        self.assertEqual(slide.renditions['poster'], f'{folder}/clip-poster.jpg')
+        self.assertEqual(slide.video_url, f'/media/{folder}/clip-web.mp4')
+        self.assertEqual(slide.poster_url, f'/media/{folder}/clip-poster.jpg')
+
+        with Image.open(os.path.join(self.media_root, folder, 'clip-poster.jpg')) as poster:
+            self.assertEqual(poster.size, (160, 120))
+
+        with open(os.path.join(self.media_root, folder, 'clip-web.mp4'), 'rb') as fh:
+            head = fh.read()
+        # faststart moves the index in front of the media data
+        self.assertLess(head.index(b'moov'), head.index(b'mdat'))
+
+    def test_portrait_video_is_capped_on_its_long_side(self):
+        slide = self.create_video_slide(size='240x320')
+        with Image.open(os.path.join(self.media_root, slide.renditions['poster'])) as poster:
+            self.assertEqual(poster.size, (120, 160))
+
+    def test_slideshow_references_renditions(self):
+        slide = self.create_video_slide()
+        response = self.client.get(reverse('play-slide', args=[self.slideshow.slug]))
+        self.assertContains(response, f'data-src="{slide.video_url}"')
+        self.assertContains(response, f'data-poster="{slide.poster_url}"')
+        self.assertNotContains(response, slide.media_file.url)
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_JOBS_EAGER=False)
+class VideoTranscodeFailureTests(MediaRootMixin, TestCase):
+    def test_untranscoded_video_falls_back_to_original(self):
+        slideshow = create_slideshow()
+        slide = Slide.objects.create(
+            slideshow=slideshow, media_type='video',
+            media_file=SimpleUploadedFile('clip.mov', b'not really a video'), order=1,
+        )
+        self.assertEqual(slide.video_url, slide.media_file.url)
+        self.assertIsNone(slide.poster_url)
+        self.assertEqual(MediaJob.objects.get().task, 'transcode_video')
+
+    def test_ffmpeg_errors_are_recorded_for_retry(self):
+        slideshow = create_slideshow()
+        Slide.objects.create(
+            slideshow=slideshow, media_type='video',
+            media_file=SimpleUploadedFile('clip.mov', b'not really a video'), order=1,
+        )
+        error = subprocess.CalledProcessError(1, 'ffmpeg', stderr=b'clip.mov: Invalid data found')
+        with mock.patch('memories.media.subprocess.run', side_effect=error), \
+                self.assertLogs('memories.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim_job()))
+        job = MediaJob.objects.get()
+        self.assertEqual(job.status, MediaJob.STATUS_PENDING)
+        self.assertIn('Invalid data found', job.last_error)
+
+    def test_missing_ffmpeg_is_a_processing_error(self):
+        with override_settings(FFMPEG_BINARY='/nonexistent/ffmpeg'):
+            slideshow = create_slideshow()
+            slide = Slide(slideshow=slideshow, media_file=SimpleUploadedFile('clip.mov', b'x'), order=1)
+            slide.media_file.save('clip.mov', slide.media_file.file, save=False)
+            with self.assertRaisesMessage(MediaProcessingError, 'ffmpeg not found'):
+                transcode_video(slide.media_file)
+
+
+@skipUnless(HAS_FFMPEG, 'ffmpeg is not installed')
+@override_settings(CACHES=TEST_CACHES, MEDIA_JOBS_EAGER=True)
+class GifConversionTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+
+    def test_gif_slide_gets_looping_video_renditions(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_type='gif', media_file=make_gif(), order=1)
+        slide.refresh_from_db()
+        folder = f'slideshows/{self.slideshow.slug}'
+        self.assertEqual(slide.renditions['videos'], {
+            'webm': f'{folder}/wave-loop.webm',
+            'mp4': f'{folder}/wave-loop.mp4',
+        })
+        self.assertEqual([source['type'] for source in slide.video_sources], ['video/webm', 'video/mp4'])
+        for name in slide.renditions['videos'].values():
+            self.assertGreater(os.path.getsize(os.path.join(self.media_root, name)), 0)
+
+        with Image.open(os.path.join(self.media_root, slide.renditions['poster'])) as still:
+            self.assertEqual(still.format, 'JPEG')
+            self.assertEqual(still.size, (101, 75))
+            self.assertGreater(still.getpixel((50, 37))[1], 150)  # first frame is green
+
+    def test_slideshow_serves_video_with_gif_fallback(self):
+        slide = Slide.objects.create(slideshow=self.slideshow, media_type='gif', media_file=make_gif(), order=1)
+        slide.refresh_from_db()
+        response = self.client.get(reverse('play-slide', args=[self.slideshow.slug]))
+        self.assertContains(response, f'<source data-src="{slide.video_sources[0]["url"]}" type="video/webm">')
+        self.assertContains(response, f'data-fallback="{slide.media_file.url}"')
+        self.assertNotContains(response, f'<img data-src="{slide.media_file.url}"')
+
+
+@override_settings(CACHES=TEST_CACHES, MEDIA_JOBS_EAGER=False)
+class GifFallbackTests(MediaRootMixin, TestCase):
+    def test_unconverted_gif_is_served_as_image(self):
+        slideshow = create_slideshow()
+        slide = Slide.objects.create(slideshow=slideshow, media_type='gif', media_file=make_gif(), order=1)
+        self.assertEqual(MediaJob.objects.get().task, 'convert_gif')
+        response = self.client.get(reverse('play-slide', args=[slideshow.slug]))
+        self.assertContains(response, f'<img data-src="{slide.media_file.url}"')
+        self.assertNotContains(response, 'data-fallback')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MediaServingTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user('owner', password='password')
+        self.slideshow = create_slideshow(owner=self.owner)
+        self.data = bytes(range(256)) * 40
+        self.name = default_storage.save(f'slideshows/{self.slideshow.slug}/clip.mp4', ContentFile(self.data))
+        self.url = f'/media/{self.name}'
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, headers=headers)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_response_has_validators_and_cache_headers(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=604800')
+
+    def test_byte_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=100-': (100, len(self.data) - 1),
+            'bytes=-50': (len(self.data) - 50, len(self.data) - 1),
+            'bytes=10-999999': (10, len(self.data) - 1),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(self.body(response), self.data[start:end + 1])
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{len(self.data)}')
+
+    def test_unsatisfiable_range(self):
+        response = self.get(Range=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_invalid_range_is_ignored(self):
+        # last < first is invalid, not unsatisfiable (RFC 9110 section 14.2)
+        response = self.get(Range='bytes=5-3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_multi_range_and_malformed_headers_get_the_whole_file(self):
+        for header in ('bytes=0-1,5-6', 'lines=1-2', 'bytes=-'):
+            with self.subTest(header):
+                self.assertEqual(self.get(Range=header).status_code, 200)
+
+    def test_conditional_get(self):
+        first = self.get()
+        not_modified = self.get(If_None_Match=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+        self.assertEqual(not_modified['Cache-Control'], first['Cache-Control'])
+        self.assertEqual(self.get(If_Modified_Since=first['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(If_None_Match='"stale"').status_code, 200)
+
+    def test_if_range_only_honours_current_validator(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=etag).status_code, 206)
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range='"stale"').status_code, 200)
+        self.assertEqual(self.get(Range='bytes=0-9', If_Range=http_date(0)).status_code, 200)
+
+    def test_missing_files_and_traversal_are_404(self):
+        self.assertEqual(self.get('/media/slideshows/nope/clip.mp4').status_code, 404)
+        self.assertEqual(self.get('/media/../settings.py').status_code, 404)
+
+    def test_private_slideshow_media_requires_owner_or_staff(self):
+        MemorySlideShow.objects.filter(pk=self.slideshow.pk).update(is_public=False)
+        self.assertEqual(self.get().status_code, 404)
+
+        self.client.force_login(self.owner)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=3600')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_hands_streaming_to_nginx(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+        self.slideshow.is_public = False
+        self.slideshow.save()
+        self.assertNotIn('X-Accel-Redirect', self.get())
+
+
+@override_settings(CACHES=TEST_CACHES, VISIT_BUFFERING=True)
+class PrivateSlideshowTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+        self.owner = User.objects.create_user('owner', password='password')
+        self.slideshow = create_slideshow(owner=self.owner, is_public=False)
+        self.profile_url = reverse('memoir-profile', args=[self.slideshow.slug])
+        self.slide_url = reverse('play-slide', args=[self.slideshow.slug])
+        name = default_storage.save(f'slideshows/{self.slideshow.slug}/photo.jpg', ContentFile(b'jpeg'))
+        self.media_url = f'/media/{name}'
+
+    def test_anonymous_visitors_get_404(self):
+        for url in (self.profile_url, self.slide_url, self.media_url):
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_owner_and_staff_can_view(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(self.profile_url).status_code, 200)
+        # Served from the page cache, still authorized
+        self.assertEqual(self.client.get(self.profile_url).status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.profile_url).status_code, 404)
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.slide_url).status_code, 200)
+
+    def test_other_users_get_404(self):
+        self.client.force_login(User.objects.create_user('stranger'))
+        self.assertEqual(self.client.get(self.profile_url).status_code, 404)
+
+    def test_share_token_grants_access_and_is_remembered(self):
+        response = self.client.get(share_url(self.slideshow))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(share_cookie_name(self.slideshow.slug), response.cookies)
+
+        # The cookie carries the grant to the slideshow page and its media
+        self.assertEqual(self.client.get(self.slide_url).status_code, 200)
+        response = self.client.get(self.media_url)
+        self.addCleanup(response.close)
+        self.assertEqual(response.status_code, 200)
+
+    def test_expired_tampered_and_foreign_tokens_are_rejected(self):
+        other = create_slideshow('John Doe', is_public=False)
+        tokens = {
+            'expired': make_share_token(self.slideshow.slug, max_age=-1),
+            'tampered': make_share_token(self.slideshow.slug)[:-2] + 'xx',
+            'foreign': make_share_token(other.slug),
+        }
+        for label, token in tokens.items():
+            with self.subTest(label):
+                response = self.client.get(self.profile_url, {'token': token})
+                self.assertEqual(response.status_code, 404)
+
+    def test_public_cache_hits_skip_session_and_queries(self):
+        self.slideshow.is_public = True
+        self.slideshow.save()
+        self.client.get(self.profile_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'memories_' in q['sql'] or 'auth' in q['sql']], queries.captured_queries)
+
+    def test_visibility_changes_take_effect_immediately(self):
+        self.client.force_login(self.owner)
+        self.client.get(self.profile_url)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.media_url).status_code, 404)
+
+        self.slideshow.is_public = True
+        self.slideshow.save()
+        self.assertEqual(self.client.get(self.profile_url).status_code, 200)
+        response = self.client.get(self.media_url)
+        self.addCleanup(response.close)
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_visibility_actions_invalidate_filtered_selection(self):
+        self.slideshow.is_public = True
+        self.slideshow.save()
+        self.assertEqual(self.client.get(self.slide_url).status_code, 200)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        changelist = reverse('admin:memories_memoryslideshow_changelist')
+        response = self.client.post(f'{changelist}?is_public__exact=1', {
+            'action': 'make_private', '_selected_action': [self.slideshow.pk],
+        }, follow=True)
+        self.assertContains(response, '1 slideshow(s) marked as private.')
+        self.client.logout()
+        self.assertEqual(self.client.get(self.slide_url).status_code, 404)
+
+        self.client.force_login(User.objects.get(username='admin'))
+        self.client.post(f'{changelist}?is_public__exact=0', {
+            'action': 'make_public', '_selected_action': [self.slideshow.pk],
+        })
+        self.client.logout()
+        self.assertEqual(self.client.get(self.slide_url).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES, VISIT_BUFFERING=True)
+class SlidePageQueryTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+        self.slideshow = create_slideshow(title_fa='جین دو', music=ContentFile(b'mp3', name='song.mp3'))
+        for order, media_type in enumerate(['image', 'video', 'gif', 'image', 'audio'], start=1):
+            Slide.objects.create(
+                slideshow=self.slideshow, media_type=media_type, order=order,
+                caption=f'Caption {order}', caption_fa=f'عنوان {order}',
+                media_file=ContentFile(b'data', name=f'slide-{order}.bin'),
+            )
+        self.url = reverse('play-slide', args=[self.slideshow.slug])
+
+    def test_query_budget_is_independent_of_slide_count(self):
+        for lang in ('en', 'fa'):
+            with self.subTest(lang):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(self.url, {'lang': lang})
+                self.assertEqual(response.status_code, 200)
+                page_queries = [q['sql'] for q in queries if 'memories_' in q['sql']]
+                self.assertEqual(len(page_queries), 2, page_queries)
+
+    @override_settings(SLIDE_INITIAL_COUNT=3)
+    def test_first_slides_render_in_order_with_total(self):
+        response = self.client.get(self.url, {'lang': 'fa'})
+        content = response.content.decode()
+        positions = [content.index(f'عنوان {order}') for order in range(1, 4)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertNotContains(response, 'عنوان 4')
+        self.assertContains(response, '<span id="total-slides">5</span>', html=True)
+        self.assertContains(response, 'data-total="5"')
+        self.assertContains(response, 'data-bytes="4"', count=3)
+        self.assertContains(response, 'جین دو')
+        self.assertContains(response, 'song')
+
+    def test_only_rendered_columns_are_loaded(self):
+        slideshow = MemorySlideShow.objects.for_slide_page('en').get(pk=self.slideshow.pk)
+        self.assertIn('description', slideshow.get_deferred_fields())
+        self.assertIn('caption_fa', slideshow.page_slides[0].get_deferred_fields())
+
+
+@override_settings(CACHES=TEST_CACHES, SLIDE_MANIFEST_PAGE_SIZE=2)
+class SlideManifestTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+        for order, media_type in enumerate(['image', 'video', 'gif', 'audio', 'image'], start=1):
+            Slide.objects.create(
+                slideshow=self.slideshow, media_type=media_type, order=order * 10,
+                caption=f'Caption {order}', caption_fa=f'عنوان {order}',
+                media_file=ContentFile(b'data', name=f'slide-{order}.bin'),
+            )
+        self.url = reverse('slides-manifest', args=[self.slideshow.slug])
+
+    def test_pages_cover_every_slide_in_order(self):
+        entries = []
+        page = 1
+        while page:
+            data = self.client.get(self.url, {'page': page}).json()
+            self.assertEqual(data['count'], 5)
+            self.assertEqual(data['pages'], 3)
+            entries.extend(data['slides'])
+            page = data['next']
+        self.assertEqual([entry['index'] for entry in entries], [0, 1, 2, 3, 4])
+        self.assertEqual([entry['order'] for entry in entries], [10, 20, 30, 40, 50])
+        self.assertEqual(entries[0]['caption'], {'en': 'Caption 1', 'fa': 'عنوان 1'})
+        self.assertEqual(entries[0]['type'], 'image')
+        self.assertIn('sources', entries[0])
+        self.assertEqual({entry['bytes'] for entry in entries}, {4})
+        self.assertIn('poster', entries[1])
+        self.assertEqual(entries[2]['videos'], [])
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+
+        Slide.objects.filter(slideshow=self.slideshow, order=10).update(caption='Changed')
+        changed = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_invalid_pages_and_private_slideshows_are_404(self):
+        for page in (0, 4, 'x'):
+            with self.subTest(page=page):
+                self.assertEqual(self.client.get(self.url, {'page': page}).status_code, 404)
+        self.slideshow.is_public = False
+        self.slideshow.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.slideshow.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+
+@override_settings(CACHES=TEST_CACHES, VISIT_BUFFERING=True)
+class LanguageCookieTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+        self.slideshow = create_slideshow(title_fa='جین دو')
+        self.url = reverse('memoir-profile', args=[self.slideshow.slug])
+
+    def test_public_pages_write_no_session_or_cookie(self):
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.cookies)
+            self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+        self.assertFalse(Session.objects.exists())
+
+    def test_chosen_language_is_remembered_in_a_cookie(self):
+        response = self.client.get(self.url, {'lang': 'fa'})
+        self.assertTemplateUsed(response, 'core/profileFa.html')
+        self.assertEqual(response.cookies['lang'].value, 'fa')
+        self.assertFalse(Session.objects.exists())
+
+        # Later visits use the cookie and do not set it again
+        response = self.client.get(self.url)
+        self.assertContains(response, 'جین دو')
+        self.assertNotIn('lang', response.cookies)
+        self.assertNotIn('lang', self.client.get(self.url, {'lang': 'fa'}).cookies)
+
+        response = self.client.get(self.url, {'lang': 'en'})
+        self.assertEqual(response.cookies['lang'].value, 'en')
+
+    def test_unknown_languages_fall_back_to_english(self):
+        self.client.cookies['lang'] = 'de'
+        response = self.client.get(self.url, {'lang': 'xx'})
+        self.assertTemplateUsed(response, 'core/profileEn.html')
+        self.assertNotIn('lang', response.cookies)
+
+
+@override_settings(
+    CACHES=TEST_CACHES, VISIT_BUFFERING=True, PAGE_BROWSER_MAX_AGE=60, NGINX_CACHE_SECONDS=600,
+)
+class ProxyCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_path = cache_dir.name
+        self.slideshow = create_slideshow()
+        self.profile_url = reverse('memoir-profile', args=[self.slideshow.slug])
+        self.slide_url = reverse('play-slide', args=[self.slideshow.slug])
+
+    def test_public_pages_are_cacheable_by_nginx(self):
+        for url in (self.profile_url, self.slide_url):
+            for _ in range(2):  # Rendered, then from the page cache
+                response = self.client.get(url)
+                self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+                self.assertEqual(response['X-Accel-Expires'], '600')
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_explicit_language_does_not_vary_on_cookie(self):
+        self.client.cookies['lang'] = 'en'
+        response = self.client.get(self.profile_url, {'lang': 'en'})
+        self.assertNotIn('Vary', response)
+
+    def test_private_pages_and_cookie_setting_responses_stay_private(self):
+        response = self.client.get(self.profile_url, {'lang': 'fa'})
+        self.assertIn('lang', response.cookies)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(response['X-Accel-Expires'], '0')
+
+        self.slideshow.is_public = False
+        self.slideshow.save()
+        self.client.force_login(self.slideshow.owner)
+        response = self.client.get(self.slide_url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(response['X-Accel-Expires'], '0')
+
+    def cache_file(self, key):
+        path = proxy_cache_file(key, self.cache_path, '1:2')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fh:
+            fh.write('cached')
+        return path
+
+    def test_cache_file_layout_matches_nginx_levels(self):
+        digest = hashlib.md5(b'/slideshows/x/|en|').hexdigest()
+        self.assertEqual(
+            proxy_cache_file('/slideshows/x/|en|', '/cache', '1:2'),
+            f'/cache/{digest[-1]}/{digest[-3:-1]}/{digest}',
+        )
+
+    def test_changes_remove_nginx_cache_files(self):
+        slug = self.slideshow.slug
+        files = [
+            self.cache_file(f'{self.profile_url}|fa|'),
+            self.cache_file(f'{self.slide_url}|en|'),
+            self.cache_file(f"{reverse('slides-manifest', args=[slug])}|en|1"),
+        ]
+        other = self.cache_file(f"{reverse('memoir-profile', args=['someone-else'])}|en|")
+        with override_settings(NGINX_CACHE_PATH=self.cache_path):
+            Slide.objects.create(slideshow=self.slideshow, order=1)
+        self.assertFalse([path for path in files if os.path.exists(path)])
+        self.assertTrue(os.path.exists(other))
+
+        self.cache_file(f'{self.profile_url}|en|')
+        with override_settings(NGINX_CACHE_PATH=self.cache_path):
+            self.assertEqual(purge_proxy_cache(slug), 1)
+            self.assertEqual(purge_proxy_cache(slug), 0)
+
+    def test_cached_visits_are_imported_once(self):
+        log = os.path.join(self.cache_path, 'visits.log')
+        slug = self.slideshow.slug
+        with open(log, 'w') as fh:
+            fh.write(f'{self.profile_url}\n{self.slide_url}\n/slideshows/{slug}/slides.json\n/slideshows/{slug}/fa/\n')
+        call_command('import_cached_visits', log=log, stdout=StringIO())
+        self.slideshow.refresh_from_db()
+        self.assertEqual(self.slideshow.visit_count, 3)
+
+        with open(log, 'a') as fh:
+            fh.write(f'{self.profile_url}\n/slideshows/{slug}/sh')  # Second line still being written
+        call_command('import_cached_visits', log=log, stdout=StringIO())
+        self.slideshow.refresh_from_db()
+        self.assertEqual(self.slideshow.visit_count, 4)
+
+
+@override_settings(CACHES=TEST_CACHES, VISIT_BUFFERING=True)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        visit_buffer.drain()
+        self.addCleanup(visit_buffer.drain)
+        self.factory = AsyncRequestFactory()
+        self.slideshow = create_slideshow(title_fa='جین دو')
+        Slide.objects.create(slideshow=self.slideshow, caption='First light', caption_fa='نور', order=1)
+
+    def request(self, user=None, **params):
+        request = self.factory.get('/', params)
+        request.user = user or AnonymousUser()
+        return request
+
+    async def test_pages_render_and_are_cached(self):
+        slug = self.slideshow.slug
+        response = await async_views.showSlideAsync(self.request(lang='fa'), slug)
+        self.assertContains(response, 'نور')
+        self.assertEqual(response.cookies['lang'].value, 'fa')
+
+        response = await async_views.showProfileAsync(self.request(), slug)
+        self.assertContains(response, 'Jane Doe')
+        self.assertEqual(response['X-Accel-Expires'], '600')
+
+        with mock.patch.object(MemorySlideShow.objects, 'aget', side_effect=AssertionError('not cached')):
+            cached = await async_views.showProfileAsync(self.request(), slug)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(visit_buffer.pending, 3)
+
+    async def test_missing_and_private_slideshows_are_404(self):
+        with self.assertRaises(Http404):
+            await async_views.showProfileAsync(self.request(), 'nobody')
+
+        self.slideshow.is_public = False
+        await self.slideshow.asave()
+        with self.assertRaises(Http404):
+            await async_views.showSlideAsync(self.request(), self.slideshow.slug)
+        owner = await User.objects.aget(pk=self.slideshow.owner_id)
+        response = await async_views.showSlideAsync(self.request(user=owner), self.slideshow.slug)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    async def test_visit_flush_runs_off_the_event_loop(self):
+        buffer = VisitBuffer(threshold=2, interval=3600)
+        await buffer.arecord(self.slideshow.slug)
+        await buffer.arecord(self.slideshow.slug)
+        self.assertEqual(buffer.pending, 0)
+        await self.slideshow.arefresh_from_db()
+        self.assertEqual(self.slideshow.visit_count, 2)
+
+
+def jpeg_bytes(taken=None, color=(90, 140, 200)):
+    exif = Image.Exif()
+    if taken:
+        exif[0x8769] = {0x9003: taken}
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BulkImportTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+        Slide.objects.create(slideshow=self.slideshow, caption='Existing', order=4)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_zip(self, members):
+        path = os.path.join(self.directory, 'photos.zip')
+        with zipfile.ZipFile(path, 'w') as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        return path
+
+    def test_media_type_is_sniffed_from_content(self):
+        self.assertEqual(sniff_media_type(jpeg_bytes()[:16]), 'image')
+        self.assertEqual(sniff_media_type(b'GIF89a' + b'\0' * 10), 'gif')
+        self.assertEqual(sniff_media_type(b'\0\0\0\x18ftypmp42\0\0\0\0'), 'video')
+        self.assertEqual(sniff_media_type(b'\0\0\0\x18ftypheic\0\0\0\0'), 'image')
+        self.assertEqual(sniff_media_type(b'ID3\x04' + b'\0' * 12), 'audio')
+        self.assertIsNone(sniff_media_type(b'just some text..'))
+
+    def test_zip_import_orders_by_capture_date_then_name(self):
+        path = self.write_zip({
+            'album/IMG_10.jpg': jpeg_bytes(),
+            'album/IMG_2.jpg': jpeg_bytes(),
+            'late.jpg': jpeg_bytes('2020:05:01 08:00:00'),
+            'early.jpg': jpeg_bytes('1999:12:31 23:59:59'),
+            'clip.mp4': b'\0\0\0\x18ftypisom' + b'\0' * 64,
+            'notes.txt': b'not media',
+            '__MACOSX/._early.jpg': b'resource fork',
+        })
+        result = import_slides(self.slideshow, zip_entries(path))
+
+        self.assertEqual(result.skipped, [('notes.txt', 'not a supported media file')])
+        slides = list(self.slideshow.slides.exclude(caption='Existing').order_by('order'))
+        self.assertEqual([slide.order for slide in slides], [4 + ORDER_GAP * n for n in range(1, 6)])
+        self.assertEqual(
+            [os.path.basename(slide.media_file.name) for slide in slides],
+            ['early.jpg', 'late.jpg', 'IMG_2.jpg', 'IMG_10.jpg', 'clip.mp4'],
+        )
+        self.assertEqual([slide.media_type for slide in slides], ['image'] * 4 + ['video'])
+        self.assertEqual(slides[-1].media_size, 76)
+        self.assertTrue(default_storage.exists(slides[0].media_file.name))
+        self.assertEqual(MediaJob.objects.filter(slide__in=slides).count(), 5)
+
+    def test_failed_import_creates_nothing_and_removes_files(self):
+        path = self.write_zip({'one.jpg': jpeg_bytes(), 'two.jpg': jpeg_bytes()})
+        with mock.patch('memories.bulk_import.enqueue_slides', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                import_slides(self.slideshow, zip_entries(path))
+        self.assertEqual(self.slideshow.slides.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'slideshows', self.slideshow.slug, 'one.jpg')))
+
+    def test_import_slides_command_reads_a_directory(self):
+        for name in ('3.jpg', '1.jpg', '.hidden.jpg'):
+            with open(os.path.join(self.directory, name), 'wb') as fh:
+                fh.write(jpeg_bytes())
+        out = StringIO()
+        call_command('import_slides', self.slideshow.slug, self.directory, '--order', 'name', stdout=out)
+        self.assertIn('2 slide(s) imported', out.getvalue())
+        self.assertEqual(
+            [os.path.basename(name) for name in self.slideshow.slides.filter(order__gt=4).values_list('media_file', flat=True)],
+            ['1.jpg', '3.jpg'],
+        )
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create_superuser('importer', 'importer@example.com', 'password')
+        self.client.force_login(admin_user)
+        url = reverse('admin:memories_memoryslideshow_import_slides', args=[self.slideshow.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('from-zip.jpg', jpeg_bytes())
+        response = self.client.post(url, {
+            'order': 'name',
+            'files': [
+                SimpleUploadedFile('single.jpg', jpeg_bytes(), content_type='image/jpeg'),
+                SimpleUploadedFile('album.zip', archive.getvalue(), content_type='application/zip'),
+            ],
+        })
+        self.assertRedirects(response, reverse('admin:memories_memoryslideshow_change', args=[self.slideshow.pk]))
+        self.assertEqual(self.slideshow.slides.count(), 3)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ChunkedUploadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.slideshow = create_slideshow()
+        self.client.force_login(self.slideshow.owner)
+        self.data = b'\0\0\0\x18ftypmp42' + os.urandom(3000)
+
+    def start(self, **fields):
+        body = {'filename': 'memorial.mp4', 'size': len(self.data), **fields}
+        return self.client.post(
+            reverse('start-upload', args=[self.slideshow.slug]), json.dumps(body), content_type='application/json',
+        )
+
+    def put(self, url, start, end, checksum=None, data=None):
+        headers = {'Content-Range': f'bytes {start}-{end}/{len(self.data)}'}
+        if checksum is not False:
+            chunk = self.data[start:end + 1]
+            headers['Upload-Checksum'] = 'sha256 ' + base64.b64encode(checksum or hashlib.sha256(chunk).digest()).decode()
+        return self.client.put(
+            url, data if data is not None else self.data[start:end + 1],
+            content_type='application/octet-stream', headers=headers,
+        )
+
+    def test_resumable_upload_creates_a_video_slide(self):
+        response = self.start(sha256=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(response.status_code, 201)
+        url = response['Location']
+        self.assertEqual(response.json()['offset'], 0)
+
+        self.assertEqual(self.put(url, 0, 999).json()['offset'], 1000)
+        # A repeated chunk is refused with the offset to resume from
+        response = self.put(url, 0, 999)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        # A corrupted chunk is dropped
+        response = self.put(url, 1000, 1999, checksum=b'x' * 32)
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.get(url).json()['offset'], 1000)
+
+        self.put(url, 1000, 1999)
+        response = self.put(url, 2000, len(self.data) - 1, checksum=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'complete')
+
+        slide = self.slideshow.slides.get()
+        self.assertEqual(slide.media_file.name, f'slideshows/{self.slideshow.slug}/memorial.mp4')
+        self.assertEqual(slide.media_type, 'video')
+        with slide.media_file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.data)
+        self.assertFalse(os.path.exists(slide.media_file.path + '.part'))
+        self.assertTrue(MediaJob.objects.filter(slide=slide, task='transcode_video').exists())
+
+    def test_music_upload_replaces_slideshow_music(self):
+        url = self.start(filename='song.mp3', target='music')['Location']
+        self.put(url, 0, len(self.data) - 1)
+        self.slideshow.refresh_from_db()
+        self.assertEqual(self.slideshow.music.name, f'slideshows/{self.slideshow.slug}/song.mp3')
+        self.assertFalse(self.slideshow.slides.exists())
+
+    def test_file_checksum_mismatch_discards_the_upload(self):
+        url = self.start(sha256='0' * 64)['Location']
+        response = self.put(url, 0, len(self.data) - 1)
+        self.assertEqual(response.status_code, 460)
+        upload = ChunkedUpload.objects.get()
+        self.assertEqual(upload.status, ChunkedUpload.STATUS_FAILED)
+        self.assertFalse(default_storage.exists(upload.name))
+        self.assertFalse(self.slideshow.slides.exists())
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.start(size=0).status_code, 400)
+        url = self.start()['Location']
+        response = self.client.put(url, b'abc', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(User.objects.create_user('stranger'))
+        self.assertEqual(self.start().status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_stale_uploads_are_removed(self):
+        url = self.start()['Location']
+        self.put(url, 0, 99)
+        upload = ChunkedUpload.objects.get()
+        ChunkedUpload.objects.filter(pk=upload.pk).update(updated_at=upload.updated_at - datetime.timedelta(days=2))
+        call_command('clear_stale_uploads', stdout=StringIO())
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(default_storage.exists(upload.name))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES, SLIDE_ADMIN_GROUPS_PER_PAGE=10, SLIDE_ADMIN_GROUP_PAGE_SIZE=2)
+class SlideAdminChangelistTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.url = reverse('admin:memories_slide_changelist')
+
+    def add_slideshows(self, count, slides=3):
+        for _ in range(count):
+            slideshow = create_slideshow(title=f'Slideshow {MemorySlideShow.objects.count()}')
+            for order in range(1, slides + 1):
+                Slide.objects.create(
+                    slideshow=slideshow, media_type='image', order=order, caption=f'Caption {order}',
+                    media_file=ContentFile(b'data', name=f'slide-{order}.jpg'),
+                )
+        return slideshow
+
+    def count_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_slideshows(self):
+        self.add_slideshows(2)
+        few = self.count_queries(self.url)
+        self.add_slideshows(20, slides=5)
+        self.assertEqual(self.count_queries(self.url), few)
+        self.assertEqual(self.count_queries(self.url, {'group_page': 3}), few)
+
+    def test_groups_are_paginated_and_slides_not_rendered(self):
+        self.add_slideshows(12)
+        create_slideshow(title='Empty')
+        response = self.client.get(self.url)
+        groups = response.context['slideshow_groups']
+        self.assertEqual(len(groups), 10)
+        self.assertEqual(groups.paginator.count, 12)
+        self.assertEqual(groups[0].slide_count, 3)
+        self.assertNotContains(response, 'Caption 1')
+        self.assertContains(response, '?group_page=2')
+
+        response = self.client.get(self.url, {'group_page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['slideshow_groups']), 2)
+
+    def test_group_slides_are_served_in_pages(self):
+        slideshow = self.add_slideshows(1, slides=5)
+        url = reverse('admin:memories_slide_group_slides', args=[slideshow.pk])
+        first = self.count_queries(url)
+        data = self.client.get(url).json()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual([slide['caption'] for slide in data['slides']], ['Caption 1', 'Caption 2'])
+        self.assertEqual(data['next_page'], 2)
+        self.assertTrue(data['slides'][0]['thumbnail'])
+
+        self.assertEqual(self.count_queries(url, {'page': 3}), first)
+        data = self.client.get(url, {'page': 3}).json()
+        self.assertEqual([slide['caption'] for slide in data['slides']], ['Caption 5'])
+        self.assertIsNone(data['next_page'])
+
+    def test_slideshow_and_owner_filters_use_autocomplete(self):
+        self.add_slideshows(1)
+        slideshow = self.add_slideshows(1)
+        response = self.client.get(self.url, {'media_type': 'image'})
+        self.assertContains(response, 'data-autocomplete-filter', count=2)
+        self.assertNotContains(response, f'slideshow__id__exact={slideshow.pk}')
+        self.assertNotContains(response, f'slideshow__owner__id__exact={slideshow.owner_id}')
+
+        for param, value in (('slideshow__id__exact', slideshow.pk), ('slideshow__owner__id__exact', slideshow.owner_id)):
+            with self.subTest(param):
+                response = self.client.get(self.url, {param: value})
+                self.assertEqual({slide.slideshow_id for slide in response.context['cl'].result_list}, {slideshow.pk})
+
+    def test_group_slides_require_admin_access(self):
+        slideshow = self.add_slideshows(1)
+        self.client.force_login(User.objects.create_user('visitor'))
+        response = self.client.get(reverse('admin:memories_slide_group_slides', args=[slideshow.pk]))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SlideShowAdminChangelistTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.url = reverse('admin:memories_memoryslideshow_changelist')
+
+    def add_slideshow(self, title, slides):
+        slideshow = create_slideshow(title=title)
+        for order in range(1, slides + 1):
+            Slide.objects.create(
+                slideshow=slideshow, media_type='audio', order=order,
+                media_file=ContentFile(b'x' * 100 * order, name=f'slide-{order}.mp3'),
+            )
+        return slideshow
+
+    def test_media_size_is_recorded(self):
+        slideshow = self.add_slideshow('Sizes', 2)
+        self.assertEqual(list(slideshow.slides.values_list('media_size', flat=True)), [100, 200])
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_slideshow('First', 2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for index in range(10):
+            self.add_slideshow(f'More {index}', 3)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+
+    def test_slide_count_and_media_size_are_sortable(self):
+        self.add_slideshow('Small', 1)
+        self.add_slideshow('Large', 3)
+        for order in ('-5', '-6'):
+            with self.subTest(order):
+                response = self.client.get(self.url, {'o': order})
+                self.assertEqual(response.status_code, 200)
+                titles = [slideshow.title for slideshow in response.context['cl'].result_list]
+                self.assertEqual(titles, ['Large', 'Small'])
+        self.assertContains(response, '600\xa0bytes')
+
+    def test_owner_filter_uses_autocomplete(self):
+        slideshow = self.add_slideshow('Filtered', 1)
+        other = self.add_slideshow('Other', 1)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'data-autocomplete-filter')
+        self.assertNotContains(response, f'owner__id__exact={other.owner_id}')
+
+        response = self.client.get(self.url, {'owner__id__exact': slideshow.owner_id})
+        self.assertEqual([s.title for s in response.context['cl'].result_list], ['Filtered'])
+        self.assertContains(response, f'<option value="{slideshow.owner_id}" selected>{slideshow.owner}</option>', html=True)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DuplicateSlideshowTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.slideshow = create_slideshow(title='Jane Doe', title_fa='جین دو', date_of_birth=datetime.date(1950, 3, 21))
+
+    def add_slides(self, slideshow, count):
+        Slide.objects.bulk_create([
+            Slide(
+                slideshow=slideshow, media_type='image', order=order, caption=f'Caption {order}',
+                media_file=f'slideshows/{slideshow.slug}/{order}.jpg', media_size=order,
+                renditions={'source': f'slideshows/{slideshow.slug}/{order}.jpg', 'images': {}},
+            )
+            for order in range(1, count + 1)
+        ])
+
+    def duplicate(self):
+        return duplicate_slideshows(MemorySlideShow.objects.filter(pk=self.slideshow.pk))
+
+    def add_media_slide(self, slideshow):
+        name = default_storage.save(f'slideshows/{slideshow.slug}/photo.jpg', ContentFile(b'jpeg'))
+        rendition = default_storage.save(f'slideshows/{slideshow.slug}/photo-320w.webp', ContentFile(b'webp'))
+        return Slide.objects.create(
+            slideshow=slideshow, media_type='image', order=1, media_file=name,
+            renditions={'source': name, 'images': {'webp': [[320, rendition]]}},
+        )
+
+    def test_copy_keeps_slides_and_order(self):
+        self.add_slides(self.slideshow, 3)
+        [copy] = self.duplicate()
+        self.assertEqual(copy.title, 'Jane Doe (Copy)')
+        self.assertEqual(copy.slug, 'jane-doe-copy')
+        self.assertFalse(copy.is_public)
+        self.assertEqual(copy.date_of_birth_fa, self.slideshow.date_of_birth_fa)
+        original = list(self.slideshow.slides.values_list('order', 'caption', 'media_size'))
+        copied = list(copy.slides.values_list('order', 'caption', 'media_size'))
+        self.assertEqual(copied, original)
+
+    def test_copy_links_media_into_its_own_directory(self):
+        slide = self.add_media_slide(self.slideshow)
+        [copy] = self.duplicate()
+        copied = copy.slides.get()
+        self.assertEqual(copied.media_file.name, 'slideshows/jane-doe-copy/photo.jpg')
+        self.assertEqual(copied.renditions, {
+            'source': 'slideshows/jane-doe-copy/photo.jpg',
+            'images': {'webp': [[320, 'slideshows/jane-doe-copy/photo-320w.webp']]},
+        })
+        # Hard links: the bytes are shared, not copied
+        self.assertTrue(os.path.samefile(slide.media_file.path, copied.media_file.path))
+        # The renditions came along, so there is nothing to re-encode
+        self.assertFalse(MediaJob.objects.filter(slideshow=copy).exists())
+
+    def test_media_access_follows_the_copy(self):
+        self.add_media_slide(self.slideshow)
+        for original_public, copy_public, status in ((False, True, 200), (True, False, 404)):
+            with self.subTest(original_public=original_public):
+                MemorySlideShow.objects.filter(pk=self.slideshow.pk).update(is_public=original_public)
+                [copy] = self.duplicate()
+                copy.is_public = copy_public
+                copy.save()
+                response = self.client.get(f'/media/{copy.slides.get().media_file.name}')
+                self.addCleanup(response.close)
+                self.assertEqual(response.status_code, status)
+
+    def test_files_are_deleted_with_their_last_reference(self):
+        slide = self.add_media_slide(self.slideshow)
+        rendition = slide.renditions['images']['webp'][0][1]
+        # A copy made before copies linked their own files shares the names
+        shared = Slide.objects.create(
+            slideshow=create_slideshow('John Doe'), media_type='image', order=1,
+            media_file=slide.media_file.name, renditions=slide.renditions,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            slide.delete()
+        self.assertTrue(default_storage.exists(shared.media_file.name))
+        self.assertTrue(default_storage.exists(rendition))
+        with self.captureOnCommitCallbacks(execute=True):
+            shared.delete()
+        self.assertFalse(default_storage.exists(shared.media_file.name))
+        self.assertFalse(default_storage.exists(rendition))
+
+    def test_queries_do_not_grow_with_slides(self):
+        self.add_slides(self.slideshow, 3)
+        with CaptureQueriesContext(connection) as few:
+            self.duplicate()
+        self.slideshow.slides.all().delete()
+        self.add_slides(self.slideshow, 300)
+        with CaptureQueriesContext(connection) as many:
+            [copy] = self.duplicate()
+
+        def other_queries(queries):
+            return [q['sql'] for q in queries if not q['sql'].startswith('INSERT INTO "memories_slide"')]
+        self.assertEqual(len(other_queries(many)), len(other_queries(few)))
+        # bulk_create batches are limited by the backend's query parameter cap
+        self.assertLessEqual(len(many) - len(other_queries(many)), 5)
+        self.assertEqual(copy.slug, 'jane-doe-copy-1')
+        self.assertEqual(copy.slides.count(), 300)
+
+    def test_failure_leaves_no_partial_copy(self):
+        self.add_media_slide(self.slideshow)
+        with mock.patch('memories.duplication.enqueue_slides', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.duplicate()
+        self.assertEqual(MemorySlideShow.objects.count(), 1)
+        self.assertEqual(Slide.objects.count(), 1)
+        self.assertEqual(default_storage.listdir('slideshows/jane-doe-copy'), ([], []))
+
+    def test_admin_action(self):
+        self.add_slides(self.slideshow, 2)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.post(reverse('admin:memories_memoryslideshow_changelist'), {
+            'action': 'duplicate_slideshow', '_selected_action': [self.slideshow.pk],
+        }, follow=True)
+        self.assertContains(response, '1 slideshow(s) duplicated successfully.')
+        self.assertEqual(MemorySlideShow.objects.get(slug='jane-doe-copy').slides.count(), 2)
+
+
+class SlugAllocationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+
+    def create(self, title):
+        return MemorySlideShow.objects.create(owner=self.owner, title=title)
+
+    def test_unique_slug_takes_the_next_suffix(self):
+        self.assertEqual(unique_slug('john-smith'), 'john-smith')
+        for slug in ('john-smith', 'john-smith-2', 'john-smithson', 'john-smith-x'):
+            MemorySlideShow.objects.create(owner=self.owner, title=slug, slug=slug)
+        self.assertEqual(unique_slug('john-smith'), 'john-smith-3')
+        self.assertEqual(unique_slug('john'), 'john')
+
+    def test_colliding_titles_take_one_query_each(self):
+        slugs = []
+        for count in (1, 20):
+            while len(slugs) < count:
+                slugs.append(self.create('Mohammad Ahmadi').slug)
+            with CaptureQueriesContext(connection) as queries:
+                slideshow = self.create('Mohammad Ahmadi')
+            slugs.append(slideshow.slug)
+            self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+        self.assertEqual(slugs[:3], ['mohammad-ahmadi', 'mohammad-ahmadi-1', 'mohammad-ahmadi-2'])
+        self.assertEqual(len(set(slugs)), len(slugs))
+
+    def test_long_titles_leave_room_for_the_suffix(self):
+        title = 'A very long memorial title that goes on and on'
+        first, second = self.create(title), self.create(title)
+        self.assertEqual(first.slug, 'a-very-long-memorial-titl')
+        self.assertEqual(second.slug, 'a-very-long-memorial-titl-1')
+
+    def test_high_suffixes_shorten_the_base_to_fit(self):
+        title = 'abcdefghijklmnopqrstuvwxyzabcd'
+        base = title[:25]
+        for slug in (base, f'{base}-9999'):
+            MemorySlideShow.objects.create(owner=self.owner, title=title, slug=slug)
+        max_length = MemorySlideShow._meta.get_field('slug').max_length
+        slugs = [self.create(title).slug for _ in range(2)]
+        self.assertEqual(slugs, [f'{base[:24]}-10000', f'{base[:24]}-10001'])
+        self.assertTrue(all(len(slug) <= max_length for slug in slugs))
+
+    def test_slug_taken_by_a_concurrent_save_is_retried(self):
+        # Another worker committed 'jane-doe' between our query and our INSERT
+        self.create('Jane Doe')
+        stale = iter(['jane-doe'])
+
+        def racing_unique_slug(base_slug):
+            return next(stale, None) or unique_slug(base_slug)
+
+        with mock.patch('memories.models.unique_slug', side_effect=racing_unique_slug) as allocate:
+            slideshow = self.create('Jane Doe')
+        self.assertEqual(allocate.call_count, 2)
+        self.assertEqual(slideshow.slug, 'jane-doe-1')
+
+        with mock.patch('memories.models.unique_slug', return_value='jane-doe'):
+            with self.assertRaises(IntegrityError):
+                self.create('Jane Doe')
+
+    def test_other_integrity_errors_are_not_retried(self):
+        with mock.patch('memories.models.unique_slug', wraps=unique_slug) as allocate:
+            with self.assertRaises(IntegrityError):
+                MemorySlideShow.objects.create(owner=self.owner, title=None)
+        self.assertEqual(allocate.call_count, 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SlideOrderTests(TestCase):
+    def setUp(self):
+        self.slideshow = create_slideshow()
+        self.url = reverse('reorder-slides', args=[self.slideshow.slug])
+        self.client.force_login(self.slideshow.owner)
+
+    def add_slides(self, keys):
+        return [
+            Slide.objects.create(slideshow=self.slideshow, order=key, caption=f'Slide {index}').pk
+            for index, key in enumerate(keys)
+        ]
+
+    def saved_order(self):
+        return list(self.slideshow.slides.order_by('order').values_list('pk', flat=True))
+
+    def post(self, slide_ids):
+        return self.client.post(self.url, json.dumps({'slides': slide_ids}), content_type='application/json')
+
+    def test_order_keys_keep_the_longest_sorted_run(self):
+        self.assertEqual(order_keys([1024, 2048, 3072]), [1024, 2048, 3072])
+        # Moving one slide gives it a key in the gap and leaves the others alone
+        self.assertEqual(order_keys([4096, 1024, 2048, 3072]), [512, 1024, 2048, 3072])
+        self.assertEqual(order_keys([2048, 3072, 1024]), [2048, 3072, 4096])
+        # No room between 1 and 2: everything is respaced
+        self.assertEqual(order_keys([1, 3, 2]), [1024, 2048, 3072])
+
+    def test_reorder_applies_the_full_order(self):
+        slides = self.add_slides([ORDER_GAP * n for n in range(1, 101)])
+        new_order = slides[::-1]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(new_order)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 99, 'count': 100})
+        self.assertEqual(self.saved_order(), new_order)
+        self.assertLess(len(queries), 15)
+
+    def test_moving_one_slide_writes_one_row(self):
+        slides = self.add_slides([ORDER_GAP * n for n in range(1, 6)])
+        new_order = [slides[4]] + slides[:4]
+        response = self.post(new_order)
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(self.saved_order(), new_order)
+
+    def test_respacing_into_held_keys_does_not_collide(self):
+        a, b, c = self.add_slides([1, 2, 2048])
+        self.assertEqual(self.post([c, a, b]).json()['updated'], 3)
+        self.assertEqual(self.saved_order(), [c, a, b])
+        self.assertEqual(
+            list(self.slideshow.slides.order_by('order').values_list('order', flat=True)), [1024, 2048, 3072],
+        )
+
+    def test_invalid_orders_are_rejected(self):
+        slides = self.add_slides([1024, 2048, 3072])
+        for body in ({'slides': slides[:2]}, {'slides': slides + slides[:1]}, {'slides': ['x']}, {}):
+            with self.subTest(body):
+                response = self.client.post(self.url, json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.saved_order(), slides)
+
+        self.client.force_login(User.objects.create_user('stranger'))
+        self.assertEqual(self.post(slides[::-1]).status_code, 404)
+
+    def test_order_is_unique_per_slideshow(self):
+        self.add_slides([1024])
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Slide.objects.create(slideshow=self.slideshow, order=1024)
+        Slide.objects.create(slideshow=create_slideshow(title='Other'), order=1024)
+
+    def test_admin_move_actions(self):
+        slides = self.add_slides([ORDER_GAP * n for n in range(1, 5)])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        changelist = reverse('admin:memories_slide_changelist')
+        self.client.post(changelist, {'action': 'move_up', '_selected_action': [slides[0], slides[2]]})
+        self.assertEqual(self.saved_order(), [slides[0], slides[2], slides[1], slides[3]])
+        self.client.post(changelist, {'action': 'move_down', '_selected_action': [slides[2], slides[3]]})
+        self.assertEqual(self.saved_order(), [slides[0], slides[1], slides[2], slides[3]])
+
+        response = self.client.get(reverse('admin:memories_memoryslideshow_reorder_slides', args=[self.slideshow.pk]))
+        self.assertContains(response, f'data-reorder-slides="{self.url}"')
+        self.assertContains(response, 'data-slide=', count=4)
+
+    def test_inline_slides_are_added_at_the_end(self):
+        slides = self.add_slides([ORDER_GAP, ORDER_GAP * 2])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:memories_memoryslideshow_change', args=[self.slideshow.pk])
+        response = self.client.get(url)
+        self.assertContains(response, reverse('admin:memories_memoryslideshow_reorder_slides', args=[self.slideshow.pk]))
+        self.assertNotContains(response, 'name="slides-0-order"')
+
+        data = {
+            'title': self.slideshow.title, 'owner': self.slideshow.owner_id,
+            'profile_theme': self.slideshow.profile_theme, 'slide_theme': self.slideshow.slide_theme,
+            'slides-TOTAL_FORMS': 4, 'slides-INITIAL_FORMS': 2,
+        }
+        for index, pk in enumerate(slides):
+            data.update({f'slides-{index}-id': pk, f'slides-{index}-slideshow': self.slideshow.pk,
+                         f'slides-{index}-media_type': 'image', f'slides-{index}-caption': f'Slide {index}',
+                         f'slides-{index}-order': 1})
+        for index in (2, 3):
+            data.update({f'slides-{index}-media_type': 'image', f'slides-{index}-caption': f'New {index}'})
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(self.slideshow.slides.order_by('order').values_list('caption', 'order')),
+            [('Slide 0', ORDER_GAP), ('Slide 1', ORDER_GAP * 2), ('New 2', ORDER_GAP * 3), ('New 3', ORDER_GAP * 4)],
+        )
@@ -0,0 +1,231 @@
+"""
+Resumable, chunked uploads of large slide media and music.
+
+A client starts an upload (name, size and optionally the SHA-256 of the
+whole file), then sends the bytes in any number of PUT requests carrying
+``Content-Range: bytes <start>-<end>/<size>`` and optionally
+``Upload-Checksum: sha256 <base64>`` for the chunk. After a dropped
+connection it asks for the current offset and carries on from there.
+
+Chunks are appended to ``<name>.part`` next to the final file in
+``slideshows/<slug>/``; the size of that file is the offset, so a worker
+dying between writing and bookkeeping loses nothing. An exclusive lock on
+it serializes concurrent PUTs. Once the last byte arrives the whole file is
+checked against the expected SHA-256, renamed into place and attached to
+the slide or slideshow, with no copy. Needs a storage with local paths
+(the default FileSystemStorage).
+"""
+import base64
+import binascii
+import fcntl
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk_import import sniff_media_type
+from .models import ChunkedUpload, Slide
+from .ordering import next_order
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (?P<start>\d+)-(?P<end>\d+)/(?P<size>\d+)$')
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Invalid upload request; ``status`` is the HTTP status to answer with."""
+    status = 400
+
+
+class UploadConflict(UploadError):
+    """The chunk does not start at the current offset."""
+    status = 409
+
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}')
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    status = 460  # Checksum Mismatch, as in tus
+
+
+def max_upload_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 4 * 1024 ** 3)
+
+
+def max_chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK_SIZE', 32 * 1024 ** 2)
+
+
+def upload_storage():
+    # Slide media and music share the default storage
+    return Slide._meta.get_field('media_file').storage
+
+
+def part_path(upload):
+    return f'{upload_storage().path(upload.name)}.part'
+
+
+def start_upload(slideshow, owner, target, filename, size, sha256='', slide=None, media_type=''):
+    """Reserve the final storage name and create the ``ChunkedUpload``."""
+    if target not in dict(ChunkedUpload.TARGET_CHOICES):
+        raise UploadError(f'Unknown upload target: {target}')
+    if size <= 0 or size > max_upload_size():
+        raise UploadError(f'Size must be between 1 and {max_upload_size()} bytes')
+    if sha256 and not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        raise UploadError('sha256 must be 64 lowercase hex digits')
+    if media_type and media_type not in dict(Slide.MEDIA_TYPES):
+        raise UploadError(f'Unknown media type: {media_type}')
+    if slide is not None and slide.slideshow_id != slideshow.pk:
+        raise UploadError('The slide belongs to another slideshow')
+
+    if target == ChunkedUpload.TARGET_MUSIC:
+        field = slideshow.music
+    else:
+        field = (slide or Slide(slideshow=slideshow)).media_file
+    # An empty placeholder claims the name until the finished file replaces it
+    name = field.field.generate_filename(field.instance, os.path.basename(filename))
+    name = field.storage.save(name, ContentFile(b''))
+    upload = ChunkedUpload.objects.create(
+        slideshow=slideshow, slide=slide, owner=owner, target=target, media_type=media_type,
+        name=name, size=size, sha256=sha256,
+    )
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def parse_content_range(header, upload):
+    """``(start, end)`` from a Content-Range header for ``upload``."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('Content-Range must look like "bytes <start>-<end>/<size>"')
+    start, end, size = int(match['start']), int(match['end']), int(match['size'])
+    if size != upload.size or start > end or end >= size:
+        raise UploadError('Content-Range does not fit the upload')
+    if end - start + 1 > max_chunk_size():
+        raise UploadError(f'Chunks may be at most {max_chunk_size()} bytes')
+    return start, end
+
+
+def parse_checksum(header):
+    """Digest expected for a chunk from an ``Upload-Checksum: sha256 <base64>`` header."""
+    if not header:
+        return None
+    algorithm, _, value = header.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadError('Only sha256 chunk checksums are supported')
+    try:
+        return base64.b64decode(value, validate=True)
+    except binascii.Error:
+        raise UploadError('Upload-Checksum is not valid base64')
+
+
+def write_chunk(upload, stream, start, end, checksum=None):
+    """
+    Append bytes ``start``..``end`` read from ``stream`` and return the new
+    offset; the upload is completed when that was the last chunk.
+    """
+    if upload.status != ChunkedUpload.STATUS_UPLOADING:
+        raise UploadError(f'Upload is {upload.status}')
+    length = end - start + 1
+    path = part_path(upload)
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        raise UploadError('Upload has expired')
+    with os.fdopen(fd, 'r+b') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        offset = os.fstat(fh.fileno()).st_size
+        if start != offset:
+            raise UploadConflict(offset)
+        fh.seek(start)
+        digest = hashlib.sha256()
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            fh.write(data)
+            digest.update(data)
+            remaining -= len(data)
+        if remaining or (checksum is not None and digest.digest() != checksum):
+            fh.truncate(start)
+            if remaining:
+                raise UploadError('Request body is shorter than Content-Range')
+            raise ChecksumMismatch('Chunk checksum does not match')
+        fh.flush()
+        os.fsync(fh.fileno())
+        upload.offset = end + 1
+        ChunkedUpload.objects.filter(pk=upload.pk).update(offset=upload.offset, updated_at=timezone.now())
+        if upload.offset == upload.size:
+            complete_upload(upload)
+    return upload.offset
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(upload):
+    """Verify the assembled file, move it into place and attach it."""
+    path = part_path(upload)
+    if upload.sha256 and file_sha256(path) != upload.sha256:
+        abort_upload(upload, status=ChunkedUpload.STATUS_FAILED)
+        raise ChecksumMismatch('File checksum does not match')
+    os.replace(path, path[:-len('.part')])
+
+    with transaction.atomic():
+        slideshow = upload.slideshow
+        if upload.target == ChunkedUpload.TARGET_MUSIC:
+            slideshow.music.name = upload.name
+            slideshow.save(update_fields=['music'])
+        else:
+            with upload_storage().open(upload.name) as fh:
+                media_type = upload.media_type or sniff_media_type(fh.read(16)) or 'video'
+            slide = upload.slide
+            if slide is None:
+                slide = upload.slide = Slide(slideshow=slideshow, order=next_order(slideshow))
+            slide.media_file.name = upload.name
+            slide.media_type = media_type
+            slide.renditions = {}
+            # post_save queues the derivative job and drops the cached pages
+            slide.save()
+        upload.status = ChunkedUpload.STATUS_COMPLETE
+        upload.save(update_fields=['slide', 'status', 'updated_at'])
+
+
+def abort_upload(upload, status=None):
+    """Remove the partial file and placeholder of an unfinished upload."""
+    if upload.status == ChunkedUpload.STATUS_COMPLETE:
+        return
+    for path in (part_path(upload), upload_storage().path(upload.name)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if status:
+        upload.status = status
+        upload.save(update_fields=['status', 'updated_at'])
+    else:
+        upload.delete()
+
+
+def upload_state(upload, url):
+    return {
+        'id': str(upload.pk),
+        'url': url,
+        'name': upload.name,
+        'size': upload.size,
+        'offset': upload.offset,
+        'status': upload.status,
+        'chunk_size': getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 ** 2),
+        'slide': upload.slide_id,
+    }
@@ -2,12 +2,22 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from memories import views
+from memories import async_views, views
+
+# Async page views under ASGI (see memories/async_views.py)
+if settings.ASYNC_VIEWS:
+    showProfile, showSlide = async_views.showProfileAsync, async_views.showSlideAsync
+else:
+    showProfile, showSlide = views.showProfile, views.showSlide
 
 urlpatterns = [
     # Unified URLs (primary)
-    path('<slug:slug>/', views.showProfile, name='memoir-profile'),
-    path('<slug:slug>/show/', views.showSlide, name='play-slide'),
+    path('<slug:slug>/', showProfile, name='memoir-profile'),
+    path('<slug:slug>/show/', showSlide, name='play-slide'),
+    path('<slug:slug>/slides.json', views.slidesManifest, name='slides-manifest'),
+    path('<slug:slug>/slides/order/', views.reorderSlides, name='reorder-slides'),
+    path('<slug:slug>/uploads/', views.startUpload, name='start-upload'),
+    path('<slug:slug>/uploads/<uuid:upload_id>/', views.uploadChunks, name='upload-chunks'),
     
     # Backward compatibility URLs (optional - can be removed later)
     path('<slug:slug>/fa/', views.showProfileFa, name='memoir-profile-fa'),
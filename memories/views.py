@@ -1,69 +1,153 @@
+import json
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.paginator import InvalidPage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.template import context
-from django.db.models import F
-from .models import MemorySlideShow, Slide
-from khayyam import JalaliDate
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from .models import ChunkedUpload, MemorySlideShow, Slide
+from .visits import record_visit
+from .cache import cache_page, get_cached_page, patch_page_cache_headers, visibility_of
+from .access import can_view, is_owner_or_staff, remember_share_token, slideshow_visibility
+from .manifest import build_manifest, manifest_page_size
+from .ordering import reorder_slides
+from .serving import RangeNotSatisfiable, file_etag, file_range_iterator, media_slug, parse_byte_range
+from .uploads import (
+    UploadConflict, UploadError, abort_upload, parse_checksum, parse_content_range, start_upload, upload_state,
+    write_chunk,
+)
+
+LANGUAGES = ('en', 'fa')
 
 def get_language(request):
-    """Get language from request parameter, session, or default to 'en'"""
+    """Get language from request parameter, language cookie, or default to 'en'"""
     lang = request.GET.get('lang', '')
-    if lang not in ['en', 'fa']:
-        lang = request.session.get('language', 'en')
-    if lang not in ['en', 'fa']:
+    if lang not in LANGUAGES:
+        lang = request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME, 'en')
+    if lang not in LANGUAGES:
         lang = 'en'
-    # Store in session for future requests
-    request.session['language'] = lang
     return lang
 
+def remember_language(request, response, lang):
+    """
+    Store an explicitly chosen language in a plain cookie, only when it
+    changes, so ordinary page views carry no Set-Cookie and touch no session.
+    """
+    if request.GET.get('lang') != lang or request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME) == lang:
+        return
+    response.set_cookie(
+        settings.LANGUAGE_COOKIE_NAME, lang,
+        max_age=settings.LANGUAGE_COOKIE_AGE,
+        path=settings.LANGUAGE_COOKIE_PATH,
+        domain=settings.LANGUAGE_COOKIE_DOMAIN,
+        secure=settings.LANGUAGE_COOKIE_SECURE,
+        httponly=settings.LANGUAGE_COOKIE_HTTPONLY,
+        samesite=settings.LANGUAGE_COOKIE_SAMESITE,
+    )
+
+def finish_page(request, response, slug, lang, visibility):
+    """Cookies and cache headers shared by the memorial pages."""
+    remember_share_token(request, response, slug)
+    remember_language(request, response, lang)
+    # Without a valid lang parameter the language came from the cookie
+    patch_page_cache_headers(response, visibility, vary_on_cookie=request.GET.get('lang') not in LANGUAGES)
+    return response
+
 def showProfile(request, slug):
     """Unified profile view that handles both languages"""
-    user = get_object_or_404(MemorySlideShow, slug=slug)
     lang = get_language(request)
+    cached = get_cached_page(slug, lang, 'profile')
+    if cached is not None:
+        response, visibility = cached
+        if not can_view(request, slug, visibility):
+            raise Http404('No MemorySlideShow matches the given query.')
+        record_visit(slug)
+        return finish_page(request, response, slug, lang, visibility)
+
+    user = get_object_or_404(MemorySlideShow, slug=slug)
+    if not can_view(request, slug, visibility_of(user)):
+        raise Http404('No MemorySlideShow matches the given query.')
 
-    # Increment visit count (using F() to avoid race conditions)
-    MemorySlideShow.objects.filter(pk=user.pk).update(visit_count=F('visit_count') + 1)
-    # Refresh the user object to get updated visit_count
-    user.refresh_from_db()
+    # Buffered increment, flushed to visit_count in batches
+    record_visit(user.slug)
 
     context = {
         'user': user,
         'lang': lang
     }
 
-    # Add Jalali date formatting for Farsi
+    # Jalali dates are precomputed on save (see set_jalali_dates)
     if lang == 'fa':
-        context.update({
-            'date_of_birth': JalaliDate(user.date_of_birth).strftime('%Y/%m/%d'),
-            'date_of_death': JalaliDate(user.date_of_death).strftime('%Y/%m/%d'),
-            'born_year': JalaliDate(user.date_of_birth).strftime('%Y'),
-            'death_year': JalaliDate(user.date_of_death).strftime('%Y')
-        })
         template = 'core/profileFa.html'
     else:
         template = 'core/profileEn.html'
 
-    return render(request, template, context)
+    response = render(request, template, context)
+    cache_page(user, lang, 'profile', response)
+    return finish_page(request, response, slug, lang, visibility_of(user))
 
 def showSlide(request, slug):
     """Unified slideshow view that handles both languages"""
-    user = get_object_or_404(MemorySlideShow, slug=slug)
-    slides = user.ordered_slides
     lang = get_language(request)
+    cached = get_cached_page(slug, lang, 'slide')
+    if cached is not None:
+        response, visibility = cached
+        if not can_view(request, slug, visibility):
+            raise Http404('No MemorySlideShow matches the given query.')
+        record_visit(slug)
+        return finish_page(request, response, slug, lang, visibility)
+
+    # Only the first few slides are rendered; slide.js pages through
+    # slidesManifest for the rest
+    initial_count = getattr(settings, 'SLIDE_INITIAL_COUNT', 3)
+    user = get_object_or_404(MemorySlideShow.objects.for_slide_page(lang, limit=initial_count), slug=slug)
+    if not can_view(request, slug, visibility_of(user)):
+        raise Http404('No MemorySlideShow matches the given query.')
+    slides = user.page_slides
 
-    # Increment visit count (using F() to avoid race conditions)
-    MemorySlideShow.objects.filter(pk=user.pk).update(visit_count=F('visit_count') + 1)
-    # Refresh the user object to get updated visit_count
-    user.refresh_from_db()
+    # Buffered increment, flushed to visit_count in batches
+    record_visit(user.slug)
 
     context = {
         'user': user,
         'slides': slides,
+        'slide_count': user.slide_count,
+        'manifest_page_size': manifest_page_size(),
         'music_url': user.music.url if user.music else None,
         'lang': lang
     }
 
     template = 'core/slideFa.html' if lang == 'fa' else 'core/slideEn.html'
-    return render(request, template, context)
+    response = render(request, template, context)
+    cache_page(user, lang, 'slide', response)
+    return finish_page(request, response, slug, lang, visibility_of(user))
+
+@require_safe
+def slidesManifest(request, slug):
+    """Paginated JSON list of a slideshow's slides, validated by ETag."""
+    visibility = slideshow_visibility(slug)
+    if visibility is None or not can_view(request, slug, visibility):
+        raise Http404('No MemorySlideShow matches the given query.')
+    try:
+        body, etag = build_manifest(slug, request.GET.get('page', 1))
+    except InvalidPage:
+        raise Http404('Invalid manifest page')
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_page_cache_headers(response, visibility, vary_on_cookie=False)
+    return response
 
 # Keep old views for backward compatibility (optional - can be removed)
 def showProfileEn(request, slug):
@@ -96,4 +180,152 @@ def showSlideFa(request, slug):
     request.GET._mutable = True
     request.GET['lang'] = 'fa'
     request.GET._mutable = mutable_get
-    return showSlide(request, slug)
\ No newline at end of file
+    return showSlide(request, slug)
+
+@require_safe
+def serveMedia(request, path):
+    """
+    Serve an uploaded file with ETag/Last-Modified validation, single byte
+    ranges and long-lived cache headers. With MEDIA_ACCEL_REDIRECT_PREFIX set,
+    Django only authorizes the request and nginx streams the file.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    if not os.path.isfile(fullpath):
+        raise Http404('Media file not found')
+
+    slug = media_slug(path)
+    visibility = slideshow_visibility(slug) if slug else None
+    is_public = visibility is None or visibility['is_public']
+    if not is_public and not can_view(request, slug, visibility):
+        raise Http404('Media file not found')
+    max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 7 * 24 * 60 * 60)
+    cache_control = f'public, max-age={max_age}' if is_public else 'private, max-age=3600'
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    if accel_prefix:
+        # nginx handles conditional requests and ranges for internal redirects
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(path)
+        response['Cache-Control'] = cache_control
+        return response
+
+    stat = os.stat(fullpath)
+    etag = file_etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = last_modified
+    headers['Cache-Control'] = cache_control
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime), response=headers)
+    if conditional is not headers:
+        return conditional
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range in (etag, last_modified):
+        try:
+            byte_range = parse_byte_range(request.headers.get('Range'), stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            file_range_iterator(fullpath, start, length), status=206, content_type=content_type,
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+        response[header] = headers[header]
+    return response
+
+def upload_response(upload, status=200):
+    url = reverse('upload-chunks', args=[upload.slideshow.slug, upload.pk])
+    response = JsonResponse(upload_state(upload, url), status=status)
+    if status == 201:
+        response['Location'] = url
+    response['Upload-Offset'] = str(upload.offset)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def upload_error(exc):
+    if isinstance(exc, UploadConflict):
+        response = JsonResponse({'error': str(exc), 'offset': exc.offset}, status=exc.status)
+        response['Upload-Offset'] = str(exc.offset)
+        return response
+    return JsonResponse({'error': str(exc)}, status=exc.status)
+
+@require_POST
+def reorderSlides(request, slug):
+    """Apply a complete new slide order, ``{"slides": [id, ...]}``, in one request."""
+    slideshow = get_object_or_404(MemorySlideShow, slug=slug)
+    if not is_owner_or_staff(request, slideshow.owner_id):
+        raise Http404('No MemorySlideShow matches the given query.')
+    try:
+        slide_ids = [int(pk) for pk in json.loads(request.body)['slides']]
+        updated = reorder_slides(slideshow, slide_ids)
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Expected {"slides": [...]} listing every slide id once'}, status=400)
+    return JsonResponse({'updated': updated, 'count': len(slide_ids)})
+
+@require_POST
+def startUpload(request, slug):
+    """Start a resumable upload of slide media or music (see memories/uploads.py)."""
+    slideshow = get_object_or_404(MemorySlideShow, slug=slug)
+    if not is_owner_or_staff(request, slideshow.owner_id):
+        raise Http404('No MemorySlideShow matches the given query.')
+    try:
+        data = json.loads(request.body or b'{}')
+        slide = None
+        if data.get('slide'):
+            slide = Slide.objects.filter(slideshow=slideshow, pk=data['slide']).first()
+            if slide is None:
+                raise UploadError('Unknown slide')
+        upload = start_upload(
+            slideshow, request.user,
+            target=data.get('target', ChunkedUpload.TARGET_SLIDE),
+            filename=str(data.get('filename') or 'upload'),
+            size=int(data.get('size', 0)),
+            sha256=str(data.get('sha256', '')).lower(),
+            slide=slide,
+            media_type=data.get('media_type', ''),
+        )
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Expected a JSON object with filename and size'}, status=400)
+    except UploadError as exc:
+        return upload_error(exc)
+    return upload_response(upload, status=201)
+
+@require_http_methods(['GET', 'HEAD', 'PUT', 'DELETE'])
+def uploadChunks(request, slug, upload_id):
+    """Report (GET/HEAD), extend (PUT with Content-Range) or abort (DELETE) an upload."""
+    upload = ChunkedUpload.objects.select_related('slideshow', 'slide').filter(
+        pk=upload_id, slideshow__slug=slug,
+    ).first()
+    if upload is None or not is_owner_or_staff(request, upload.owner_id):
+        raise Http404('No upload matches the given query.')
+
+    if request.method == 'DELETE':
+        abort_upload(upload)
+        return HttpResponse(status=204)
+    if request.method == 'PUT':
+        try:
+            start, end = parse_content_range(request.headers.get('Content-Range'), upload)
+            write_chunk(upload, request, start, end, parse_checksum(request.headers.get('Upload-Checksum')))
+        except UploadError as exc:
+            return upload_error(exc)
+    return upload_response(upload)
@@ -0,0 +1,221 @@
+"""
+Write-behind visit counter for memorial pages.
+
+Page views are accumulated in memory per slug and written to
+``MemorySlideShow.visit_count`` in one batched UPDATE when either the
+threshold or the flush interval is reached, and again when the process
+exits. There is no timer: both limits are checked when a visit is recorded,
+so the counts of a worker that goes idle wait for its next visit or its
+exit, and can lag the pages by up to that long. Counts that cannot be written at shutdown are spooled to disk and
+picked up by the next flush in any process. Each spool file is claimed by
+renaming it before it is read, so concurrent workers never apply it twice.
+
+The buffer lives in each worker's memory, so ``manage.py flush_visits`` can
+only drain the spool; visits still buffered in running workers are written by
+those workers.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Case, F, PositiveIntegerField, When
+
+logger = logging.getLogger(__name__)
+
+
+class VisitBuffer:
+    """Thread-safe in-memory buffer of pending visit increments."""
+
+    def __init__(self, threshold=None, interval=None, spool_dir=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.spool_dir = spool_dir
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def get_threshold(self):
+        if self.threshold is not None:
+            return self.threshold
+        return getattr(settings, 'VISIT_FLUSH_THRESHOLD', 50)
+
+    def get_interval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, 'VISIT_FLUSH_INTERVAL', 10)
+
+    def get_spool_dir(self):
+        spool_dir = self.spool_dir or getattr(settings, 'VISIT_SPOOL_DIR', None)
+        return Path(spool_dir) if spool_dir else None
+
+    @property
+    def pending(self):
+        """Total number of increments not yet written to the database."""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def record(self, slug, count=1):
+        """Count a visit to ``slug`` and flush if the buffer is due."""
+        with self._lock:
+            self._pending[slug] += count
+            due = (
+                sum(self._pending.values()) >= self.get_threshold()
+                or time.monotonic() - self._last_flush >= self.get_interval()
+            )
+        if due:
+            self.flush()
+
+    async def arecord(self, slug, count=1):
+        """``record`` for async views: only a due flush leaves the event loop."""
+        with self._lock:
+            self._pending[slug] += count
+            due = (
+                sum(self._pending.values()) >= self.get_threshold()
+                or time.monotonic() - self._last_flush >= self.get_interval()
+            )
+        if due:
+            await sync_to_async(self.flush)()
+
+    def drain(self):
+        """Remove and return all pending increments."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        return pending
+
+    def restore(self, pending):
+        """Put increments back into the buffer after a failed write."""
+        with self._lock:
+            self._pending.update(pending)
+
+    def flush(self):
+        """
+        Write all pending increments (and any spooled ones) to the database.
+        Returns the number of visits written.
+        """
+        buffered = self.drain()
+        spooled, spool_files = self._claim_spool()
+        pending = buffered + spooled
+        if not pending:
+            return 0
+        try:
+            write_visits(pending)
+        except Exception:
+            logger.exception('Failed to flush %d visit(s)', sum(pending.values()))
+            self.restore(buffered)
+            self._release_spool(spool_files)
+            return 0
+        for claimed, _ in spool_files:
+            claimed.unlink(missing_ok=True)
+        return sum(pending.values())
+
+    def shutdown(self):
+        """
+        Flush on process exit. If the database cannot be reached the counts
+        are spooled to disk so a later flush can apply them.
+        """
+        if self.flush() or not self.pending:
+            return
+        pending = self.drain()
+        if not self.spool(pending):
+            logger.error('Dropped %d visit(s) on shutdown', sum(pending.values()))
+
+    def spool(self, pending):
+        """Persist ``pending`` to a spool file. Returns True on success."""
+        spool_dir = self.get_spool_dir()
+        if spool_dir is None or not pending:
+            return False
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        path = spool_dir / f'{os.getpid()}-{uuid.uuid4().hex}.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(dict(pending)))
+        tmp_path.replace(path)
+        return True
+
+    def _claim_spool(self):
+        """
+        Claim and read every spool file. Returns the summed counts and a list
+        of ``(claimed_path, original_path)`` pairs. A file another process
+        renamed first is skipped.
+        """
+        spool_dir = self.get_spool_dir()
+        spooled = Counter()
+        files = []
+        if spool_dir is None or not spool_dir.is_dir():
+            return spooled, files
+        for path in sorted(spool_dir.glob('*.json')):
+            claimed = path.with_name(f'{path.name}.{os.getpid()}-{uuid.uuid4().hex}.claimed')
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                spooled.update(json.loads(claimed.read_text()))
+            except (OSError, ValueError):
+                logger.warning('Skipping unreadable visit spool file %s', path)
+                self._release_spool([(claimed, path)])
+                continue
+            files.append((claimed, path))
+        return spooled, files
+
+    def _release_spool(self, files):
+        """Give claimed spool files back so a later flush can retry them."""
+        for claimed, path in files:
+            try:
+                os.rename(claimed, path)
+            except OSError:
+                logger.warning('Could not release visit spool file %s', claimed)
+
+
+def write_visits(pending):
+    """Apply ``{slug: increment}`` to the database in a single UPDATE."""
+    from .models import MemorySlideShow
+
+    pending = {slug: count for slug, count in pending.items() if count}
+    if not pending:
+        return 0
+    return MemorySlideShow.objects.filter(slug__in=pending).update(
+        visit_count=Case(
+            *[When(slug=slug, then=F('visit_count') + count) for slug, count in pending.items()],
+            default=F('visit_count'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+visit_buffer = VisitBuffer()
+
+
+def record_visit(slug):
+    """Count one visit to the slideshow identified by ``slug``."""
+    if getattr(settings, 'VISIT_BUFFERING', True):
+        visit_buffer.record(slug)
+    else:
+        write_visits({slug: 1})
+
+
+async def arecord_visit(slug):
+    """``record_visit`` for async views."""
+    if getattr(settings, 'VISIT_BUFFERING', True):
+        await visit_buffer.arecord(slug)
+    else:
+        await sync_to_async(write_visits)({slug: 1})
+
+
+def flush_visits():
+    """
+    Force pending visits in this process and every spool file to the database.
+    Other workers' in-memory buffers are not reachable from here.
+    """
+    return visit_buffer.flush()
+
+
+atexit.register(visit_buffer.shutdown)
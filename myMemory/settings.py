@@ -66,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,14 +97,103 @@ TEMPLATES = [
 WSGI_APPLICATION = 'myMemory.wsgi.application'
 
 
+# Serve the memorial pages with the async views (memories/async_views.py).
+# myMemory.asgi turns this on; sync (WSGI) workers keep the sync views.
+ASYNC_VIEWS = get_env_variable('ASYNC_VIEWS', 'False') == 'True'
+
+
 # Database
-DATABASES = {
+# SQLite by default; set DB_ENGINE=postgresql (and install psycopg) when
+# several workers write concurrently enough to contend on the SQLite lock.
+DB_ENGINE = get_env_variable('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': get_env_variable('DB_NAME', 'mymemory'),
+            'USER': get_env_variable('DB_USER', 'mymemory'),
+            'PASSWORD': get_env_variable('DB_PASSWORD', ''),
+            'HOST': get_env_variable('DB_HOST', 'localhost'),
+            'PORT': get_env_variable('DB_PORT', '5432'),
+            # Persistent connections, checked before reuse
+            'CONN_MAX_AGE': int(get_env_variable('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': get_env_variable('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+
+# Applied to every new SQLite connection (see core/db.py). WAL lets readers
+# run alongside the single writer, and busy_timeout makes writers wait for
+# the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': get_env_variable('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': get_env_variable('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(get_env_variable('SQLITE_BUSY_TIMEOUT', '5000')),
+    'mmap_size': int(get_env_variable('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+}
+
+
+# Cache
+# File-based by default so every gunicorn worker on the box shares one cache
+# (and sees the same invalidations) without needing an external service.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': get_env_variable('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': get_env_variable('CACHE_LOCATION', str(BASE_DIR / 'var' / 'cache')),
     }
 }
 
+# Rendered memorial pages (see memories/cache.py)
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = int(get_env_variable('PAGE_CACHE_TIMEOUT', str(60 * 60)))
+
+# HTTP caching of public memorial pages: browsers/CDNs keep them for
+# PAGE_BROWSER_MAX_AGE, the nginx proxy_cache for NGINX_CACHE_SECONDS. With
+# NGINX_CACHE_PATH set (the proxy_cache_path directory), changes delete the
+# affected nginx cache files; see memories/proxy_cache.py.
+PAGE_BROWSER_MAX_AGE = int(get_env_variable('PAGE_BROWSER_MAX_AGE', '60'))
+NGINX_CACHE_SECONDS = int(get_env_variable('NGINX_CACHE_SECONDS', '600'))
+NGINX_CACHE_PATH = get_env_variable('NGINX_CACHE_PATH', '')
+NGINX_CACHE_LEVELS = get_env_variable('NGINX_CACHE_LEVELS', '1:2')
+NGINX_VISIT_LOG = get_env_variable('NGINX_VISIT_LOG', '')
+
+# Slide page: slides rendered up front, the rest come from the JSON manifest
+SLIDE_INITIAL_COUNT = int(get_env_variable('SLIDE_INITIAL_COUNT', '3'))
+SLIDE_MANIFEST_PAGE_SIZE = int(get_env_variable('SLIDE_MANIFEST_PAGE_SIZE', '50'))
+
+# Language picked on the memorial pages lives in a plain cookie, not the session
+LANGUAGE_COOKIE_NAME = 'lang'
+LANGUAGE_COOKIE_AGE = 365 * 24 * 60 * 60
+LANGUAGE_COOKIE_SAMESITE = 'Lax'
+
+# Lifetime of signed share links for private slideshows (see memories/access.py)
+SHARE_TOKEN_MAX_AGE = int(get_env_variable('SHARE_TOKEN_MAX_AGE', str(30 * 24 * 60 * 60)))
+
+# Bulk slide import (admin "Import slides" page and `manage.py import_slides`,
+# see memories/bulk_import.py). Larger files in an import are skipped.
+SLIDE_IMPORT_MAX_FILE_SIZE = int(get_env_variable('SLIDE_IMPORT_MAX_FILE_SIZE', str(200 * 1024 * 1024)))
+DATA_UPLOAD_MAX_NUMBER_FILES = int(get_env_variable('DATA_UPLOAD_MAX_NUMBER_FILES', '500'))
+
+# Resumable chunked uploads of large videos and music (see memories/uploads.py).
+# Clients send CHUNKED_UPLOAD_CHUNK_SIZE bytes per request; unfinished uploads
+# are removed by `manage.py clear_stale_uploads` after CHUNKED_UPLOAD_EXPIRY.
+CHUNKED_UPLOAD_CHUNK_SIZE = int(get_env_variable('CHUNKED_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 32 * 1024 * 1024  # keep below nginx client_max_body_size
+CHUNKED_UPLOAD_MAX_SIZE = int(get_env_variable('CHUNKED_UPLOAD_MAX_SIZE', str(4 * 1024 ** 3)))
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60
+
+# Grouped slide changelist in the admin: slideshows per page, and slides
+# per request when a group is expanded.
+SLIDE_ADMIN_GROUPS_PER_PAGE = int(get_env_variable('SLIDE_ADMIN_GROUPS_PER_PAGE', '25'))
+SLIDE_ADMIN_GROUP_PAGE_SIZE = int(get_env_variable('SLIDE_ADMIN_GROUP_PAGE_SIZE', '50'))
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -134,10 +224,63 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'memories' / 'media'
+MEDIA_ROOT = Path(get_env_variable('MEDIA_ROOT', str(BASE_DIR / 'memories' / 'media')))
+
+# Media serving (see memories.views.serveMedia)
+SERVE_MEDIA = get_env_variable('SERVE_MEDIA', 'True') == 'True'
+MEDIA_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+# When set, Django only authorizes media requests and nginx streams the file
+# from an `internal` location with this prefix. The production default matches
+# the /protected-media/ location in nginx_mymemory.conf; it is empty under
+# DEBUG so runserver streams files itself. Set it to '' explicitly only when
+# no nginx sits in front of gunicorn.
+MEDIA_ACCEL_REDIRECT_PREFIX = get_env_variable(
+    'MEDIA_ACCEL_REDIRECT_PREFIX', '' if DEBUG else '/protected-media/'
+)
+
+# Responsive image renditions (see memories/media.py)
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_DERIVATIVE_FORMATS = ('avif', 'webp')  # AVIF is used when Pillow has an encoder for it
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# Media job queue (see memories/jobs.py, run with `manage.py run_media_worker`)
+# Set MEDIA_JOBS_EAGER=True to process jobs inline when no worker is running.
+MEDIA_JOBS_EAGER = get_env_variable('MEDIA_JOBS_EAGER', 'False') == 'True'
+MEDIA_JOB_MAX_ATTEMPTS = 3
+MEDIA_JOB_RETRY_DELAY = 30  # seconds, doubled after every failed attempt
+MEDIA_JOB_TIMEOUT = 3600  # seconds before a 'running' job is considered abandoned
+MEDIA_WORKER_CONCURRENCY = int(get_env_variable('MEDIA_WORKER_CONCURRENCY', '2'))
+MEDIA_WORKER_POLL_INTERVAL = 5
+
+# Video transcoding and GIF conversion (requires the ffmpeg binary on the worker host)
+FFMPEG_BINARY = get_env_variable('FFMPEG_BINARY', 'ffmpeg')
+FFMPEG_TIMEOUT = 1800  # seconds; keep below MEDIA_JOB_TIMEOUT
+VIDEO_MAX_DIMENSION = 1280
+VIDEO_MAX_BITRATE_KBPS = 2500
+VIDEO_CRF = 23  # H.264
+VIDEO_WEBM_CRF = 35  # VP9, used for GIF conversions
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom User Model
-AUTH_USER_MODEL = 'accounts.User' 
\ No newline at end of file
+AUTH_USER_MODEL = 'accounts.User'
+
+# Visit counting (see memories/visits.py)
+# Visits are buffered in memory and written in batches once either limit is hit.
+# Both limits are only checked when a visit is recorded: a worker that stops
+# getting traffic keeps its buffered counts until its next visit or its exit.
+# The test runner (core/test_runner.py) turns buffering and spooling off.
+VISIT_BUFFERING = get_env_variable('VISIT_BUFFERING', 'True') == 'True'
+VISIT_FLUSH_THRESHOLD = int(get_env_variable('VISIT_FLUSH_THRESHOLD', '50'))
+VISIT_FLUSH_INTERVAL = float(get_env_variable('VISIT_FLUSH_INTERVAL', '10'))
+VISIT_SPOOL_DIR = Path(get_env_variable('VISIT_SPOOL_DIR', str(BASE_DIR / 'var' / 'visits')))
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Request performance metrics (see core/middleware.py and core/metrics.py):
+# Server-Timing headers and Prometheus histograms at /metrics. Workers share
+# their totals through PERF_METRICS_DIR; empty it when the service restarts.
+PERF_METRICS = get_env_variable('PERF_METRICS', 'False') == 'True'
+PERF_METRICS_DIR = get_env_variable('PERF_METRICS_DIR', '')
+PERF_METRICS_WRITE_INTERVAL = float(get_env_variable('PERF_METRICS_WRITE_INTERVAL', '5'))
@@ -1,10 +1,14 @@
 """
 URL configuration for myMemory project.
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import metrics
+from memories.views import serveMedia
 
 # Customize admin site
 admin.site.site_header = 'Memory Slideshow Administration'
@@ -14,8 +18,12 @@ admin.site.index_title = 'Welcome to Memory Slideshow Administration'
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('slideshows/', include('memories.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
 
-# Serve static and media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Serve media through Django (range requests, caching headers and access
+# checks for private slideshows). nginx may still serve public files itself.
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serveMedia, name='media'),
+    ]